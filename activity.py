@@ -0,0 +1,62 @@
+# ============================================================
+# 活动矩阵 (Activity Matrix)
+# 把 (对象, 日期, 权重) 事件一次性聚合成稠密的 对象 x 天 矩阵, 供 Summary 页的热力图使用
+# 只在打开 Summary 时导入
+# ============================================================
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def activity_matrix(events: list, ids: list, end: date, days: int, weight: str = None):
+    """返回 (len(ids), days) 的矩阵, 第 j 列对应 end - (days - 1 - j) 这一天
+
+    events 为 [{"id", "date", ...}], 同一对象同一天的多条事件累加;
+    不在 ids 中或落在窗口外的事件丢弃。weight 为事件中的数值列, 为 None 时按条数计。
+    """
+    if not events or not ids:
+        return np.zeros((len(ids), days))
+    frame = pd.DataFrame(events)
+    rows = pd.Index(ids).get_indexer(frame["id"])  # 不在 ids 中为 -1
+    start = pd.Timestamp(end - timedelta(days=days - 1))
+    cols = (pd.to_datetime(frame["date"]) - start).dt.days.to_numpy()
+    keep = (rows >= 0) & (cols >= 0) & (cols < days)
+    weights = frame[weight].fillna(0).to_numpy(dtype=float)[keep] if weight else None
+    counts = np.bincount(rows[keep] * days + cols[keep], weights=weights, minlength=len(ids) * days)
+    return counts.reshape(len(ids), days)
+
+
+def window_dates(end: date, days: int):
+    return pd.date_range(end=pd.Timestamp(end), periods=days)
+
+
+def by_week(matrix, end: date):
+    """按周 (周一开始) 合并列, 返回 (矩阵, 每周周一的日期)"""
+    days = matrix.shape[1]
+    start = end - timedelta(days=days - 1)
+    lead = start.weekday()
+    trail = -(lead + days) % 7
+    padded = np.pad(matrix, ((0, 0), (lead, trail)))
+    weeks = padded.reshape(matrix.shape[0], -1, 7).sum(axis=2)
+    return weeks, pd.date_range(start=pd.Timestamp(start - timedelta(days=lead)), periods=weeks.shape[1], freq="7D")
+
+
+def long_frame(matrix, labels: list, dates, label: str):
+    """矩阵展开成 Altair 用的长表 (label, date, value), 包括 0 值格子"""
+    return pd.DataFrame({
+        label: np.repeat(labels, matrix.shape[1]),
+        "date": np.tile(dates, matrix.shape[0]),
+        "value": matrix.ravel(),
+    })
+
+
+def year_grid(totals, end: date):
+    """GitHub 式年度格子: 每列一周, 每行一个星期几"""
+    dates = window_dates(end, len(totals))
+    return pd.DataFrame({
+        "date": dates,
+        "week": dates - pd.to_timedelta(dates.weekday, unit="D"),
+        "weekday": dates.strftime("%a"),
+        "value": totals,
+    })
@@ -1,8 +1,20 @@
+import hashlib
+import itertools
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import cache, partial, wraps
+from pathlib import Path
 import streamlit as st
-from supabase import create_client
-from datetime import date, datetime, timedelta
-import pandas as pd
-import altair as alt
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from datetime import date, timedelta
+from instrument import InstrumentedClient, begin_run, end_run, render_debug_panel, section, timed
+from changefeed import RealtimeFeed, SQLiteFeed
+from journal import JournaledStorage
+from storage import LOCAL_USER, METRIC_COLUMNS, PREVIEW_LENGTH, SQLiteStorage, SupabaseStorage
+from writebuffer import DailyLogBuffer
 
 # ============================================================
 # 页面配置
@@ -14,63 +26,252 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+today = date.today()
+today_str = today.isoformat()
+
+# ============================================================
+# 性能埋点 (URL 加 ?debug=1 显示面板, secrets 中 [debug] log = true 输出每次 rerun 的日志)
+# ============================================================
+begin_run(
+    panel=st.query_params.get("debug") == "1",
+    log=st.secrets.get("debug", {}).get("log", False),
+)
+
 # ============================================================
-# Supabase 连接
+# 查询缓存 (跨 session 共享, 按用户隔离, 写操作按 (用户, 表) 精确失效)
+# 缓存键带上当前用户和所依赖表的版本号: 写入只递增这个用户的版本号, 其他用户的缓存不受影响,
+# 旧版本的条目不再命中, 由 TTL / max_entries 淘汰
 # ============================================================
+CACHE_TTL = 600            # 秒, 兜底过期时间
+CACHE_MAX_ENTRIES = 1024   # 每个读函数最多缓存的 (用户, 版本, 参数) 组合, 由所有用户共享
+
 @st.cache_resource
-def init_supabase():
-    url = st.secrets["supabase"]["url"]
-    key = st.secrets["supabase"]["key"]
-    return create_client(url, key)
+def cache_versions():
+    """(user_id, 表) -> 版本号, user_id 为 None 的版本号对所有用户生效; 版本号全局递增, 不会回到旧值"""
+    return {}, itertools.count(1)
+
+def table_versions(user: str, tables: tuple) -> tuple:
+    versions, _ = cache_versions()
+    return tuple((versions.get((None, table)), versions.get((user, table))) for table in tables)
+
+def cached_read(*tables):
+    """把读函数包进 st.cache_data, 缓存键加上当前用户和 tables 的版本号"""
+    def decorator(func):
+        @st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+        @wraps(func)
+        def scoped(user: str, versions: tuple, *args, **kwargs):
+            return func(*args, **kwargs)
+
+        @wraps(func)
+        def read(*args, **kwargs):
+            return scoped(user_id, table_versions(user_id, tables), *args, **kwargs)
+        return read
+    return decorator
+
+def invalidate(*tables, user_id: str = None):
+    """写操作后让 user_id 依赖这些表的缓存失效; user_id 为 None 时对所有用户生效"""
+    versions, counter = cache_versions()
+    for table in tables:
+        versions[(user_id, table)] = next(counter)
 
-supabase = init_supabase()
-today = date.today()
-today_str = today.isoformat()
+# ============================================================
+# 登录 (多用户: 每个用户只能读写自己的行, 见 schema.sql 中的 RLS)
+# Supabase: 用 Supabase Auth 的邮箱和密码登录; secrets 中配置 [supabase] email / password 时自动登录 (单人部署)
+# SQLite: 本地部署不登录, 使用 [storage] user_id (默认 LOCAL_USER)
+# ============================================================
+def storage_config():
+    return st.secrets.get("storage", {})
+
+def sign_in(email: str, password: str):
+    """返回 (user_id, 已登录的 Supabase 客户端); 每个用户一个客户端, 会话令牌由客户端自动续期"""
+    from supabase import create_client
+    client = create_client(st.secrets["supabase"]["url"], st.secrets["supabase"]["key"])
+    response = client.auth.sign_in_with_password({"email": email, "password": password})
+    return response.user.id, client
+
+@st.cache_resource
+def auto_sign_in():
+    return sign_in(st.secrets["supabase"]["email"], st.secrets["supabase"]["password"])
+
+def sign_up(email: str, password: str):
+    from supabase import create_client
+    client = create_client(st.secrets["supabase"]["url"], st.secrets["supabase"]["key"])
+    client.auth.sign_up({"email": email, "password": password})
+
+def sign_out():
+    # 只清本 session: 同一用户的其他 session 共用这个客户端, 不调用 auth.sign_out 吊销令牌
+    st.session_state.clear()
+
+def login_form():
+    st.title("🧠 Life OS")
+    with st.form("login"):
+        email = st.text_input("Email")
+        password = st.text_input("Password", type="password")
+        col_in, col_up = st.columns(2)
+        signing_in = col_in.form_submit_button("Sign in", type="primary", use_container_width=True)
+        signing_up = col_up.form_submit_button("Sign up", use_container_width=True)
+    if signing_in and email and password:
+        try:
+            st.session_state.auth = sign_in(email, password)
+            st.session_state.auth_email = email
+            st.rerun()
+        except Exception as exc:
+            st.error(f"Sign in failed: {exc}")
+    elif signing_up and email and password:
+        try:
+            sign_up(email, password)
+            st.success("Account created. Confirm your email if required, then sign in.")
+        except Exception as exc:
+            st.error(f"Sign up failed: {exc}")
+    st.stop()
+
+def current_user():
+    """返回 (user_id, Supabase 客户端); 未登录时显示登录框并停止本次运行"""
+    if storage_config().get("backend") == "sqlite":
+        return storage_config().get("user_id", LOCAL_USER), None
+    if "auth" not in st.session_state:
+        if "email" not in st.secrets["supabase"]:
+            login_form()
+        st.session_state.auth = auto_sign_in()
+    return st.session_state.auth
+
+user_id, auth_client = current_user()
 
 # ============================================================
-# 数据库操作函数
+# 存储后端 (默认 Supabase + 本地写日志, secrets 中配置 [storage] backend = "sqlite" 则使用本地 SQLite)
 # ============================================================
+@st.cache_resource
+def init_sqlite():
+    return SQLiteStorage(storage_config().get("path", "life_os.db"))
 
-# --- Daily Logs ---
-def get_today_log():
-    response = supabase.table("daily_logs").select("*").eq("date", today_str).execute()
-    return response.data[0] if response.data else None
+@st.cache_resource
+def user_storage(user: str, _client=None):
+    """每个用户一个存储对象; SQLite 共用一个连接, Supabase 用该用户登录的客户端, 本地写日志也按用户分文件"""
+    config = storage_config()
+    if config.get("backend") == "sqlite":
+        return init_sqlite().for_user(user)
+    backend = SupabaseStorage(InstrumentedClient(_client), user)
+    if not config.get("journal", True):
+        return backend
+    # 离线优先: 新增类写操作先记入本地日志, 后台同步到 Supabase
+    path = Path(config.get("journal_path", "write_journal.db"))
+    return JournaledStorage(backend, str(path.with_name(f"{path.stem}-{user}{path.suffix}")),
+                            on_sync=partial(invalidate, user_id=user))
+
+db = user_storage(user_id, auth_client)
+
+# ============================================================
+# 变更订阅 (其他 session / 设备的写入推送到本进程, 按 (用户, 表) 清缓存并刷新该用户打开的页面)
+# secrets 中 [storage] live = false 可关闭, 此时只靠缓存过期
+# Supabase 配置了 [supabase] service_key (只在服务端使用) 时一个进程只订阅一次, 收到所有用户的变更;
+# 否则每个登录的用户用自己的令牌订阅一次, RLS 只推送他自己的行
+# ============================================================
+LIVE_POLL = 2  # 秒, 各 session 检查本进程收到的变更 (只比较内存中的计数, 不查询数据库)
+
+def access_token(client) -> str:
+    # get_session 在令牌快过期时自动续期
+    return client.auth.get_session().access_token
+
+@st.cache_resource
+def init_change_feed(user: str = None, _client=None):
+    """user 为 None 时订阅所有用户 (SQLite 或 service key), 否则只订阅该用户"""
+    config = storage_config()
+    if not config.get("live", True):
+        return None
+    if config.get("backend") == "sqlite":
+        path = config.get("path", "life_os.db")
+        return None if path == ":memory:" else SQLiteFeed(path, on_change=invalidate)
+    secrets = st.secrets["supabase"]
+    if user is None:
+        return RealtimeFeed(secrets["url"], secrets["service_key"], on_change=invalidate)
+    return RealtimeFeed(secrets["url"], secrets["key"], on_change=invalidate,
+                        token=partial(access_token, _client), user_id=user)
+
+if storage_config().get("backend") == "sqlite" or st.secrets["supabase"].get("service_key"):
+    feed = init_change_feed()
+else:
+    feed = init_change_feed(user_id, auth_client)
 
-def get_logs_since(start_date: str):
-    """获取从 start_date 开始的所有日志"""
-    response = supabase.table("daily_logs").select("*").gte("date", start_date).order("date", desc=True).execute()
-    return response.data or []
+# ============================================================
+# 数据库操作函数
+# ============================================================
 
-def get_all_logs():
-    """获取所有日志"""
-    response = supabase.table("daily_logs").select("*").order("date", desc=False).execute()
-    return response.data or []
+# --- Daily Logs ---
+@cached_read("daily_logs")
+def get_daily_log(day: str):
+    return db.get_daily_log(day, ("date", *DAILY_FIELDS))
 
-def save_daily_log(data: dict):
-    data["date"] = today_str
-    supabase.table("daily_logs").upsert(data).execute()
+def get_today_log():
+    return get_daily_log(today_str)
+
+def to_summary_frame(rows: list):
+    """把每日/每周数值行转成按日期索引的紧凑 DataFrame，NaN 统一填 0"""
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=["date", *METRIC_COLUMNS])
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.set_index("date").fillna(0)
+    df["lc_total"] = df[["lc_easy_count", "lc_medium_count", "lc_hard_count"]].sum(axis=1)
+    # 按实际取值范围压缩整数类型，不会溢出
+    return df.apply(pd.to_numeric, downcast="integer")
+
+# daily_logs 中由 session state 维护的字段及默认值
+DAILY_FIELDS = {
+    "newsletter_done": False,
+    "newsletter_time": 0,
+    "newsletter_note": "",
+    "video_done": False,
+    "video_time": 0,
+    "video_note": "",
+    "wechat_done": False,
+    "wechat_time": 0,
+    "gre_vocab_count": 0,
+    "gre_verbal_count": 0,
+    "gre_reading_count": 0,
+    "lc_easy_count": 0,
+    "lc_medium_count": 0,
+    "lc_hard_count": 0,
+    "lc_notes": "",
+}
+# 显示计数的输入框: 计数字段 -> 输入框 key
+METRIC_INPUTS = {
+    "gre_vocab_count": "gre_vocab",
+    "gre_verbal_count": "gre_verbal",
+    "gre_reading_count": "gre_reading",
+    "lc_easy_count": "lc_easy",
+    "lc_medium_count": "lc_medium",
+    "lc_hard_count": "lc_hard",
+}
+# 显示 DAILY_FIELDS 的控件 key; 换日时清掉, 控件按新一天的值重新初始化
+DAILY_WIDGETS = ["cb_nl", "nl_note", "cb_vid", "vid_note", "cb_wc", *METRIC_INPUTS.values(), "lc_note_input"]
+
+def load_daily_fields(log):
+    for field, default in DAILY_FIELDS.items():
+        value = getattr(log, field, None)
+        st.session_state[field] = default if value is None else value
+
+def new_write_buffer(saved):
+    return DailyLogBuffer(db, today_str, saved, DAILY_FIELDS,
+                          on_saved=partial(invalidate, "daily_logs", user_id=user_id))
+
+def get_write_buffer():
+    buffer = st.session_state.get("write_buffer")
+    if buffer is None or buffer.day != today_str:
+        if buffer is not None:
+            buffer.flush()
+        # 换日: session 中还是昨天的值, 先按今天的行重新载入, 否则第一次保存会把昨天的总数当作今天的增量
+        log = get_today_log()
+        load_daily_fields(log)
+        for key in DAILY_WIDGETS:
+            st.session_state.pop(key, None)
+        buffer = new_write_buffer(log)
+        st.session_state.write_buffer = buffer
+    return buffer
 
 def auto_save():
-    """自动保存当前 session state 到数据库"""
-    data = {
-        "date": today_str,
-        "newsletter_done": st.session_state.get("newsletter_done", False),
-        "newsletter_time": st.session_state.get("newsletter_time", 0),
-        "newsletter_note": st.session_state.get("newsletter_note", ""),
-        "video_done": st.session_state.get("video_done", False),
-        "video_time": st.session_state.get("video_time", 0),
-        "video_note": st.session_state.get("video_note", ""),
-        "wechat_done": st.session_state.get("wechat_done", False),
-        "wechat_time": st.session_state.get("wechat_time", 0),
-        "gre_vocab_count": st.session_state.get("gre_vocab_count", 0),
-        "gre_verbal_count": st.session_state.get("gre_verbal_count", 0),
-        "gre_reading_count": st.session_state.get("gre_reading_count", 0),
-        "lc_easy_count": st.session_state.get("lc_easy_count", 0),
-        "lc_medium_count": st.session_state.get("lc_medium_count", 0),
-        "lc_hard_count": st.session_state.get("lc_hard_count", 0),
-        "lc_notes": st.session_state.get("lc_notes", ""),
-    }
-    supabase.table("daily_logs").upsert(data).execute()
+    """把 session state 中改动过的字段交给写缓冲，稍后合并写入数据库"""
+    buffer = get_write_buffer()  # 先处理换日, 再读 session 中的值
+    data = {field: st.session_state.get(field, default) for field, default in DAILY_FIELDS.items()}
+    buffer.stage(data)
 
 def save_leetcode_progress():
     """LeetCode 即时保存回调"""
@@ -89,6 +290,12 @@ def save_leetcode_progress():
     st.session_state.lc_notes = st.session_state.get("lc_note_input", "")
     auto_save()
 
+def save_info_notes():
+    """Info Diet 笔记即时保存回调"""
+    st.session_state.newsletter_note = st.session_state.get("nl_note", st.session_state.newsletter_note)
+    st.session_state.video_note = st.session_state.get("vid_note", st.session_state.video_note)
+    auto_save()
+
 def save_gre_progress():
     """GRE 即时保存回调"""
     try:
@@ -106,91 +313,140 @@ def save_gre_progress():
     auto_save()
 
 # --- Research Projects ---
+# 各处界面实际用到的列, 只查询这些列
+ACTIVE_PROJECT_COLUMNS = ("id", "title", "created_at", "last_log_at", "last_log_date", "last_preview")
+ARCHIVED_PROJECT_COLUMNS = ("id", "title", "log_count")
+PROJECT_LOG_COLUMNS = ("id", "date", "content", "created_at")
+
+def by_recent_activity(rows: list) -> list:
+    """按最近一次记录倒序, 还没有记录的按创建时间排在后面 (last_log_at 由触发器维护, 不用再查子表)"""
+    return sorted(rows, key=lambda row: (row.last_log_at or "", row.created_at or ""), reverse=True)
+
+def show_last_activity(row):
+    """展开框顶部的最近一条记录预览, 取自父表的 last_preview (触发器多截取一个字, 超出即原文更长)
+
+    项目显示日志的 date, 与历史记录一致; idea 更新没有 date, 同历史记录一样取 created_at 的日期
+    """
+    if row.last_log_at:
+        preview = row.last_preview or ''
+        ellipsis = '...' if len(preview) > PREVIEW_LENGTH else ''
+        day = getattr(row, "last_log_date", None) or row.last_log_at[:10]
+        st.info(f"📝 **Last** ({day}): {preview[:PREVIEW_LENGTH]}{ellipsis}")
+
+@cached_read("research_projects")
 def get_active_projects():
-    response = supabase.table("research_projects").select("*").eq("is_active", True).order("created_at", desc=True).execute()
-    return response.data or []
+    return by_recent_activity(db.get_active_projects(ACTIVE_PROJECT_COLUMNS))
 
+@cached_read("research_projects")
 def get_all_projects():
-    response = supabase.table("research_projects").select("*").order("created_at", desc=True).execute()
-    return response.data or []
+    return db.get_all_projects()
 
+@cached_read("research_projects")
 def get_archived_projects():
-    response = supabase.table("research_projects").select("*").eq("is_active", False).order("created_at", desc=True).execute()
-    return response.data or []
+    return db.get_archived_projects(ARCHIVED_PROJECT_COLUMNS)
 
-def create_project(title: str):
-    supabase.table("research_projects").insert({"title": title}).execute()
+def create_project(title: str, row_id: str = None):
+    db.create_project(title, row_id)
+    invalidate("research_projects", user_id=user_id)
 
 def archive_project(project_id: str):
-    supabase.table("research_projects").update({"is_active": False}).eq("id", project_id).execute()
+    db.archive_project(project_id)
+    invalidate("research_projects", user_id=user_id)
 
 def delete_project(project_id: str):
-    supabase.table("research_projects").delete().eq("id", project_id).execute()
+    db.delete_project(project_id)
+    invalidate("research_projects", "research_logs", user_id=user_id)
 
 # --- Research Logs ---
-def get_latest_log(project_id: str):
-    response = supabase.table("research_logs").select("*").eq("project_id", project_id).order("created_at", desc=True).limit(1).execute()
-    return response.data[0] if response.data else None
-
-def get_all_logs(project_id: str):
-    response = supabase.table("research_logs").select("*").eq("project_id", project_id).order("created_at", desc=True).execute()
-    return response.data or []
-
-def get_research_logs_since(start_date: str):
-    """获取从 start_date 开始的所有 research logs"""
-    response = supabase.table("research_logs").select("*, research_projects(title)").gte("date", start_date).order("date", desc=True).execute()
-    return response.data or []
-
-def get_today_research_logs():
-    """获取今天的 research logs"""
-    response = supabase.table("research_logs").select("*, research_projects(title)").eq("date", today_str).execute()
-    return response.data or []
-
-def add_research_log(project_id: str, duration: int, content: str):
-    supabase.table("research_logs").insert({
-        "project_id": project_id,
-        "date": today_str,
-        "duration_minutes": duration,
-        "content": content
-    }).execute()
+HISTORY_PAGE_SIZE = 20  # History 弹出框每页条数
+
+@cached_read("research_logs")
+def get_project_logs(project_id: str, before: tuple = None):
+    """项目日志的一页; before 为上一页最后一条的 (created_at, id)"""
+    return db.get_project_logs(project_id, PROJECT_LOG_COLUMNS, before, HISTORY_PAGE_SIZE)
+
+# --- Summary ---
+@cached_read("daily_logs", "research_projects", "research_logs", "ideas", "idea_updates")
+def get_summary_dashboard(day: str, grain: str, start: str, end: str, activity_days: int = 14):
+    """一次 RPC 取回 Summary 页的全部数据 (见 schema.sql 中的 summary_dashboard)
+
+    grain 为 "week" / "month"，汇总行只取 [start, end] 区间内的桶；活动热力图取最近 activity_days 天。
+    附带每块数据的版本号 (内容哈希)，只在重新查询时计算，用作图表 spec 的缓存键
+    """
+    dashboard = db.summary_dashboard(day, grain, start, end, activity_days)
+    dashboard["versions"] = {
+        key: hashlib.sha1(json.dumps([day, value], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        for key, value in dashboard.items()
+    }
+    return dashboard
+
+def add_research_log(project_id: str, duration: int, content: str, row_id: str = None):
+    db.add_research_log(project_id, today_str, duration, content, row_id)
+    invalidate("research_logs", "research_projects", user_id=user_id)
 
 # --- Ideas ---
+ACTIVE_IDEA_COLUMNS = ("id", "title", "status", "created_at", "last_log_at", "last_preview")
+DONE_IDEA_COLUMNS = ("id", "title", "log_count")
+IDEA_UPDATE_COLUMNS = ("id", "content", "created_at")
+
+@cached_read("ideas")
 def get_all_ideas():
-    response = supabase.table("ideas").select("*").order("created_at", desc=True).execute()
-    return response.data or []
+    return db.get_all_ideas()
 
+@cached_read("ideas")
 def get_active_ideas():
-    response = supabase.table("ideas").select("*").neq("status", "Done").order("created_at", desc=True).execute()
-    return response.data or []
+    return by_recent_activity(db.get_active_ideas(ACTIVE_IDEA_COLUMNS))
 
+@cached_read("ideas")
 def get_done_ideas():
-    response = supabase.table("ideas").select("*").eq("status", "Done").order("updated_at", desc=True).execute()
-    return response.data or []
-
-def get_latest_idea_update(idea_id: str):
-    response = supabase.table("idea_updates").select("*").eq("idea_id", idea_id).order("created_at", desc=True).limit(1).execute()
-    return response.data[0] if response.data else None
+    return db.get_done_ideas(DONE_IDEA_COLUMNS)
 
-def get_today_idea_updates():
-    """获取今天的 idea updates"""
-    response = supabase.table("idea_updates").select("*, ideas(title)").gte("created_at", today_str).execute()
-    return response.data or []
-
-def create_idea(title: str):
-    supabase.table("ideas").insert({"title": title}).execute()
+def create_idea(title: str, row_id: str = None):
+    db.create_idea(title, row_id)
+    invalidate("ideas", user_id=user_id)
 
 def update_idea_status(idea_id: str, status: str):
-    supabase.table("ideas").update({"status": status, "updated_at": datetime.utcnow().isoformat()}).eq("id", idea_id).execute()
+    db.update_idea_status(idea_id, status)
+    invalidate("ideas", user_id=user_id)
 
 def delete_idea(idea_id: str):
-    supabase.table("ideas").delete().eq("id", idea_id).execute()
-
-def get_idea_updates(idea_id: str):
-    response = supabase.table("idea_updates").select("*").eq("idea_id", idea_id).order("created_at", desc=True).execute()
-    return response.data or []
-
-def add_idea_update(idea_id: str, content: str):
-    supabase.table("idea_updates").insert({"idea_id": idea_id, "content": content}).execute()
+    db.delete_idea(idea_id)
+    invalidate("ideas", "idea_updates", user_id=user_id)
+
+@cached_read("idea_updates")
+def get_idea_updates(idea_id: str, before: tuple = None):
+    """idea 更新记录的一页; before 为上一页最后一条的 (created_at, id)"""
+    return db.get_idea_updates(idea_id, IDEA_UPDATE_COLUMNS, before, HISTORY_PAGE_SIZE)
+
+def add_idea_update(idea_id: str, content: str, row_id: str = None):
+    db.add_idea_update(idea_id, content, row_id)
+    invalidate("idea_updates", "ideas", user_id=user_id)
+
+# --- 搜索 ---
+SEARCH_PAGE_SIZE = 20
+SEARCH_KINDS = {"All": None, "Research logs": "research_log", "Idea updates": "idea_update"}
+
+@cached_read("research_logs", "idea_updates", "research_projects", "ideas")
+def search_notes(query: str, kind: str = None, parent_id: str = None, start: str = None, end: str = None,
+                 before: tuple = None):
+    """全文搜索结果的一页; before 为上一页最后一条的 (rank, created_at, id)"""
+    return db.search_notes(query, kind, parent_id, start, end, before, SEARCH_PAGE_SIZE)
+
+# --- 并发预取 ---
+def prefetch(*readers):
+    """同时发出一组互不依赖的缓存读请求，等全部返回后再按原顺序渲染
+
+    结果直接进入 st.cache_data，渲染时的调用都是缓存命中；
+    出错的请求在这里忽略，渲染时会照常重试并处理。
+    """
+    if not readers:
+        return
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=len(readers),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+    ) as pool:
+        wait([pool.submit(reader) for reader in readers])
 
 # ============================================================
 # 初始化 Session State
@@ -199,38 +455,8 @@ if "initialized" not in st.session_state:
     st.session_state.initialized = True
     log = get_today_log()
 
-    if log:
-        st.session_state.newsletter_done = log.get("newsletter_done", False)
-        st.session_state.newsletter_time = log.get("newsletter_time", 0)
-        st.session_state.newsletter_note = log.get("newsletter_note") or ""
-        st.session_state.video_done = log.get("video_done", False)
-        st.session_state.video_time = log.get("video_time", 0)
-        st.session_state.video_note = log.get("video_note") or ""
-        st.session_state.wechat_done = log.get("wechat_done", False)
-        st.session_state.wechat_time = log.get("wechat_time", 0)
-        st.session_state.gre_vocab_count = log.get("gre_vocab_count", 0)
-        st.session_state.gre_verbal_count = log.get("gre_verbal_count", 0)
-        st.session_state.gre_reading_count = log.get("gre_reading_count", 0)
-        st.session_state.lc_easy_count = log.get("lc_easy_count", 0)
-        st.session_state.lc_medium_count = log.get("lc_medium_count", 0)
-        st.session_state.lc_hard_count = log.get("lc_hard_count", 0)
-        st.session_state.lc_notes = log.get("lc_notes") or ""
-    else:
-        st.session_state.newsletter_done = False
-        st.session_state.newsletter_time = 0
-        st.session_state.newsletter_note = ""
-        st.session_state.video_done = False
-        st.session_state.video_time = 0
-        st.session_state.video_note = ""
-        st.session_state.wechat_done = False
-        st.session_state.wechat_time = 0
-        st.session_state.gre_vocab_count = 0
-        st.session_state.gre_verbal_count = 0
-        st.session_state.gre_reading_count = 0
-        st.session_state.lc_easy_count = 0
-        st.session_state.lc_medium_count = 0
-        st.session_state.lc_hard_count = 0
-        st.session_state.lc_notes = ""
+    st.session_state.write_buffer = new_write_buffer(log)
+    load_daily_fields(log)
 
     st.session_state.research_mode = False
     st.session_state.research_time = 0
@@ -239,9 +465,40 @@ if "idea_mode" not in st.session_state:
     st.session_state.idea_mode = False
 
 # ============================================================
-# Tab Navigation
+# 页面导航 (只渲染当前页面, Summary 不看就不计算)
 # ============================================================
-tab1, tab2 = st.tabs(["📝 Daily Log", "📊 Summary"])
+page = st.radio("Page", ["📝 Daily Log", "📊 Summary", "🔍 Search"], horizontal=True, key="page", label_visibility="collapsed")
+
+if "auth_email" in st.session_state:
+    st.sidebar.caption(st.session_state.auth_email)
+    st.sidebar.button("Sign out", on_click=sign_out)
+
+# ============================================================
+# 自动刷新: 变更订阅收到本页用到的表有改动, 或本地写日志回放完成时整页重跑 (缓存已按表清除, 只有这些表会重新查询)
+# ============================================================
+@st.fragment(run_every=LIVE_POLL)
+def live_refresh():
+    changed = set()
+    if feed is not None:
+        counts = feed.snapshot(user_id)
+        seen = st.session_state.get("feed_seen", counts)
+        st.session_state.feed_seen = counts
+        changed = feed.changed(seen, counts)
+    # 刚保存的行先进本地日志, 回放前读不到; 回放后 on_sync 已清掉相应缓存, 重跑一次就能显示
+    synced = db.synced if isinstance(db, JournaledStorage) else 0
+    replayed = st.session_state.get("journal_synced", synced) != synced
+    st.session_state.journal_synced = synced
+    if not (changed or replayed):
+        return
+    # 其他设备改了今天的计数: 校正写缓冲, 各模块渲染前并入显示值; 本地日志还有未回放的写入时数据库不是最新, 跳过
+    if "daily_logs" in changed and not (isinstance(db, JournaledStorage) and db.pending_count()):
+        get_write_buffer().reconcile(lambda: db.get_daily_log(today_str, ("date", *METRIC_COLUMNS)))
+    # 整页运行时后面的区块本来就会读到新数据
+    if getattr(get_script_run_ctx(), "fragment_ids_this_run", None):
+        st.rerun()
+
+if feed is not None or isinstance(db, JournaledStorage):
+    live_refresh()
 
 # ============================================================
 # 自定义 CSS
@@ -269,15 +526,67 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ============================================================
-# 📝 Daily Log 页面
+# 📝 Daily Log 模块
+# 每个模块是独立的 fragment, 模块内的交互只重跑该模块
 # ============================================================
-with tab1:
-    st.title("📝 Daily Log")
-    st.caption(f"Today: {today_str}")
 
-    # ----------------------------------------------------------
-    # 模块 A: Information Diet
-    # ----------------------------------------------------------
+def rerun_module():
+    """只重跑当前模块; 若本次是整页运行 (非 fragment 重跑) 则重跑整页"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def submit_token(form: str) -> str:
+    """表单的提交令牌, 表单渲染时生成, 用作新行的 id: 同一次提交重试或回放多少次都只有一行"""
+    tokens = st.session_state.setdefault("submit_tokens", {})
+    return tokens.setdefault(form, str(uuid.uuid4()))
+
+def submitted(form: str, input_key: str):
+    """保存成功后换新令牌并清空输入框, 紧接着的重复点击会因为内容为空被拦下"""
+    st.session_state.submit_tokens.pop(form, None)
+    st.session_state.pop(input_key, None)
+
+def show_history_pages(pages_key: str, pages: int):
+    st.session_state[pages_key] = pages
+
+def history_popover(key: str, fetch_page, format_entry, empty_text: str):
+    """📜 History 弹出框: 打开时才查询, 按 (created_at, id) 分页加载, 每页合成一个 markdown 块"""
+    pages_key = f"history_pages_{key}"
+    try:
+        popover = st.popover("📜 History", key=f"history_{key}", on_change="rerun")
+    except TypeError:
+        popover = st.popover("📜 History")  # 旧版 Streamlit 感知不到弹出框开关, 改为点按钮加载
+    with popover:
+        is_open = getattr(popover, "open", None)
+        if is_open is False:
+            return
+        if is_open is None and pages_key not in st.session_state:
+            st.button("Load history", key=f"btn_{pages_key}", on_click=show_history_pages, args=(pages_key, 1))
+            return
+
+        pages = st.session_state.get(pages_key, 1)
+        cursor = None
+        for _ in range(pages):
+            rows = fetch_page(cursor)
+            if not rows:
+                break
+            st.markdown("\n\n---\n\n".join(format_entry(row) for row in rows))
+            cursor = (rows[-1].created_at, rows[-1].id)
+            if len(rows) < HISTORY_PAGE_SIZE:
+                break
+        else:
+            st.button("Load more", key=f"more_{pages_key}", on_click=show_history_pages, args=(pages_key, pages + 1))
+        if cursor is None:
+            st.caption(empty_text)
+
+# ----------------------------------------------------------
+# 模块 A: Information Diet
+# ----------------------------------------------------------
+@st.fragment
+@timed("Info Diet")
+def info_diet_module():
+    get_write_buffer().apply_offsets(st.session_state, ["newsletter_time", "video_time", "wechat_time"], METRIC_INPUTS)
     with st.container(border=True):
         st.subheader("📰 Information Diet")
 
@@ -288,15 +597,15 @@ with tab1:
                 if st.button("−5", key="nl_m", use_container_width=True):
                     st.session_state.newsletter_time = max(0, st.session_state.newsletter_time - 5)
                     auto_save()
-                    st.rerun()
+                    rerun_module()
             with col2:
                 st.markdown(f"<p style='text-align:center;font-size:1.1rem;margin:0.5rem 0;'>{st.session_state.newsletter_time} min</p>", unsafe_allow_html=True)
             with col3:
                 if st.button("+5", key="nl_p", use_container_width=True):
                     st.session_state.newsletter_time += 5
                     auto_save()
-                    st.rerun()
-            newsletter_note = st.text_input("What did you learn?", value=st.session_state.newsletter_note, key="nl_note", label_visibility="collapsed", placeholder="Notes...")
+                    rerun_module()
+            newsletter_note = st.text_input("What did you learn?", value=st.session_state.newsletter_note, key="nl_note", label_visibility="collapsed", placeholder="Notes...", on_change=save_info_notes)
             st.session_state.newsletter_note = newsletter_note
         st.session_state.newsletter_done = newsletter_done
 
@@ -307,15 +616,15 @@ with tab1:
                 if st.button("−5", key="vid_m", use_container_width=True):
                     st.session_state.video_time = max(0, st.session_state.video_time - 5)
                     auto_save()
-                    st.rerun()
+                    rerun_module()
             with col2:
                 st.markdown(f"<p style='text-align:center;font-size:1.1rem;margin:0.5rem 0;'>{st.session_state.video_time} min</p>", unsafe_allow_html=True)
             with col3:
                 if st.button("+5", key="vid_p", use_container_width=True):
                     st.session_state.video_time += 5
                     auto_save()
-                    st.rerun()
-            video_note = st.text_input("What did you learn?", value=st.session_state.video_note, key="vid_note", label_visibility="collapsed", placeholder="Notes...")
+                    rerun_module()
+            video_note = st.text_input("What did you learn?", value=st.session_state.video_note, key="vid_note", label_visibility="collapsed", placeholder="Notes...", on_change=save_info_notes)
             st.session_state.video_note = video_note
         st.session_state.video_done = video_done
 
@@ -326,19 +635,23 @@ with tab1:
                 if st.button("−5", key="wc_m", use_container_width=True):
                     st.session_state.wechat_time = max(0, st.session_state.wechat_time - 5)
                     auto_save()
-                    st.rerun()
+                    rerun_module()
             with col2:
                 st.markdown(f"<p style='text-align:center;font-size:1.1rem;margin:0.5rem 0;'>{st.session_state.wechat_time} min</p>", unsafe_allow_html=True)
             with col3:
                 if st.button("+5", key="wc_p", use_container_width=True):
                     st.session_state.wechat_time += 5
                     auto_save()
-                    st.rerun()
+                    rerun_module()
         st.session_state.wechat_done = wechat_done
 
-    # ----------------------------------------------------------
-    # 模块 B: Research & Projects
-    # ----------------------------------------------------------
+
+# ----------------------------------------------------------
+# 模块 B: Research & Projects
+# ----------------------------------------------------------
+@st.fragment
+@timed("Research")
+def research_module():
     with st.container(border=True):
         st.subheader("🔬 Research & Projects")
 
@@ -348,11 +661,13 @@ with tab1:
         if research_mode:
             with st.expander("➕ Create New Project"):
                 new_proj = st.text_input("Project name", key="new_proj", placeholder="e.g., ML Paper Implementation")
+                token = submit_token("new_proj")
                 if st.button("Create", key="btn_create_proj", use_container_width=True):
                     if new_proj.strip():
-                        create_project(new_proj.strip())
+                        create_project(new_proj.strip(), token)
+                        submitted("new_proj", "new_proj")
                         st.success(f"Created: {new_proj}")
-                        st.rerun()
+                        rerun_module()
 
             active_projects = get_active_projects()
 
@@ -360,47 +675,42 @@ with tab1:
                 st.markdown("**Active Projects**")
 
                 for proj in active_projects:
-                    proj_id = proj["id"]
-                    proj_title = proj["title"]
+                    proj_id = proj.id
+                    proj_title = proj.title
 
                     with st.expander(f"📂 {proj_title}"):
-                        latest_log = get_latest_log(proj_id)
-                        if latest_log:
-                            content_preview = (latest_log.get('content') or '')[:100]
-                            ellipsis = '...' if len(latest_log.get('content') or '') > 100 else ''
-                            st.info(f"📝 **Last** ({latest_log['date']}): {content_preview}{ellipsis}")
+                        show_last_activity(proj)
 
                         note_content = st.text_area("Today's progress", key=f"note_{proj_id}", placeholder="What did you accomplish?", height=80)
+                        token = submit_token(f"note_{proj_id}")
 
                         if st.button("💾 Save", key=f"btn_save_{proj_id}", use_container_width=True):
                             if note_content.strip():
-                                add_research_log(proj_id, 0, note_content.strip())
+                                add_research_log(proj_id, 0, note_content.strip(), token)
+                                submitted(f"note_{proj_id}", f"note_{proj_id}")
                                 st.success("Saved!")
-                                st.rerun()
+                                rerun_module()
                             else:
                                 st.warning("Write something before saving.")
 
                         col1, col2 = st.columns(2)
                         with col1:
-                            with st.popover("📜 History"):
-                                all_logs = get_all_logs(proj_id)
-                                if all_logs:
-                                    for log in all_logs:
-                                        st.markdown(f"**{log['date']}**")
-                                        st.markdown(f"> {log['content']}")
-                                        st.markdown("---")
-                                else:
-                                    st.caption("No logs yet.")
+                            history_popover(
+                                f"proj_{proj_id}",
+                                lambda before: get_project_logs(proj_id, before),
+                                lambda log: f"**{log.date}**\n\n> {log.content}",
+                                "No logs yet.",
+                            )
                         with col2:
                             with st.popover("⚙️ Manage"):
                                 if st.button("📦 Archive", key=f"btn_archive_{proj_id}", use_container_width=True):
                                     archive_project(proj_id)
                                     st.success("Archived!")
-                                    st.rerun()
+                                    rerun_module()
                                 st.markdown("---")
                                 if st.button("🗑️ Delete", key=f"btn_delete_{proj_id}", type="secondary", use_container_width=True):
                                     delete_project(proj_id)
-                                    st.rerun()
+                                    rerun_module()
             else:
                 st.caption("No active projects. Create one above!")
 
@@ -410,17 +720,21 @@ with tab1:
                     for proj in archived:
                         col1, col2 = st.columns([3, 1])
                         with col1:
-                            st.markdown(f"**{proj['title']}**")
-                            logs = get_all_logs(proj["id"])
-                            st.caption(f"{len(logs)} sessions logged")
+                            st.markdown(f"**{proj.title}**")
+                            st.caption(f"{proj.log_count or 0} sessions logged")
                         with col2:
-                            if st.button("🗑️", key=f"del_archived_{proj['id']}"):
-                                delete_project(proj["id"])
-                                st.rerun()
-
-    # ----------------------------------------------------------
-    # 模块 C: GRE Grind
-    # ----------------------------------------------------------
+                            if st.button("🗑️", key=f"del_archived_{proj.id}"):
+                                delete_project(proj.id)
+                                rerun_module()
+
+
+# ----------------------------------------------------------
+# 模块 C: GRE Grind
+# ----------------------------------------------------------
+@st.fragment
+@timed("GRE")
+def gre_module():
+    get_write_buffer().apply_offsets(st.session_state, ["gre_vocab_count", "gre_verbal_count", "gre_reading_count"], METRIC_INPUTS)
     with st.container(border=True):
         st.subheader("📚 GRE Grind")
 
@@ -447,9 +761,14 @@ with tab1:
                 on_change=save_gre_progress
             )
 
-    # ----------------------------------------------------------
-    # 模块 D: LeetCode Grind
-    # ----------------------------------------------------------
+
+# ----------------------------------------------------------
+# 模块 D: LeetCode Grind
+# ----------------------------------------------------------
+@st.fragment
+@timed("LeetCode")
+def leetcode_module():
+    get_write_buffer().apply_offsets(st.session_state, ["lc_easy_count", "lc_medium_count", "lc_hard_count"], METRIC_INPUTS)
     lc_total = st.session_state.lc_easy_count + st.session_state.lc_medium_count + st.session_state.lc_hard_count
     with st.container(border=True):
         st.markdown(f"### LeetCode (Total: {lc_total})")
@@ -487,9 +806,13 @@ with tab1:
                 on_change=save_leetcode_progress
             )
 
-    # ----------------------------------------------------------
-    # 模块 E: Idea Incubator
-    # ----------------------------------------------------------
+
+# ----------------------------------------------------------
+# 模块 E: Idea Incubator
+# ----------------------------------------------------------
+@st.fragment
+@timed("Ideas")
+def idea_module():
     with st.container(border=True):
         st.subheader("💡 Idea Incubator")
 
@@ -499,11 +822,13 @@ with tab1:
         if idea_mode:
             with st.expander("➕ Create New Idea"):
                 new_idea = st.text_input("Idea title", key="new_idea", placeholder="e.g., AI-powered study planner")
+                token = submit_token("new_idea")
                 if st.button("Create", key="btn_create_idea", use_container_width=True):
                     if new_idea.strip():
-                        create_idea(new_idea.strip())
+                        create_idea(new_idea.strip(), token)
+                        submitted("new_idea", "new_idea")
                         st.success(f"Created: {new_idea}")
-                        st.rerun()
+                        rerun_module()
 
             active_ideas = get_active_ideas()
 
@@ -517,17 +842,13 @@ with tab1:
                 }
 
                 for idea in active_ideas:
-                    idea_id = idea["id"]
-                    idea_title = idea["title"]
-                    current_status = idea.get("status", "Seed")
+                    idea_id = idea.id
+                    idea_title = idea.title
+                    current_status = idea.status or "Seed"
                     emoji, badge = status_config.get(current_status, ("🌱", "Seed"))
 
                     with st.expander(f"{emoji} {idea_title} `[{badge}]`"):
-                        latest_update = get_latest_idea_update(idea_id)
-                        if latest_update:
-                            content_preview = (latest_update.get('content') or '')[:100]
-                            ellipsis = '...' if len(latest_update.get('content') or '') > 100 else ''
-                            st.info(f"📝 **Last** ({latest_update['created_at'][:10]}): {content_preview}{ellipsis}")
+                        show_last_activity(idea)
 
                         note_content = st.text_area("New thought or progress", key=f"idea_note_{idea_id}", placeholder="What's your latest thinking?", height=80)
 
@@ -535,37 +856,36 @@ with tab1:
                         mapped_status = {"Idea": "Seed", "In Progress": "Building"}.get(current_status, current_status)
                         current_idx = status_options.index(mapped_status) if mapped_status in status_options else 0
                         new_status = st.selectbox("Status", status_options, index=current_idx, key=f"status_{idea_id}")
+                        token = submit_token(f"idea_note_{idea_id}")
 
                         if st.button("💾 Save", key=f"btn_save_idea_{idea_id}", use_container_width=True):
                             saved = False
                             if note_content.strip():
-                                add_idea_update(idea_id, note_content.strip())
+                                add_idea_update(idea_id, note_content.strip(), token)
+                                submitted(f"idea_note_{idea_id}", f"idea_note_{idea_id}")
                                 saved = True
                             if new_status != current_status and new_status != mapped_status:
                                 update_idea_status(idea_id, new_status)
                                 saved = True
                             if saved:
                                 st.success("Saved!")
-                                st.rerun()
+                                rerun_module()
                             else:
                                 st.warning("Nothing to save.")
 
                         col1, col2 = st.columns(2)
                         with col1:
-                            with st.popover("📜 History"):
-                                updates = get_idea_updates(idea_id)
-                                if updates:
-                                    for u in updates:
-                                        st.markdown(f"**{u['created_at'][:10]}**")
-                                        st.markdown(f"> {u['content']}")
-                                        st.markdown("---")
-                                else:
-                                    st.caption("No updates yet.")
+                            history_popover(
+                                f"idea_{idea_id}",
+                                lambda before: get_idea_updates(idea_id, before),
+                                lambda u: f"**{u.created_at[:10]}**\n\n> {u.content}",
+                                "No updates yet.",
+                            )
                         with col2:
                             with st.popover("⚙️ Manage"):
                                 if st.button("🗑️ Delete", key=f"del_idea_{idea_id}", use_container_width=True):
                                     delete_idea(idea_id)
-                                    st.rerun()
+                                    rerun_module()
             else:
                 st.caption("No active ideas. Create one above!")
 
@@ -575,33 +895,183 @@ with tab1:
                     for idea in done_ideas:
                         col1, col2 = st.columns([3, 1])
                         with col1:
-                            st.markdown(f"**{idea['title']}**")
-                            updates = get_idea_updates(idea["id"])
-                            st.caption(f"{len(updates)} updates logged")
+                            st.markdown(f"**{idea.title}**")
+                            st.caption(f"{idea.log_count or 0} updates logged")
                         with col2:
-                            if st.button("🗑️", key=f"del_done_idea_{idea['id']}"):
-                                delete_idea(idea["id"])
-                                st.rerun()
+                            if st.button("🗑️", key=f"del_done_idea_{idea.id}"):
+                                delete_idea(idea.id)
+                                rerun_module()
+
+
+# ============================================================
+# 📝 Daily Log 页面
+# ============================================================
+@timed("Daily Log")
+def daily_log_page():
+    # 本页要展开的模块所需的读请求并发发出 (勾选框的新值在 widget key 中)
+    readers = []
+    if st.session_state.get("cb_research", st.session_state.research_mode):
+        readers += [get_active_projects, get_archived_projects]
+    if st.session_state.get("cb_idea", st.session_state.idea_mode):
+        readers += [get_active_ideas, get_done_ideas]
+    prefetch(*readers)
+
+    st.title("📝 Daily Log")
+    st.caption(f"Today: {today_str}")
+
+    info_diet_module()
+    research_module()
+    gre_module()
+    leetcode_module()
+    idea_module()
 
     # ----------------------------------------------------------
     # 自动保存提示
     # ----------------------------------------------------------
     st.markdown("")
     st.caption("💾 Auto-save enabled — your data is saved automatically when you click +/- buttons")
+    error = get_write_buffer().error
+    if error is not None:
+        st.warning(f"⚠️ Couldn't save your latest changes, retrying in the background: {error}")
+    if isinstance(db, JournaledStorage):
+        pending = db.pending_count()
+        if pending:
+            st.caption(f"⏳ {pending} change(s) waiting to sync")
+        failed = db.failed_entries()
+        if failed:
+            # 超过重试上限的日志不会再自动回放, 要让用户看到
+            with st.expander(f"⚠️ {len(failed)} change(s) failed to sync and were set aside"):
+                for seq, table, _, attempts, last_error in failed:
+                    st.caption(f"#{seq} `{table}` after {attempts} attempts: {last_error}")
 
 # ============================================================
 # 📊 Summary 页面
 # ============================================================
-with tab2:
+CHART_CACHE_ENTRIES = 256
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def chart_spec(name: str, version: str, _build):
+    """构建好的 Vega-Lite spec (含数据)，按 (图表名, 数据版本) 跨 rerun 和 session 复用
+
+    _build 返回 Altair 图表，只在缓存未命中时调用，不参与缓存键；
+    name 需包含影响图表但不在数据中的参数 (例如权重)
+    """
+    import altair as alt
+    with alt.data_transformers.enable("default", max_rows=None):
+        return _build().to_dict()
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def summary_frame(version: str, _rows: list):
+    """to_summary_frame 的结果按数据版本缓存: 同一份数据的各图表共用, 只转换一次"""
+    return to_summary_frame(_rows)
+
+def show_chart(name: str, version: str, build):
+    # 每张图单独计时, 埋点面板里能看出是哪张图慢; 出错仍交给外层区块的 fallback
+    with section(f"Chart: {name}"):
+        st.vega_lite_chart(chart_spec(name, version, build), use_container_width=True)
+
+ACTIVITY_WINDOWS = [14, 90, 365]  # 活动热力图可选的天数
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def activity_heatmap(events: list, entities: list, days: int, label: str, color: str,
+                     version: str, weight: str = "count"):
+    """项目 / idea 共用的活动热力图
+
+    events 为服务端按 (id, date) 聚合的行, entities 为 [{id, title}];
+    90 天以内按天画, 更长的窗口按周合并, 并在上方画 GitHub 式的年度格子。
+    version 为 events / entities 的数据版本, 不变时直接复用缓存的图表。
+    """
+    import altair as alt
+    from activity import activity_matrix, by_week, long_frame, window_dates, year_grid
+
+    titles = [entity["title"] for entity in entities]
+    value_title = "Minutes" if weight == "minutes" else "Count"
+    name = f"{label}_activity:{days}:{weight}"
+
+    def matrix():
+        return activity_matrix(events, [entity["id"] for entity in entities], today, days, weight)
+
+    def color_scale(values):
+        return alt.Scale(domain=[0, max(float(values.max()), 1.0)], range=["#2d2d2d", color], clamp=True)
+
+    def build_grid():
+        totals = matrix().sum(axis=0)
+        return alt.Chart(year_grid(totals, today)).mark_rect(cornerRadius=2).encode(
+            x=alt.X("week:T", title="", axis=alt.Axis(format="%b")),
+            y=alt.Y("weekday:N", title="", sort=WEEKDAYS),
+            color=alt.Color("value:Q", scale=color_scale(totals), legend=None),
+            tooltip=[alt.Tooltip("date:T", format="%Y-%m-%d"), alt.Tooltip("value:Q", title=value_title)]
+        ).properties(height=140)
+
+    def build_heatmap():
+        if days > 90:
+            values, dates = by_week(matrix(), today)
+            x_title, tooltip_date = "Week", alt.Tooltip("date:T", title="Week of", format="%Y-%m-%d")
+        else:
+            values, dates = matrix(), window_dates(today, days)
+            x_title, tooltip_date = "Date", alt.Tooltip("date:T", format="%Y-%m-%d")
+        column = label.lower()
+        return alt.Chart(long_frame(values, titles, dates, column)).mark_rect(cornerRadius=3).encode(
+            x=alt.X("date:T", title=x_title, axis=alt.Axis(format="%m/%d", labelAngle=-45)),
+            y=alt.Y(f"{column}:N", title=label, sort=titles),
+            color=alt.Color("value:Q", scale=color_scale(values), legend=None),
+            tooltip=[f"{column}:N", tooltip_date, alt.Tooltip("value:Q", title=value_title)]
+        ).properties(
+            height=max(100, len(titles) * (30 if len(titles) <= 20 else 14))
+        )
+
+    if days > 90:
+        show_chart(f"{name}:grid", version, build_grid)
+    show_chart(name, version, build_heatmap)
+
+@timed("Summary")
+def summary_page():
+    # 分析相关的库只在打开 Summary 时才导入
+    import altair as alt
+
     st.title("📊 Summary Report")
 
+    # 汇总图表的粒度和区间
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        grain_label = st.radio("Granularity", ["Week", "Month"], horizontal=True, key="summary_grain")
+    with col2:
+        date_range = st.date_input(
+            "Range",
+            value=(today - timedelta(weeks=26), today),
+            max_value=today,
+            key="summary_range"
+        )
+    with col3:
+        activity_days = st.selectbox("Activity", ACTIVITY_WINDOWS, format_func=lambda days: f"{days} days", key="activity_days")
+    # 只选了起始日期时, 结束日期先按今天算
+    range_start = date_range[0] if date_range else today - timedelta(weeks=26)
+    range_end = date_range[1] if len(date_range) > 1 else today
+    grain = grain_label.lower()
+    period_label = f"{grain_label}ly"
+    period_format = "%m/%d" if grain == "week" else "%Y-%m"
+
+    # 整个 Summary 页只发一次请求
+    dashboard = {}
+    with section("Summary: query", fallback=""):
+        dashboard = get_summary_dashboard(today_str, grain, range_start.isoformat(), range_end.isoformat(), activity_days)
+    week_rows = dashboard.get("week_days") or []
+    rollup_rows = dashboard.get("rollups") or []
+    # 图表 spec 按数据版本缓存, 数据不变时跳过构建和序列化
+    versions = dashboard.get("versions") or {}
+    week_version = versions.get("week_days", "")
+    rollup_version = f"{grain}:{versions.get('rollups', '')}"
+    # 两份 DataFrame 在图表缓存未命中时才取, 一次运行内各图表共用同一份
+    week_frame = cache(lambda: summary_frame(week_version, week_rows))
+    rollup_frame = cache(lambda: summary_frame(rollup_version, rollup_rows))
+
     # ----------------------------------------------------------
     # Today's Snapshot
     # ----------------------------------------------------------
-    with st.container(border=True):
+    with st.container(border=True), section("Summary: Today's Snapshot"):
         st.markdown("### 🎯 Today's Snapshot")
 
-        today_log = get_today_log()
+        today_log = dashboard.get("today")
 
         # Info Diet
         if today_log:
@@ -611,9 +1081,8 @@ with tab2:
         st.markdown(f"**Info Diet:** {info_time} min")
 
         # Projects
-        today_research = get_today_research_logs()
-        if today_research:
-            project_names = [log.get("research_projects", {}).get("title", "Unknown") if log.get("research_projects") else "Unknown" for log in today_research]
+        project_names = dashboard.get("today_projects") or []
+        if project_names:
             st.markdown("**Projects:**")
             for name in project_names:
                 st.markdown(f"- {name}")
@@ -639,9 +1108,8 @@ with tab2:
         st.markdown(f"**LeetCode:** Easy {lc_easy} / Med {lc_med} / Hard {lc_hard}")
 
         # Ideas
-        today_ideas = get_today_idea_updates()
-        if today_ideas:
-            idea_names = list(set([update.get("ideas", {}).get("title", "Unknown") if update.get("ideas") else "Unknown" for update in today_ideas]))
+        idea_names = dashboard.get("today_ideas") or []
+        if idea_names:
             st.markdown("**Ideas:**")
             for name in idea_names:
                 st.markdown(f"- {name}")
@@ -651,21 +1119,10 @@ with tab2:
     # ----------------------------------------------------------
     # A. Information Diet Trends
     # ----------------------------------------------------------
-    with st.container(border=True):
+    with st.container(border=True), section("Summary: Information Diet", fallback="No Information Diet data available."):
         st.markdown("### 📉 Information Diet Trends")
 
-        try:
-            all_logs = get_all_logs()
-        except Exception:
-            all_logs = []
-
-        if all_logs and len(all_logs) > 0:
-            # 数据准备
-            df = pd.DataFrame(all_logs)
-            df["date"] = pd.to_datetime(df["date"])
-            df["newsletter_time"] = df["newsletter_time"].fillna(0)
-            df["video_time"] = df["video_time"].fillna(0)
-            df["wechat_time"] = df["wechat_time"].fillna(0)
+        if week_rows or rollup_rows:
 
             # 颜色映射
             color_scale = alt.Scale(
@@ -676,378 +1133,280 @@ with tab2:
             # 图表一：当前周每日趋势折线图
             st.markdown("**This Week (Daily)**")
 
-            # 计算本周一的日期
-            today_dt = pd.Timestamp(today)
-            monday = today_dt - timedelta(days=today_dt.weekday())
-            df_week = df[df["date"] >= monday].copy()
+            if week_rows:
+                def build_daily_chart():
+                    # 转换为长格式
+                    df_week_melted = week_frame().reset_index().melt(
+                        id_vars=["date"],
+                        value_vars=["newsletter_time", "video_time", "wechat_time"],
+                        var_name="Category",
+                        value_name="Minutes"
+                    )
+                    category_map = {
+                        "newsletter_time": "Newsletter",
+                        "video_time": "Video",
+                        "wechat_time": "WeChat"
+                    }
+                    df_week_melted["Category"] = df_week_melted["Category"].map(category_map)
+
+                    return alt.Chart(df_week_melted).mark_line(point=True, strokeWidth=2).encode(
+                        x=alt.X("date:T", title="Date"),
+                        y=alt.Y("Minutes:Q", title="Minutes"),
+                        color=alt.Color("Category:N", scale=color_scale, legend=alt.Legend(title="Category")),
+                        tooltip=["date:T", "Category:N", "Minutes:Q"]
+                    ).properties(
+                        height=300
+                    )
+
+                show_chart("info_daily", week_version, build_daily_chart)
+            else:
+                st.caption("No data for this week yet.")
+
+            # 图表二：所有周总量堆叠柱状图
+            st.markdown(f"**{period_label} (Total Hours)**")
+
+            def build_period_chart():
+                # 周 / 月汇总 (log_rollups)
+                df_weekly = rollup_frame()[["newsletter_time", "video_time", "wechat_time"]].reset_index()
+
+                # 转换为小时
+                df_weekly["Newsletter"] = df_weekly["newsletter_time"] / 60
+                df_weekly["Video"] = df_weekly["video_time"] / 60
+                df_weekly["WeChat"] = df_weekly["wechat_time"] / 60
 
-            if not df_week.empty:
                 # 转换为长格式
-                df_week_melted = df_week.melt(
+                df_weekly_melted = df_weekly.melt(
                     id_vars=["date"],
-                    value_vars=["newsletter_time", "video_time", "wechat_time"],
+                    value_vars=["Newsletter", "Video", "WeChat"],
                     var_name="Category",
-                    value_name="Minutes"
+                    value_name="Hours"
                 )
-                category_map = {
-                    "newsletter_time": "Newsletter",
-                    "video_time": "Video",
-                    "wechat_time": "WeChat"
-                }
-                df_week_melted["Category"] = df_week_melted["Category"].map(category_map)
 
-                daily_chart = alt.Chart(df_week_melted).mark_line(point=True, strokeWidth=2).encode(
-                    x=alt.X("date:T", title="Date"),
-                    y=alt.Y("Minutes:Q", title="Minutes"),
+                return alt.Chart(df_weekly_melted).mark_bar().encode(
+                    x=alt.X("date:T", title=grain_label, axis=alt.Axis(format=period_format)),
+                    y=alt.Y("Hours:Q", title="Hours", stack="zero"),
                     color=alt.Color("Category:N", scale=color_scale, legend=alt.Legend(title="Category")),
-                    tooltip=["date:T", "Category:N", "Minutes:Q"]
+                    tooltip=["date:T", "Category:N", alt.Tooltip("Hours:Q", format=".1f")]
                 ).properties(
                     height=300
-                )
+                ).interactive(bind_x=True)
 
-                st.altair_chart(daily_chart, use_container_width=True)
-            else:
-                st.caption("No data for this week yet.")
-
-            # 图表二：所有周总量堆叠柱状图
-            st.markdown("**All Weeks (Total Hours)**")
-
-            # 按周聚合
-            df_weekly = df.set_index("date").resample("W-MON")[
-                ["newsletter_time", "video_time", "wechat_time"]
-            ].sum().reset_index()
-
-            # 转换为小时
-            df_weekly["Newsletter"] = df_weekly["newsletter_time"] / 60
-            df_weekly["Video"] = df_weekly["video_time"] / 60
-            df_weekly["WeChat"] = df_weekly["wechat_time"] / 60
-
-            # 转换为长格式
-            df_weekly_melted = df_weekly.melt(
-                id_vars=["date"],
-                value_vars=["Newsletter", "Video", "WeChat"],
-                var_name="Category",
-                value_name="Hours"
-            )
-
-            weekly_chart = alt.Chart(df_weekly_melted).mark_bar().encode(
-                x=alt.X("date:T", title="Week"),
-                y=alt.Y("Hours:Q", title="Hours", stack="zero"),
-                color=alt.Color("Category:N", scale=color_scale, legend=alt.Legend(title="Category")),
-                tooltip=["date:T", "Category:N", alt.Tooltip("Hours:Q", format=".1f")]
-            ).properties(
-                height=300
-            ).interactive(bind_x=True)
-
-            st.altair_chart(weekly_chart, use_container_width=True)
+            show_chart("info_period", rollup_version, build_period_chart)
         else:
             st.info("No data available for Information Diet trends.")
 
     # ----------------------------------------------------------
-    # B. 项目贡献热力图 (Past 14 Days)
+    # B. 项目贡献热力图
     # ----------------------------------------------------------
-    with st.container(border=True):
-        st.markdown("### 📅 Project Activity (Past 14 Days)")
-
-        try:
-            # 获取过去14天的日期范围
-            start_14 = (today - timedelta(days=13)).isoformat()
-            research_logs_14 = supabase.table("research_logs").select("*, research_projects(title)").gte("date", start_14).execute().data or []
-
-            if research_logs_14:
-                # 构建数据
-                log_data = []
-                for log in research_logs_14:
-                    proj_title = log.get("research_projects", {}).get("title", "Unknown") if log.get("research_projects") else "Unknown"
-                    log_data.append({
-                        "project": proj_title,
-                        "date": log["date"]
-                    })
-
-                df_logs = pd.DataFrame(log_data)
-                df_logs["date"] = pd.to_datetime(df_logs["date"])
-                df_logs["value"] = 1
-
-                # 获取所有活跃项目
-                active_projects = get_active_projects()
-                project_names = [p["title"] for p in active_projects]
-
-                # 生成完整的14天日期范围
-                date_range = pd.date_range(end=today, periods=14)
-
-                # 创建完整的项目x日期矩阵
-                all_combinations = pd.MultiIndex.from_product(
-                    [project_names, date_range],
-                    names=["project", "date"]
-                ).to_frame(index=False)
-
-                # 合并实际数据
-                df_merged = all_combinations.merge(
-                    df_logs[["project", "date", "value"]],
-                    on=["project", "date"],
-                    how="left"
-                )
-                df_merged["value"] = df_merged["value"].fillna(0).astype(int)
-
-                if not df_merged.empty and len(project_names) > 0:
-                    # Altair 热力图
-                    heatmap = alt.Chart(df_merged).mark_rect(cornerRadius=3).encode(
-                        x=alt.X("date:T", title="Date", axis=alt.Axis(format="%m/%d", labelAngle=-45)),
-                        y=alt.Y("project:N", title="Project"),
-                        color=alt.Color(
-                            "value:Q",
-                            scale=alt.Scale(domain=[0, 1], range=["#2d2d2d", "#4CAF50"]),
-                            legend=None
-                        ),
-                        tooltip=["project:N", alt.Tooltip("date:T", format="%Y-%m-%d"), "value:Q"]
-                    ).properties(
-                        height=max(100, len(project_names) * 30)
-                    )
-
-                    st.altair_chart(heatmap, use_container_width=True)
-                else:
-                    st.caption("No active projects to display.")
-            else:
-                st.caption("No project activity in the past 14 days.")
-        except Exception as e:
-            st.caption("No project data available.")
+    with st.container(border=True), section("Summary: Project Activity", fallback="No project data available."):
+        st.markdown(f"### 📅 Project Activity (Past {activity_days} Days)")
+        weight_label = st.radio("Weight", ["Sessions", "Minutes"], horizontal=True, key="project_weight")
+
+        # 每个活跃项目每天的日志数和时长 (服务端已聚合)
+        project_activity = dashboard.get("project_activity") or []
+        active_projects = dashboard.get("active_projects") or []
+
+        if not active_projects:
+            st.caption("No active projects to display.")
+        elif project_activity:
+            activity_heatmap(project_activity, active_projects, activity_days, "Project", "#4CAF50",
+                             versions.get("project_activity", "") + versions.get("active_projects", ""),
+                             weight="minutes" if weight_label == "Minutes" else "count")
+        else:
+            st.caption(f"No project activity in the past {activity_days} days.")
 
     # ----------------------------------------------------------
     # C. GRE Progress
     # ----------------------------------------------------------
-    with st.container(border=True):
+    with st.container(border=True), section("Summary: GRE", fallback="No GRE data available."):
         st.markdown("### 📚 GRE Progress")
 
-        try:
-            all_logs = get_all_logs()
-        except Exception:
-            all_logs = []
-
-        if all_logs and len(all_logs) > 0:
-            df = pd.DataFrame(all_logs)
-            df["date"] = pd.to_datetime(df["date"])
-            df["gre_vocab_count"] = df["gre_vocab_count"].fillna(0)
-            df["gre_verbal_count"] = df["gre_verbal_count"].fillna(0)
-            df["gre_reading_count"] = df["gre_reading_count"].fillna(0)
-
-            # 本周数据
-            today_dt = pd.Timestamp(today)
-            monday = today_dt - timedelta(days=today_dt.weekday())
-            df_week = df[df["date"] >= monday].copy()
+        if week_rows or rollup_rows:
+
+            # (字段, 颜色, 纵轴, 标题)
+            gre_metrics = [
+                ("gre_vocab_count", "#4CAF50", "Words", "Vocabulary"),
+                ("gre_verbal_count", "#2196F3", "Sets", "Verbal Sets"),
+                ("gre_reading_count", "#FF9800", "Passages", "Reading"),
+            ]
 
             # 上半部分：本周每日数据
             st.markdown("**This Week (Daily)**")
 
-            if not df_week.empty:
-                col1, col2, col3 = st.columns(3)
-
-                with col1:
-                    vocab_chart = alt.Chart(df_week).mark_line(point=True, color="#4CAF50").encode(
-                        x=alt.X("date:T", title="", axis=alt.Axis(format="%a")),
-                        y=alt.Y("gre_vocab_count:Q", title="Words"),
-                        tooltip=["date:T", "gre_vocab_count:Q"]
-                    ).properties(height=150, title="Vocabulary")
-                    st.altair_chart(vocab_chart, use_container_width=True)
-
-                with col2:
-                    verbal_chart = alt.Chart(df_week).mark_line(point=True, color="#2196F3").encode(
-                        x=alt.X("date:T", title="", axis=alt.Axis(format="%a")),
-                        y=alt.Y("gre_verbal_count:Q", title="Sets"),
-                        tooltip=["date:T", "gre_verbal_count:Q"]
-                    ).properties(height=150, title="Verbal Sets")
-                    st.altair_chart(verbal_chart, use_container_width=True)
-
-                with col3:
-                    reading_chart = alt.Chart(df_week).mark_line(point=True, color="#FF9800").encode(
-                        x=alt.X("date:T", title="", axis=alt.Axis(format="%a")),
-                        y=alt.Y("gre_reading_count:Q", title="Passages"),
-                        tooltip=["date:T", "gre_reading_count:Q"]
-                    ).properties(height=150, title="Reading")
-                    st.altair_chart(reading_chart, use_container_width=True)
+            if week_rows:
+                for col, (field, color, y_title, title) in zip(st.columns(3), gre_metrics):
+                    def build_daily_chart(field=field, color=color, y_title=y_title, title=title):
+                        return alt.Chart(week_frame().reset_index()).mark_line(point=True, color=color).encode(
+                            x=alt.X("date:T", title="", axis=alt.Axis(format="%a")),
+                            y=alt.Y(f"{field}:Q", title=y_title),
+                            tooltip=["date:T", f"{field}:Q"]
+                        ).properties(height=150, title=title)
+
+                    with col:
+                        show_chart(f"gre_daily_{field}", week_version, build_daily_chart)
             else:
                 st.caption("No data for this week yet.")
 
             # 下半部分：历史周数据
-            st.markdown("**All Weeks (Total)**")
-
-            df_weekly = df.set_index("date").resample("W-MON")[
-                ["gre_vocab_count", "gre_verbal_count", "gre_reading_count"]
-            ].sum().reset_index()
-
-            if not df_weekly.empty:
-                col1, col2, col3 = st.columns(3)
-
-                with col1:
-                    vocab_weekly = alt.Chart(df_weekly).mark_bar(color="#4CAF50").encode(
-                        x=alt.X("date:T", title="Week", axis=alt.Axis(format="%m/%d")),
-                        y=alt.Y("gre_vocab_count:Q", title="Words"),
-                        tooltip=["date:T", "gre_vocab_count:Q"]
-                    ).properties(height=150, title="Vocabulary")
-                    st.altair_chart(vocab_weekly, use_container_width=True)
-
-                with col2:
-                    verbal_weekly = alt.Chart(df_weekly).mark_bar(color="#2196F3").encode(
-                        x=alt.X("date:T", title="Week", axis=alt.Axis(format="%m/%d")),
-                        y=alt.Y("gre_verbal_count:Q", title="Sets"),
-                        tooltip=["date:T", "gre_verbal_count:Q"]
-                    ).properties(height=150, title="Verbal Sets")
-                    st.altair_chart(verbal_weekly, use_container_width=True)
-
-                with col3:
-                    reading_weekly = alt.Chart(df_weekly).mark_bar(color="#FF9800").encode(
-                        x=alt.X("date:T", title="Week", axis=alt.Axis(format="%m/%d")),
-                        y=alt.Y("gre_reading_count:Q", title="Passages"),
-                        tooltip=["date:T", "gre_reading_count:Q"]
-                    ).properties(height=150, title="Reading")
-                    st.altair_chart(reading_weekly, use_container_width=True)
+            st.markdown(f"**{period_label} (Total)**")
+
+            if rollup_rows:
+                for col, (field, color, y_title, title) in zip(st.columns(3), gre_metrics):
+                    def build_period_chart(field=field, color=color, y_title=y_title, title=title):
+                        return alt.Chart(rollup_frame()[[field]].reset_index()).mark_bar(color=color).encode(
+                            x=alt.X("date:T", title=grain_label, axis=alt.Axis(format=period_format)),
+                            y=alt.Y(f"{field}:Q", title=y_title),
+                            tooltip=["date:T", f"{field}:Q"]
+                        ).properties(height=150, title=title)
+
+                    with col:
+                        show_chart(f"gre_period_{field}", rollup_version, build_period_chart)
         else:
             st.info("No GRE data available.")
 
     # ----------------------------------------------------------
     # D. LeetCode Progress
     # ----------------------------------------------------------
-    with st.container(border=True):
+    with st.container(border=True), section("Summary: LeetCode", fallback="No LeetCode data available."):
         st.markdown("### 💻 LeetCode Progress")
 
-        try:
-            all_logs = get_all_logs()
-        except Exception:
-            all_logs = []
-
-        if all_logs and len(all_logs) > 0:
-            df = pd.DataFrame(all_logs)
-            df["date"] = pd.to_datetime(df["date"])
-            df["lc_easy_count"] = df["lc_easy_count"].fillna(0)
-            df["lc_medium_count"] = df["lc_medium_count"].fillna(0)
-            df["lc_hard_count"] = df["lc_hard_count"].fillna(0)
-            df["lc_total"] = df["lc_easy_count"] + df["lc_medium_count"] + df["lc_hard_count"]
-
-            # 本周数据
-            today_dt = pd.Timestamp(today)
-            monday = today_dt - timedelta(days=today_dt.weekday())
-            df_week = df[df["date"] >= monday].copy()
+        if week_rows or rollup_rows:
 
             # 第一张：本周每日总数折线图
             st.markdown("**This Week (Daily Total)**")
 
-            if not df_week.empty:
-                daily_chart = alt.Chart(df_week).mark_line(point=True, color="#9C27B0", strokeWidth=2).encode(
-                    x=alt.X("date:T", title="Date", axis=alt.Axis(format="%a")),
-                    y=alt.Y("lc_total:Q", title="Problems"),
-                    tooltip=["date:T", "lc_total:Q", "lc_easy_count:Q", "lc_medium_count:Q", "lc_hard_count:Q"]
-                ).properties(height=200)
+            if week_rows:
+                def build_daily_chart():
+                    return alt.Chart(week_frame().reset_index()).mark_line(point=True, color="#9C27B0", strokeWidth=2).encode(
+                        x=alt.X("date:T", title="Date", axis=alt.Axis(format="%a")),
+                        y=alt.Y("lc_total:Q", title="Problems"),
+                        tooltip=["date:T", "lc_total:Q", "lc_easy_count:Q", "lc_medium_count:Q", "lc_hard_count:Q"]
+                    ).properties(height=200)
 
-                st.altair_chart(daily_chart, use_container_width=True)
+                show_chart("lc_daily", week_version, build_daily_chart)
             else:
                 st.caption("No data for this week yet.")
 
             # 第二张：历史周总数堆叠柱状图
-            st.markdown("**All Weeks (By Difficulty)**")
-
-            df_weekly = df.set_index("date").resample("W-MON")[
-                ["lc_easy_count", "lc_medium_count", "lc_hard_count"]
-            ].sum().reset_index()
-
-            # 转换为长格式
-            df_weekly_melted = df_weekly.melt(
-                id_vars=["date"],
-                value_vars=["lc_easy_count", "lc_medium_count", "lc_hard_count"],
-                var_name="Difficulty",
-                value_name="Count"
-            )
+            st.markdown(f"**{period_label} (By Difficulty)**")
 
-            # 重命名
-            difficulty_map = {
-                "lc_easy_count": "Easy",
-                "lc_medium_count": "Medium",
-                "lc_hard_count": "Hard"
-            }
-            df_weekly_melted["Difficulty"] = df_weekly_melted["Difficulty"].map(difficulty_map)
+            def build_period_chart():
+                df_weekly = rollup_frame()[["lc_easy_count", "lc_medium_count", "lc_hard_count"]].reset_index()
 
-            # 颜色映射
-            lc_color_scale = alt.Scale(
-                domain=["Easy", "Medium", "Hard"],
-                range=["#4CAF50", "#FF9800", "#F44336"]  # 绿、橙、红
-            )
+                # 转换为长格式
+                df_weekly_melted = df_weekly.melt(
+                    id_vars=["date"],
+                    value_vars=["lc_easy_count", "lc_medium_count", "lc_hard_count"],
+                    var_name="Difficulty",
+                    value_name="Count"
+                )
+
+                # 重命名
+                difficulty_map = {
+                    "lc_easy_count": "Easy",
+                    "lc_medium_count": "Medium",
+                    "lc_hard_count": "Hard"
+                }
+                df_weekly_melted["Difficulty"] = df_weekly_melted["Difficulty"].map(difficulty_map)
+
+                # 颜色映射
+                lc_color_scale = alt.Scale(
+                    domain=["Easy", "Medium", "Hard"],
+                    range=["#4CAF50", "#FF9800", "#F44336"]  # 绿、橙、红
+                )
 
-            weekly_chart = alt.Chart(df_weekly_melted).mark_bar().encode(
-                x=alt.X("date:T", title="Week", axis=alt.Axis(format="%m/%d")),
-                y=alt.Y("Count:Q", title="Problems", stack="zero"),
-                color=alt.Color("Difficulty:N", scale=lc_color_scale, legend=alt.Legend(title="Difficulty")),
-                tooltip=["date:T", "Difficulty:N", "Count:Q"]
-            ).properties(height=250).interactive(bind_x=True)
+                return alt.Chart(df_weekly_melted).mark_bar().encode(
+                    x=alt.X("date:T", title=grain_label, axis=alt.Axis(format=period_format)),
+                    y=alt.Y("Count:Q", title="Problems", stack="zero"),
+                    color=alt.Color("Difficulty:N", scale=lc_color_scale, legend=alt.Legend(title="Difficulty")),
+                    tooltip=["date:T", "Difficulty:N", "Count:Q"]
+                ).properties(height=250).interactive(bind_x=True)
 
-            st.altair_chart(weekly_chart, use_container_width=True)
+            show_chart("lc_period", rollup_version, build_period_chart)
         else:
             st.info("No LeetCode data available.")
 
     # ----------------------------------------------------------
-    # E. Idea Activity (Past 14 Days)
+    # E. Idea Activity
     # ----------------------------------------------------------
-    with st.container(border=True):
-        st.markdown("### 💡 Idea Activity (Past 14 Days)")
+    with st.container(border=True), section("Summary: Idea Activity", fallback="No idea data available."):
+        st.markdown(f"### 💡 Idea Activity (Past {activity_days} Days)")
+
+        # 每个活跃 idea 每天的更新数 (服务端已聚合)
+        idea_activity = dashboard.get("idea_activity") or []
+        active_ideas = dashboard.get("active_ideas") or []
+
+        if not active_ideas:
+            st.caption("No active ideas to display.")
+        elif idea_activity:
+            activity_heatmap(idea_activity, active_ideas, activity_days, "Idea", "#FF9800",
+                             versions.get("idea_activity", "") + versions.get("active_ideas", ""))
+        else:
+            st.caption(f"No idea updates in the past {activity_days} days.")
 
-        try:
-            # 获取过去14天的日期范围
-            start_14 = (today - timedelta(days=13)).isoformat()
-            idea_updates_14 = supabase.table("idea_updates").select("*, ideas(title)").gte("created_at", start_14).execute().data or []
-
-            if idea_updates_14:
-                # 构建数据
-                update_data = []
-                for update in idea_updates_14:
-                    idea_title = update.get("ideas", {}).get("title", "Unknown") if update.get("ideas") else "Unknown"
-                    # 从 created_at 提取日期
-                    created_date = update["created_at"][:10]
-                    update_data.append({
-                        "idea": idea_title,
-                        "date": created_date
-                    })
-
-                df_updates = pd.DataFrame(update_data)
-                df_updates["date"] = pd.to_datetime(df_updates["date"])
-                df_updates["value"] = 1
-
-                # 获取所有活跃 ideas
-                active_ideas = get_active_ideas()
-                idea_names = [i["title"] for i in active_ideas]
-
-                # 生成完整的14天日期范围
-                date_range = pd.date_range(end=today, periods=14)
-
-                # 创建完整的 idea x 日期矩阵
-                if idea_names:
-                    all_combinations = pd.MultiIndex.from_product(
-                        [idea_names, date_range],
-                        names=["idea", "date"]
-                    ).to_frame(index=False)
-
-                    # 合并实际数据
-                    df_merged = all_combinations.merge(
-                        df_updates[["idea", "date", "value"]],
-                        on=["idea", "date"],
-                        how="left"
-                    )
-                    df_merged["value"] = df_merged["value"].fillna(0).astype(int)
-
-                    # Altair 热力图
-                    heatmap = alt.Chart(df_merged).mark_rect(cornerRadius=3).encode(
-                        x=alt.X("date:T", title="Date", axis=alt.Axis(format="%m/%d", labelAngle=-45)),
-                        y=alt.Y("idea:N", title="Idea"),
-                        color=alt.Color(
-                            "value:Q",
-                            scale=alt.Scale(domain=[0, 1], range=["#2d2d2d", "#FF9800"]),
-                            legend=None
-                        ),
-                        tooltip=["idea:N", alt.Tooltip("date:T", format="%Y-%m-%d"), "value:Q"]
-                    ).properties(
-                        height=max(100, len(idea_names) * 30)
-                    )
+# ============================================================
+# 🔍 Search 页面
+# ============================================================
+def reset_search_pages():
+    st.session_state.pop("search_pages", None)
+
+def format_search_hit(hit) -> str:
+    icon = "🔬" if hit.kind == "research_log" else "💡"
+    return f"{icon} **{hit.parent_title or '(deleted)'}** · {hit.date}\n\n{hit.snippet}"
+
+@timed("Search")
+def search_page():
+    st.title("🔍 Search")
+    query = st.text_input("Search", key="search_query", on_change=reset_search_pages,
+                          placeholder="Search research logs and idea updates", label_visibility="collapsed")
+
+    col_kind, col_parent, col_dates = st.columns([1, 2, 2])
+    with col_kind:
+        kind = SEARCH_KINDS[st.selectbox("In", list(SEARCH_KINDS), key="search_kind", on_change=reset_search_pages)]
+    with col_parent:
+        if kind == "research_log":
+            titles = {project.id: project.title for project in get_all_projects()}
+        elif kind == "idea_update":
+            titles = {idea.id: idea.title for idea in get_all_ideas()}
+        else:
+            titles = {}
+        parent_id = st.selectbox("Project / Idea", [None, *titles], key=f"search_parent_{kind}",
+                                 format_func=lambda key: titles.get(key, "All"),
+                                 on_change=reset_search_pages, disabled=not titles)
+    with col_dates:
+        dates = st.date_input("Dates", value=(), key="search_dates", on_change=reset_search_pages)
+    start = dates[0].isoformat() if len(dates) > 0 else None
+    end = dates[1].isoformat() if len(dates) > 1 else None
+
+    query = query.strip()
+    if not query:
+        st.caption("Type a few words to search all research logs and idea updates.")
+        return
+
+    pages = st.session_state.get("search_pages", 1)
+    cursor = None
+    for _ in range(pages):
+        hits = search_notes(query, kind, parent_id, start, end, cursor)
+        if not hits:
+            break
+        st.markdown("\n\n---\n\n".join(format_search_hit(hit) for hit in hits))
+        cursor = (hits[-1].rank, hits[-1].created_at, hits[-1].id)
+        if len(hits) < SEARCH_PAGE_SIZE:
+            break
+    else:
+        st.button("Load more", key="more_search", on_click=show_history_pages, args=("search_pages", pages + 1))
+    if cursor is None:
+        st.caption("No matches.")
 
-                    st.altair_chart(heatmap, use_container_width=True)
-                else:
-                    st.caption("No active ideas to display.")
-            else:
-                st.caption("No idea updates in the past 14 days.")
-        except Exception as e:
-            st.caption("No idea data available.")
+# ============================================================
+# 渲染当前页面
+# ============================================================
+if page == "📝 Daily Log":
+    daily_log_page()
+elif page == "📊 Summary":
+    summary_page()
+else:
+    search_page()
+
+render_debug_panel()
+end_run()
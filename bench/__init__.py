@@ -0,0 +1 @@
+"""性能基准: 假 Supabase 客户端 + 合成数据 + AppTest 驱动的交互场景"""
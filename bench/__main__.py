@@ -0,0 +1,128 @@
+# ============================================================
+# 基准测试入口: python -m bench [--rounds 3] [--output bench_output.txt]
+# 用合成数据驱动 app.py, 报告主要交互的耗时、查询数、响应字节数和内存峰值
+# ============================================================
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import streamlit as st
+import supabase
+from streamlit.testing.v1 import AppTest
+
+from bench.fake_supabase import FakeSupabase
+from bench.synthetic import populate
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+METRICS = ["wall_ms", "queries", "payload_kb", "peak_mb"]
+SETTLE = 2.0  # 秒, 大于 writebuffer.py 的 FLUSH_DELAY, 让延迟写入算进触发它的那次交互
+
+
+def measure(client: FakeSupabase, action, settle: float = 0.0):
+    """执行一次交互 (一个或多个 rerun), 返回各项指标
+
+    settle: 交互结束后再等待的秒数, 期间的后台查询计入本次交互, 但不计入耗时
+    """
+    client.reset_calls()
+    tracemalloc.start()
+    started = time.perf_counter()
+    at = action()
+    wall = time.perf_counter() - started
+    time.sleep(settle)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = list(client.calls)
+    return {
+        "wall_ms": wall * 1000,
+        "queries": len(calls),
+        "payload_kb": sum(call["bytes"] for call in calls) / 1024,
+        "peak_mb": peak / 1024 / 1024,
+        "errors": len(at.exception),
+        "calls": calls,
+    }
+
+
+def run_round(client: FakeSupabase, secrets: dict, timeout: float):
+    """一轮完整的交互序列, 每轮都从空缓存开始"""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    for section, values in secrets.items():
+        at.secrets[section] = values
+    results = {}
+
+    results["cold load"] = measure(client, at.run)
+    results["warm rerun"] = measure(client, at.run)
+
+    at.checkbox(key="cb_nl").check().run()
+    results["+5 click"] = measure(client, lambda: at.button(key="nl_p").click().run(), settle=SETTLE)
+
+    at.checkbox(key="cb_research").check().run()
+    project = client.storage.get_active_projects()[0]
+    at.text_area(key=f"note_{project.id}").input("Benchmark progress note")
+    results["project save"] = measure(client, lambda: at.button(key=f"btn_save_{project.id}").click().run())
+
+    results["summary render"] = measure(client, lambda: at.radio(key="page").set_value("📊 Summary").run())
+    return results
+
+
+def report(rounds: list, verbose: bool) -> str:
+    lines = [f"{'interaction':<16}" + "".join(f"{m:>12}" for m in METRICS) + f"{'errors':>8}"]
+    for name in rounds[0]:
+        samples = [r[name] for r in rounds]
+        medians = [statistics.median(s[m] for s in samples) for m in METRICS]
+        errors = max(s["errors"] for s in samples)
+        lines.append(
+            f"{name:<16}{medians[0]:>12.1f}{medians[1]:>12.0f}{medians[2]:>12.1f}{medians[3]:>12.1f}{errors:>8}")
+        if verbose:
+            for call in samples[-1]["calls"]:
+                lines.append(
+                    f"    {call['kind']:<7}{call['table']:<24}{call['rows']:>6} rows"
+                    f"{call['bytes'] / 1024:>9.1f} KB  {'; '.join(map(str, call['filters']))}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Life OS benchmark on synthetic data")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--ideas", type=int, default=200)
+    parser.add_argument("--research-logs", type=int, default=5000)
+    parser.add_argument("--idea-updates", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3, help="重复次数, 报告中位数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次查询额外的模拟网络延迟 (毫秒)")
+    parser.add_argument("--max-rows", type=int, default=1000, help="模拟 PostgREST 的 max-rows 上限, 0 为不限")
+    parser.add_argument("--journal", action="store_true", help="开启本地写日志 (默认直接写后端)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--verbose", action="store_true", help="列出最后一轮的每一次查询")
+    parser.add_argument("--output", help="同时把报告写入文件, 例如 bench_output.txt")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    storage = populate(years=args.years, projects=args.projects, ideas=args.ideas,
+                       research_logs=args.research_logs, idea_updates=args.idea_updates, seed=args.seed)
+    client = FakeSupabase(storage, latency=args.latency / 1000, max_rows=args.max_rows or None)
+    supabase.create_client = lambda url, key: client
+    print(f"synthetic data ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        secrets = {
+            "supabase": {"url": "http://bench.invalid", "key": "bench", "email": "bench@example.com", "password": "bench"},
+            # 假客户端没有 Realtime, 关掉变更订阅
+            "storage": {"journal": args.journal, "journal_path": str(Path(tmp) / "write_journal.db"), "live": False},
+        }
+        rounds = [run_round(client, secrets, args.timeout) for _ in range(args.rounds)]
+
+    text = report(rounds, args.verbose)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# ============================================================
+# 进程内的 Supabase 替身
+# 用 SQLiteStorage 存数据, 模拟 supabase-py 的查询构造器, 并记录每一次调用
+# ============================================================
+import json
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from types import SimpleNamespace
+
+from storage import SQLiteStorage, utc_now
+
+# PostgREST 嵌入资源: 子表 -> {父表: 外键}
+EMBEDS = {
+    "research_logs": {"research_projects": "project_id"},
+    "idea_updates": {"ideas": "idea_id"},
+}
+
+_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeAuth:
+    """任何邮箱和密码都登录为 storage 的用户 (合成数据都属于它)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def sign_in_with_password(self, credentials: dict):
+        return SimpleNamespace(user=SimpleNamespace(id=self.client.storage.user_id))
+
+
+class FakeSupabase:
+    """对外只暴露 table()、rpc() 和 auth, 与 SupabaseStorage 和 app.py 用到的接口一致"""
+
+    def __init__(self, storage: SQLiteStorage = None, latency: float = 0.0, max_rows: int = None):
+        self.storage = storage or SQLiteStorage()
+        self.auth = FakeAuth(self)
+        self.latency = latency  # 每次调用额外等待的秒数, 用来模拟网络往返
+        self.max_rows = max_rows  # 对应 PostgREST 的 max-rows: 每次 select 最多返回的行数
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def table(self, name: str):
+        return QueryBuilder(self, name)
+
+    def rpc(self, name: str, params: dict = None):
+        return RpcCall(self, name, params or {})
+
+    def reset_calls(self):
+        with self.calls_lock:
+            self.calls = []
+
+    def _record(self, kind: str, table: str, filters, data, started: float):
+        if self.latency:
+            time.sleep(self.latency)
+        # 像真实的 HTTP 一样走一遍 JSON, 顺便得到响应字节数
+        payload = json.dumps(data, default=str)
+        with self.calls_lock:
+            self.calls.append({
+                "kind": kind,
+                "table": table,
+                "filters": filters,
+                "rows": len(data) if isinstance(data, list) else 1,
+                "bytes": len(payload.encode("utf-8")),
+                "ms": (time.perf_counter() - started) * 1000,
+            })
+        return Response(json.loads(payload))
+
+
+class RpcCall:
+    def __init__(self, client: FakeSupabase, name: str, params: dict):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        started = time.perf_counter()
+        function = getattr(self, f"_{self.name}")
+        return self.client._record("rpc", self.name, self.params, function(**self.params), started)
+
+    def _summary_dashboard(self, p_today, p_grain="week", p_start=None, p_end=None, p_activity_days=14):
+        return self.client.storage.summary_dashboard(p_today, p_grain, p_start, p_end, p_activity_days)
+
+    def _increment_metric(self, p_id, p_date, p_metric, p_delta):
+        return self.client.storage.increment_metric(p_date, p_metric, p_delta, p_id)
+
+    def _patch_daily_log(self, p_date, p_patch):
+        self.client.storage.patch_daily_log(p_date, p_patch)
+
+    def _search_notes(self, p_query, p_kind=None, p_parent_id=None, p_start=None, p_end=None,
+                      p_before_rank=None, p_before_created_at=None, p_before_id=None, p_limit=20):
+        before = (p_before_rank, p_before_created_at, p_before_id) if p_before_id else None
+        hits = self.client.storage.search_notes(p_query, p_kind, p_parent_id, p_start, p_end, before, p_limit)
+        return [asdict(hit) for hit in hits]
+
+
+class QueryBuilder:
+    def __init__(self, client: FakeSupabase, table: str):
+        self.client = client
+        self.table = table
+        self.kind = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.limit_count = None
+        self.offset = 0
+        self.ignore_duplicates = False
+
+    # --- 读 ---
+    def select(self, columns: str = "*", count=None):
+        self.columns = columns
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count: int, **kwargs):
+        self.limit_count = count
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self.offset = start
+        self.limit_count = end - start + 1
+        return self
+
+    def _filter(self, op: str, column: str, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def or_(self, expression: str):
+        return self._filter("or", None, expression)
+
+    # --- 写 ---
+    def insert(self, payload, **kwargs):
+        self.kind, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, ignore_duplicates: bool = False, **kwargs):
+        self.kind, self.payload = "upsert", payload
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.kind, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.kind = "delete"
+        return self
+
+    def execute(self):
+        started = time.perf_counter()
+        data = getattr(self, f"_execute_{self.kind}")()
+        filters = [f"{column} {op} {value}" for op, column, value in self.filters]
+        return self.client._record(self.kind, self.table, filters, data, started)
+
+    def _logic(self, expression: str, joiner: str):
+        """把 PostgREST 的逻辑表达式 (例如 a.lt.1,and(a.eq.1,b.lt.2)) 翻译成 SQL"""
+        parts, depth, current = [], 0, ""
+        for char in expression:
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if char == "," and depth == 0:
+                parts.append(current)
+                current = ""
+            else:
+                current += char
+        parts.append(current)
+
+        clauses, params = [], []
+        for part in parts:
+            nested = re.fullmatch(r"(and|or)\((.*)\)", part)
+            if nested:
+                sql, nested_params = self._logic(nested.group(2), nested.group(1))
+                clauses.append(f"({sql})")
+                params += nested_params
+            else:
+                column, op, value = part.split(".", 2)
+                clauses.append(f"{self.table}.{column} {_OPERATORS[op]} ?")
+                params.append(value.strip('"'))
+        return f" {joiner} ".join(clauses), params
+
+    def _where(self):
+        clauses, params = [], []
+        for op, column, value in self.filters:
+            if op == "or":
+                sql, or_params = self._logic(value, "or")
+                clauses.append(f"({sql})")
+                params += or_params
+            elif op == "in":
+                clauses.append(f"{self.table}.{column} in ({', '.join('?' for _ in value)})")
+                params += value
+            else:
+                clauses.append(f"{self.table}.{column} {_OPERATORS[op]} ?")
+                params.append(value)
+        return (" where " + " and ".join(clauses) if clauses else ""), params
+
+    def _execute_select(self):
+        storage = self.client.storage
+
+        fields, joins, nested = [], [], {}
+        for item in re.findall(r"(?:\w+:)?\w+\([^)]*\)|[^,\s]+", self.columns):
+            embed = re.fullmatch(r"(?:(\w+):)?(\w+)\(([^)]*)\)", item)
+            if embed:
+                alias, parent = embed.group(1), embed.group(2)
+                parent_columns = [c.strip() for c in embed.group(3).split(",")]
+                fk = EMBEDS[self.table][parent]
+                joins.append(f" left join {parent} on {parent}.id = {self.table}.{fk}")
+                nested[alias or parent] = parent_columns
+                fields += [f"{parent}.{c} as {alias or parent}__{c}" for c in parent_columns]
+            elif ":" in item:
+                alias, column = item.split(":", 1)
+                fields.append(f"{self.table}.{column} as {alias}")
+            else:
+                fields.append(f"{self.table}.{item}")
+
+        where, params = self._where()
+        sql = f"select {', '.join(fields)} from {self.table}{''.join(joins)}{where}"
+        if self.orders:
+            sql += " order by " + ", ".join(f"{self.table}.{c} {'desc' if d else 'asc'}" for c, d in self.orders)
+        limit = min(filter(None, (self.limit_count, self.client.max_rows)), default=None)
+        if limit is not None:
+            sql += f" limit {limit} offset {self.offset}"
+        rows = storage._query(sql, params)
+        for row in rows:
+            for parent, parent_columns in nested.items():
+                values = {c: row.pop(f"{parent}__{c}") for c in parent_columns}
+                row[parent] = values if any(v is not None for v in values.values()) else None
+        return rows
+
+    def _rows(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        if self.table == "daily_logs":
+            return [dict(row) for row in rows]
+        if self.table == "metric_events":
+            return [{"id": str(uuid.uuid4()), "ts": utc_now(), **row} for row in rows]
+        # Postgres 端的默认值: id / created_at
+        return [{"id": str(uuid.uuid4()), "created_at": utc_now(), **row} for row in rows]
+
+    def _execute_insert(self):
+        rows = self._rows()
+        self.client.storage.upsert_rows(self.table, rows)
+        return rows
+
+    def _execute_upsert(self):
+        rows = self._rows()
+        if self.table == "metric_events":
+            # 只追加; 对应 apply_metric_event 触发器
+            self.client.storage.add_metric_events(rows)
+            return rows
+        if self.ignore_duplicates and self.table != "daily_logs":
+            # on conflict do nothing: 主键已存在的行不写
+            ids = [row["id"] for row in rows]
+            existing = {row["id"] for row in self.client.storage._query(
+                f"select id from {self.table} where id in ({', '.join('?' for _ in ids)})", ids)}
+            rows = [row for row in rows if row["id"] not in existing]
+        # 与 PostgREST 一样, 同一批里字段不同的行分开写
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(row)
+        for group in groups.values():
+            self.client.storage.upsert_rows(self.table, group)
+        return rows
+
+    def _execute_update(self):
+        where, params = self._where()
+        assignments = ", ".join(f"{column} = ?" for column in self.payload)
+        self.client.storage._execute(
+            f"update {self.table} set {assignments}{where}", list(self.payload.values()) + params)
+        return []
+
+    def _execute_delete(self):
+        where, params = self._where()
+        self.client.storage._execute(f"delete from {self.table}{where}", params)
+        return []
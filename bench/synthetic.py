@@ -0,0 +1,132 @@
+# ============================================================
+# 合成数据: 按真实使用规模生成各表的数据
+# ============================================================
+import random
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+
+from storage import METRIC_COLUMNS, SQLiteStorage
+
+BATCH_SIZE = 1000
+
+WORDS = (
+    "paper model baseline dataset ablation training eval loss gradient attention "
+    "draft review figure table proof lemma notes reading refactor deploy api cache "
+    "query index plot schedule study plan idea prototype sketch feedback"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _timestamp(rng: random.Random, day: date) -> str:
+    moment = datetime.combine(day, time(rng.randrange(7, 24), rng.randrange(60), rng.randrange(60)))
+    return moment.replace(tzinfo=timezone.utc).isoformat()
+
+
+def _batches(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def generate(years: int = 3, projects: int = 200, ideas: int = 200,
+             research_logs: int = 5000, idea_updates: int = 5000, seed: int = 0, today: date = None):
+    """返回 {表名: 行列表}, 同一个 seed 每次生成的数据相同"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    first_day = today - timedelta(days=365 * years)
+    days = [first_day + timedelta(days=i) for i in range((today - first_day).days)]  # 不含今天, 留给 cold load
+
+    data = {"daily_logs": [], "metric_events": []}
+    for day in days:
+        if rng.random() < 0.15:  # 偶尔断更
+            continue
+        newsletter, video, wechat = (rng.choice([0, 0, 5, 10, 15, 20, 30]) for _ in range(3))
+        data["daily_logs"].append({
+            "date": day.isoformat(),
+            "newsletter_done": newsletter > 0,
+            "newsletter_time": newsletter,
+            "newsletter_note": _text(rng, 8) if newsletter else None,
+            "video_done": video > 0,
+            "video_time": video,
+            "video_note": _text(rng, 8) if video else None,
+            "wechat_done": wechat > 0,
+            "wechat_time": wechat,
+            "gre_vocab_count": rng.randrange(0, 80),
+            "gre_verbal_count": rng.randrange(0, 20),
+            "gre_reading_count": rng.randrange(0, 6),
+            "lc_easy_count": rng.randrange(0, 4),
+            "lc_medium_count": rng.randrange(0, 3),
+            "lc_hard_count": rng.randrange(0, 2),
+            "lc_notes": _text(rng, 12) if rng.random() < 0.3 else None,
+            "created_at": _timestamp(rng, day),
+        })
+        # 数值列由指标事件累加得到: 每个非零值拆成一到三次增量
+        row = data["daily_logs"][-1]
+        for metric in METRIC_COLUMNS:
+            total = row.pop(metric)
+            parts = rng.randrange(1, min(total, 3) + 1) if total > 1 else 1
+            cuts = sorted(rng.sample(range(1, total), parts - 1)) if parts > 1 else []
+            for delta in (b - a for a, b in zip([0, *cuts], [*cuts, total])):
+                if delta:
+                    data["metric_events"].append({
+                        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                        "date": row["date"],
+                        "ts": _timestamp(rng, day),
+                        "metric": metric,
+                        "delta": delta,
+                    })
+
+    data["research_projects"] = [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "title": f"{_text(rng, 3)} #{i}",
+        "is_active": rng.random() < 0.25,
+        "created_at": _timestamp(rng, rng.choice(days)),
+    } for i in range(projects)]
+
+    data["ideas"] = []
+    for i in range(ideas):
+        created = rng.choice(days)
+        data["ideas"].append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "title": f"{_text(rng, 3)} #{i}",
+            "status": rng.choices(["Idea", "In Progress", "Done"], weights=[2, 1, 3])[0],
+            "created_at": _timestamp(rng, created),
+            "updated_at": _timestamp(rng, created),
+        })
+
+    data["research_logs"] = []
+    for _ in range(research_logs):
+        day = rng.choice(days)
+        data["research_logs"].append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "project_id": rng.choice(data["research_projects"])["id"],
+            "date": day.isoformat(),
+            "duration_minutes": rng.choice([15, 30, 45, 60, 90, 120]),
+            "content": _text(rng, rng.randrange(5, 60)),
+            "created_at": _timestamp(rng, day),
+        })
+
+    data["idea_updates"] = [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "idea_id": rng.choice(data["ideas"])["id"],
+        "content": _text(rng, rng.randrange(5, 60)),
+        "created_at": _timestamp(rng, rng.choice(days)),
+    } for _ in range(idea_updates)]
+    return data
+
+
+def load(storage: SQLiteStorage, data: dict):
+    """批量写入, 父表在前"""
+    for table in ["daily_logs", "research_projects", "ideas", "research_logs", "idea_updates"]:
+        for batch in _batches(data[table]):
+            storage.upsert_rows(table, batch)
+    for batch in _batches(data["metric_events"]):
+        storage.add_metric_events(batch)
+
+
+def populate(storage: SQLiteStorage = None, **options) -> SQLiteStorage:
+    storage = storage or SQLiteStorage()
+    load(storage, generate(**options))
+    return storage
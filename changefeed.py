@@ -0,0 +1,168 @@
+# ============================================================
+# 变更订阅 (Change Feed)
+# 把数据库的表级变更事件推送到本进程: 先清除该用户依赖这些表的缓存, 再递增 (用户, 表) 的版本号,
+# 打开的 session 只比较自己用户的版本号决定是否刷新, 不必每次 rerun 都重新查询
+#   Supabase: Realtime 的 postgres_changes (表需加入 supabase_realtime publication, 见 schema.sql)
+#   SQLite: 触发器维护 table_versions, 用 pragma data_version 低成本轮询 (SQLite 没有 LISTEN / NOTIFY)
+# ============================================================
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from storage import CHANGE_TABLES
+
+logger = logging.getLogger("life_os.feed")
+
+COALESCE = 0.5        # 秒, 窗口内的多行变更合并成一次通知
+POLL_INTERVAL = 1.0   # 秒, SQLite 轮询间隔
+WATCHDOG = 10.0       # 秒, Realtime 连接检查间隔, 断开后重建订阅
+RETRY_MIN = 1.0       # 秒, 重连退避区间
+RETRY_MAX = 300.0
+
+
+class ChangeFeed:
+    """本进程收到的表级变更: 每个 (用户, 表) 一个计数, 订阅线程收到事件后回调 on_change 并递增计数
+
+    用户为 None 的计数对所有用户生效 (不知道变更属于谁时, 例如重新订阅)。
+    live 为 False 时 (尚未连上或连接断开) 收不到变更, 调用方只能依赖缓存过期
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change  # 以变更的表名和 user_id= 调用, 用于清缓存
+        self.counts = {}
+        self.pending = set()
+        self.live = False
+        self.lock = threading.Lock()
+
+    def mark(self, table: str, user_id: str = None):
+        """记下一张有变更的表, 由 deliver 统一通知"""
+        if table in CHANGE_TABLES:
+            with self.lock:
+                self.pending.add((user_id, table))
+
+    def deliver(self):
+        with self.lock:
+            changes, self.pending = self.pending, set()
+        if not changes:
+            return
+        # 先清缓存再递增计数: session 看到新计数时读到的一定是新数据
+        if self.on_change:
+            by_user = {}
+            for user_id, table in changes:
+                by_user.setdefault(user_id, []).append(table)
+            for user_id, tables in by_user.items():
+                self.on_change(*tables, user_id=user_id)
+        with self.lock:
+            for change in changes:
+                self.counts[change] = self.counts.get(change, 0) + 1
+
+    def snapshot(self, user_id: str = None) -> dict:
+        """user_id 这个用户看到的各表计数"""
+        with self.lock:
+            return {table: self.counts.get((None, table), 0) + self.counts.get((user_id, table), 0)
+                    for table in CHANGE_TABLES}
+
+    @staticmethod
+    def changed(seen: dict, current: dict) -> set:
+        return {table for table, count in current.items() if seen.get(table) != count}
+
+
+class SQLiteFeed(ChangeFeed):
+    """轮询 SQLite: data_version 只在其他连接提交后变化, 变化时才读 table_versions 找出改动的 (用户, 表)"""
+
+    def __init__(self, path: str, on_change=None):
+        super().__init__(on_change)
+        self.path = path
+        self.worker = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self.worker.start()
+
+    def _run(self):
+        conn = sqlite3.connect(self.path)
+        data_version, versions = None, None
+        while True:
+            try:
+                current = conn.execute("pragma data_version").fetchone()[0]
+                if current != data_version:
+                    latest = {(user_id, table): version for user_id, table, version
+                              in conn.execute("select user_id, tbl, version from table_versions")}
+                    if versions is not None:
+                        for user_id, table in self.changed(versions, latest):
+                            self.mark(table, user_id)
+                        self.deliver()
+                    data_version, versions = current, latest
+                self.live = True
+            except sqlite3.Error:
+                logger.warning("change feed poll failed", exc_info=True)
+                self.live = False
+            time.sleep(POLL_INTERVAL)
+
+
+class RealtimeFeed(ChangeFeed):
+    """订阅 Supabase Realtime; supabase 的同步客户端不支持 Realtime, 在后台线程里跑异步客户端
+
+    key 为 service key 时收到所有用户的变更; 否则须给出 token (返回 user_id 这个用户当前登录令牌的函数),
+    RLS 按令牌只推送该用户的行, 令牌续期后在连接检查时换上新令牌
+    """
+
+    def __init__(self, url: str, key: str, on_change=None, token=None, user_id: str = None):
+        super().__init__(on_change)
+        self.url = f"{url.rstrip('/')}/realtime/v1"
+        self.key = key
+        self.token = token
+        self.user_id = user_id
+        self.worker = threading.Thread(target=lambda: asyncio.run(self._run()), name="change-feed", daemon=True)
+        self.worker.start()
+
+    def _on_payload(self, payload: dict):
+        data = payload["data"]
+        # DELETE 的 old_record 默认只有主键; 取不到 user_id 时归订阅的用户, 不知道是谁时按所有用户处理
+        row = data.get("record") or data.get("old_record") or {}
+        self.mark(data["table"], row.get("user_id") or self.user_id)
+
+    def _on_state(self, state, error=None):
+        self.live = state == "SUBSCRIBED"
+        if self.live:
+            # 断线期间的变更收不到了, (重新) 订阅成功时所有表都当作有变更
+            for table in CHANGE_TABLES:
+                self.mark(table, self.user_id)
+        elif error:
+            logger.warning("realtime channel %s: %r", state, error)
+
+    async def _run(self):
+        from realtime import AsyncRealtimeClient
+        delay = RETRY_MIN
+        while True:
+            client = None
+            try:
+                client = AsyncRealtimeClient(self.url, self.key)
+                if self.token:
+                    await client.set_auth(await asyncio.to_thread(self.token))
+                channel = client.channel("life-os-changes")
+                for table in CHANGE_TABLES:
+                    channel.on_postgres_changes("*", self._on_payload, table=table, schema="public")
+                await channel.subscribe(self._on_state)
+                checked = time.monotonic()
+                while True:
+                    await asyncio.sleep(COALESCE)
+                    self.deliver()
+                    if time.monotonic() - checked >= WATCHDOG:
+                        checked = time.monotonic()
+                        if not (client.is_connected and channel.is_joined):
+                            break
+                        # 取令牌时客户端会按需续期 (同步请求), 放到线程里以免卡住事件循环
+                        token = await asyncio.to_thread(self.token) if self.token else None
+                        if token and token != client.access_token:
+                            await client.set_auth(token)
+                        delay = RETRY_MIN
+            except Exception:
+                logger.warning("realtime subscription failed", exc_info=True)
+            self.live = False
+            if client is not None:
+                try:
+                    await client.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX)
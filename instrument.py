@@ -0,0 +1,274 @@
+# ============================================================
+# 性能埋点 (Instrumentation)
+# 记录每次 rerun 的查询 (表、过滤条件、耗时、行数、字节数)、各区块渲染耗时和被吞掉的异常
+# URL 带 ?debug=1 时在页面底部显示面板; secrets 中 [debug] log = true 时每次 rerun 输出一行 JSON 日志
+# ============================================================
+import json
+import logging
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger("life_os.perf")
+
+STATE_KEY = "_instrument"
+HISTORY = 10  # 面板中保留最近几次 rerun
+
+
+class RunRecord:
+    """一次 rerun (整页或单个 fragment) 的埋点数据"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.status = "running"
+        self.queries = []
+        self.sections = []
+        self.errors = []
+        self.depth = 0
+        self.lock = threading.Lock()  # 预取线程也会写入 queries
+
+    def add_query(self, entry: dict):
+        with self.lock:
+            self.queries.append(entry)
+
+    def finish(self, status: str = "ok"):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        self.status = status
+
+    def summary(self) -> dict:
+        return {
+            "kind": self.kind,
+            "status": self.status,
+            "ms": round(self.total_ms or 0, 1),
+            "queries": len(self.queries),
+            "query_ms": round(sum(q["ms"] for q in self.queries), 1),
+            "bytes": sum(q["bytes"] for q in self.queries),
+            "sections": {s["section"]: s["ms"] for s in self.sections if s["depth"] == 0},
+            "errors": [e["section"] for e in self.errors],
+        }
+
+
+class SessionState:
+    def __init__(self, panel: bool, log: bool):
+        self.panel = panel
+        self.log = log
+        self.record = None
+        self.history = deque(maxlen=HISTORY)
+
+    @property
+    def enabled(self) -> bool:
+        return self.panel or self.log
+
+
+def _state():
+    """当前 session 的埋点状态; 没有脚本上下文 (例如后台同步线程) 时返回 None"""
+    if get_script_run_ctx() is None:
+        return None
+    return st.session_state.get(STATE_KEY)
+
+
+def _current():
+    state = _state()
+    return state.record if state else None
+
+
+def _close(state: SessionState, status: str):
+    record = state.record
+    state.record = None
+    record.finish(status)
+    state.history.append(record)
+    if state.log:
+        logger.info(json.dumps({"event": "rerun", **record.summary()}))
+
+
+# ------------------------------------------------------------
+# 整页 rerun 的开始与结束
+# ------------------------------------------------------------
+def begin_run(panel: bool = False, log: bool = False):
+    state = st.session_state.get(STATE_KEY)
+    if state is None:
+        state = st.session_state[STATE_KEY] = SessionState(panel, log)
+    state.panel, state.log = panel, log
+    # 上一次整页运行被 st.rerun() 打断, 没走到 end_run
+    if state.record is not None:
+        _close(state, "interrupted")
+    if state.enabled:
+        state.record = RunRecord("full")
+
+
+def end_run():
+    state = _state()
+    if state and state.record is not None:
+        _close(state, "ok")
+
+
+# ------------------------------------------------------------
+# 渲染区块计时
+# ------------------------------------------------------------
+@contextmanager
+def section(name: str, fallback: str = None):
+    """给一个渲染区块计时
+
+    fallback 不为 None 时, 区块内的异常被记录下来并以 fallback 作为提示 (空串则不提示),
+    不再中断整页; 否则异常照常抛出。
+    """
+    state = _state()
+    # fragment 单独重跑时不经过 begin_run, 由最外层区块开启一条记录
+    ctx = get_script_run_ctx()
+    owns_record = bool(
+        state and state.enabled and state.record is None
+        and ctx and getattr(ctx, "fragment_ids_this_run", None)
+    )
+    if owns_record:
+        state.record = RunRecord("fragment")
+    record = state.record if state else None
+
+    started = time.perf_counter()
+    depth = record.depth if record else 0
+    if record:
+        record.depth += 1
+    try:
+        yield
+    except Exception as exc:
+        logger.warning("section %r failed", name, exc_info=True)
+        if record:
+            record.errors.append({"section": name, "error": repr(exc), "traceback": traceback.format_exc()})
+        if fallback is None:
+            raise
+        if fallback:
+            st.caption(fallback)
+    finally:
+        if record:
+            record.depth -= 1
+            record.sections.append({
+                "start": started,
+                "section": name,
+                "depth": depth,
+                "ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        if owns_record and state.record is record:
+            _close(state, "ok")
+
+
+def timed(name: str):
+    """把整个函数作为一个区块计时, 用于各个 fragment 模块"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ------------------------------------------------------------
+# Supabase 客户端包装: 记录每一次 execute()
+# ------------------------------------------------------------
+def _describe(value):
+    if isinstance(value, list):
+        return f"<{len(value)} rows>"
+    if isinstance(value, dict):
+        return f"<{len(value)} fields>"
+    return repr(value)
+
+
+class _Query:
+    """代理 postgrest 的查询构造器, 沿途记下调用链"""
+
+    def __init__(self, builder, table: str, steps: list):
+        self._builder = builder
+        self._table = table
+        self._steps = steps
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            step = f"{name}({', '.join([_describe(a) for a in args] + [f'{k}={_describe(v)}' for k, v in kwargs.items()])})"
+            return _Query(result, self._table, self._steps + [step])
+        return call
+
+    def execute(self):
+        record = _current()
+        if record is None:
+            return self._builder.execute()
+        started = time.perf_counter()
+        entry = {"table": self._table, "query": ".".join(self._steps)}
+        try:
+            response = self._builder.execute()
+        except Exception as exc:
+            record.add_query({**entry, "ms": round((time.perf_counter() - started) * 1000, 1),
+                              "rows": 0, "bytes": 0, "error": repr(exc)})
+            raise
+        ms = (time.perf_counter() - started) * 1000
+        data = response.data
+        record.add_query({
+            **entry,
+            "ms": round(ms, 1),
+            "rows": len(data) if isinstance(data, list) else int(data is not None),
+            "bytes": len(json.dumps(data, default=str).encode("utf-8")),
+        })
+        return response
+
+
+class InstrumentedClient:
+    """包装 supabase Client, 只拦截 table() 和 rpc(), 其他属性原样转发"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def table(self, name: str):
+        return _Query(self.client.table(name), name, [])
+
+    def rpc(self, name: str, params: dict = None):
+        return _Query(self.client.rpc(name, params or {}), f"rpc:{name}", [json.dumps(params or {}, default=str)])
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+# ------------------------------------------------------------
+# 调试面板
+# ------------------------------------------------------------
+def render_debug_panel():
+    state = _state()
+    if not state or not state.panel:
+        return
+    records = list(state.history)
+    if state.record is not None:
+        records.append(state.record)
+        state.record.total_ms = (time.perf_counter() - state.record.started) * 1000
+
+    with st.expander("🛠 Debug: performance", expanded=True):
+        for index, record in enumerate(reversed(records)):
+            info = record.summary()
+            st.markdown(
+                f"**{'current' if index == 0 else f'-{index}'} · {record.kind} rerun** — "
+                f"{info['ms']:.0f} ms, {info['queries']} queries ({info['query_ms']:.0f} ms, "
+                f"{info['bytes'] / 1024:.1f} KB)" + (f", status: {record.status}" if record.status != "running" else "")
+            )
+            if record.queries:
+                st.dataframe(record.queries, hide_index=True, use_container_width=True)
+            if record.sections:
+                st.dataframe(
+                    [{"section": "  " * s["depth"] + s["section"], "ms": s["ms"]}
+                     for s in sorted(record.sections, key=lambda s: s["start"])],
+                    hide_index=True, use_container_width=True)
+            for error in record.errors:
+                st.error(f"{error['section']}: {error['error']}")
+                st.code(error["traceback"], language="text")
+            if index == 0 and len(records) > 1:
+                st.markdown("---")
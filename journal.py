@@ -0,0 +1,331 @@
+# ============================================================
+# 离线优先写日志 (Write Journal)
+# 写操作先落到本地 SQLite 日志并立即返回, 后台线程按批回放到存储后端
+# ============================================================
+import json
+import sqlite3
+import threading
+import uuid
+
+from storage import ACTIVITY_PARENTS, PATCH_COLUMNS, Storage, utc_now
+
+try:
+    from httpx import TransportError
+    TRANSIENT_ERRORS = (OSError, TransportError)
+except ImportError:
+    TRANSIENT_ERRORS = (OSError,)
+
+try:
+    from postgrest.exceptions import APIError
+except ImportError:
+    APIError = None
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 10      # 非暂时性错误重试次数上限, 超过后搁置, 留在日志中待人工处理
+RETRY_MIN = 1.0        # 秒, 网络错误的退避区间
+RETRY_MAX = 300.0
+IDLE_POLL = 30.0       # 秒, 空闲时的兜底检查间隔
+
+# 服务端暂时不可用的 HTTP 状态码 (超时、限流、5xx), 以及 PostgREST 连不上数据库时的错误码
+TRANSIENT_STATUS = {408, 429}
+TRANSIENT_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+
+# 回放顺序: 先父表再子表, 保证同一批内外键有效
+TABLE_ORDER = ["research_projects", "ideas", "research_logs", "idea_updates", "daily_logs", "metric_events"]
+
+
+def is_transient(exc: Exception) -> bool:
+    """网络错误和服务端暂时不可用: 退避后重试, 不计入 attempts"""
+    if isinstance(exc, TRANSIENT_ERRORS):
+        return True
+    if APIError is None or not isinstance(exc, APIError):
+        return False
+    # 响应不是 JSON 时 code 为 HTTP 状态码, 否则为 SQLSTATE 或 PGRST 错误码
+    code = str(exc.code)
+    if code in TRANSIENT_CODES:
+        return True
+    return len(code) == 3 and code.isdigit() and (int(code) in TRANSIENT_STATUS or code.startswith("5"))
+
+
+class JournaledStorage(Storage):
+    """包装一个 Storage 后端: 读操作直接转发, 新增类写操作走本地日志
+
+    每条日志带幂等键, 键相同的写入只记一次; 新行以 row_id (表单的提交令牌) 为 id 和幂等键,
+    同一次提交重复调用不会产生重复行。回放时按主键 upsert, 重放多少次结果都一样。
+    """
+
+    def __init__(self, backend, path: str, on_sync=None):
+        self.backend = backend
+        self.on_sync = on_sync  # 回放成功后以涉及的表名调用, 用于清缓存
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("pragma journal_mode = wal")
+        self.conn.execute("""
+            create table if not exists journal (
+                seq integer primary key autoincrement,
+                key text not null unique,
+                tbl text not null,
+                row text not null,
+                attempts int not null default 0,
+                last_error text,
+                created_at text not null
+            )
+        """)
+        self.conn.commit()
+        self.synced = 0  # 回放成功的批数, 界面据此在回放后刷新
+        self.lock = threading.Lock()        # 保护 sqlite 连接
+        self.sync_lock = threading.Lock()   # 同一时间只有一个回放
+        self.wake = threading.Event()
+        self.worker = threading.Thread(target=self._run, name="write-journal", daemon=True)
+        self.worker.start()
+
+    @property
+    def user_id(self):
+        return self.backend.user_id
+
+    def for_user(self, user_id: str):
+        # 日志文件按用户分开, 换用户须为该用户的后端另建一个 JournaledStorage
+        if user_id != self.user_id:
+            raise ValueError(f"journal belongs to user {self.user_id!r}, not {user_id!r}")
+        return self
+
+    # --- 读操作: 直接交给后端 ---
+    def get_daily_log(self, day: str, columns: tuple = None):
+        return self.backend.get_daily_log(day, columns)
+
+    def get_logs_since(self, start_date: str, columns: tuple = None):
+        return self.backend.get_logs_since(start_date, columns)
+
+    def get_active_projects(self, columns: tuple = None):
+        return self.backend.get_active_projects(columns)
+
+    def get_all_projects(self, columns: tuple = None):
+        return self.backend.get_all_projects(columns)
+
+    def get_archived_projects(self, columns: tuple = None):
+        return self.backend.get_archived_projects(columns)
+
+    def get_project_logs(self, project_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        return self.backend.get_project_logs(project_id, columns, before, limit)
+
+    def get_research_logs_since(self, start_date: str, columns: tuple = None):
+        return self.backend.get_research_logs_since(start_date, columns)
+
+    def get_research_logs_on(self, day: str, columns: tuple = None):
+        return self.backend.get_research_logs_on(day, columns)
+
+    def get_all_ideas(self, columns: tuple = None):
+        return self.backend.get_all_ideas(columns)
+
+    def get_active_ideas(self, columns: tuple = None):
+        return self.backend.get_active_ideas(columns)
+
+    def get_done_ideas(self, columns: tuple = None):
+        return self.backend.get_done_ideas(columns)
+
+    def get_idea_updates_since(self, start_date: str, columns: tuple = None):
+        return self.backend.get_idea_updates_since(start_date, columns)
+
+    def get_idea_updates(self, idea_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        return self.backend.get_idea_updates(idea_id, columns, before, limit)
+
+    def summary_dashboard(self, day: str, grain: str, start: str, end: str, activity_days: int = 14):
+        return self.backend.summary_dashboard(day, grain, start, end, activity_days)
+
+    def search_notes(self, query: str, kind: str = None, parent_id: str = None, start: str = None,
+                     end: str = None, before: tuple = None, limit: int = 20):
+        return self.backend.search_notes(query, kind, parent_id, start, end, before, limit)
+
+    def iter_rows(self, table: str, columns: tuple, chunk_size: int = 1000):
+        return self.backend.iter_rows(table, columns, chunk_size)
+
+    # --- 记录 ---
+    def record(self, table: str, row: dict, key: str) -> bool:
+        """写入日志并唤醒后台回放; 键已存在时返回 False"""
+        if self.backend.user_id:
+            # 回放时按主键 upsert, daily_logs 的主键含 user_id
+            row = {"user_id": self.backend.user_id, **row}
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "insert or ignore into journal (key, tbl, row, created_at) values (?, ?, ?, ?)",
+                (key, table, json.dumps(row), utc_now()),
+            )
+        self.wake.set()
+        return cursor.rowcount > 0
+
+    def _record_new(self, table: str, row: dict, row_id: str = None):
+        # 没有提交令牌时每次调用都是新行
+        row_id = row_id or str(uuid.uuid4())
+        self.record(table, {"id": row_id, **row}, f"{table}:{row_id}")
+
+    def upsert_daily_log(self, data: dict):
+        # 每次 flush 都是新的修改, 不去重; 回放时同一天的多次修改会合并
+        self.record("daily_logs", data, f"daily_logs:{uuid.uuid4()}")
+
+    def patch_daily_log(self, day: str, fields: dict):
+        unknown = set(fields) - set(PATCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"patch_daily_log: {', '.join(sorted(unknown))} cannot be patched")
+        self.upsert_daily_log({"date": day, **fields})
+
+    def add_metric_events(self, events: list):
+        # 事件自带 id, 以它为幂等键; 回放时按 id 去重
+        for event in events:
+            self.record("metric_events", event, f"metric_events:{event['id']}")
+
+    def increment_metric(self, day: str, metric: str, delta: int, event_id: str = None):
+        # 累加与先后顺序无关, 不必等日志回放完: 在线时直接调用 RPC 拿到合并后的总数,
+        # 网络不通时记入日志; 请求其实已生效时, 回放按事件 id 去重
+        event = {"id": event_id or str(uuid.uuid4()), "date": day, "ts": utc_now(), "metric": metric, "delta": delta}
+        try:
+            return self.backend.increment_metric(day, metric, delta, event["id"])
+        except Exception as exc:
+            if not is_transient(exc):
+                raise
+            self.add_metric_events([event])
+            return None
+
+    def create_project(self, title: str, row_id: str = None):
+        self._record_new("research_projects", {"title": title, "created_at": utc_now()}, row_id)
+
+    def create_idea(self, title: str, row_id: str = None):
+        now = utc_now()
+        self._record_new("ideas", {"title": title, "created_at": now, "updated_at": now}, row_id)
+
+    def add_research_log(self, project_id: str, day: str, duration: int, content: str, row_id: str = None):
+        self._record_new("research_logs", {
+            "project_id": project_id,
+            "date": day,
+            "duration_minutes": duration,
+            "content": content,
+            "created_at": utc_now(),
+        }, row_id)
+
+    def add_idea_update(self, idea_id: str, content: str, row_id: str = None):
+        self._record_new("idea_updates", {
+            "idea_id": idea_id,
+            "content": content,
+            "created_at": utc_now(),
+        }, row_id)
+
+    # 修改/删除已有行的操作: 先把日志回放完, 保证它们作用在最新的数据上
+    def archive_project(self, project_id: str):
+        self.flush()
+        self.backend.archive_project(project_id)
+
+    def delete_project(self, project_id: str):
+        self.flush()
+        self.backend.delete_project(project_id)
+
+    def update_idea_status(self, idea_id: str, status: str):
+        self.flush()
+        self.backend.update_idea_status(idea_id, status)
+
+    def delete_idea(self, idea_id: str):
+        self.flush()
+        self.backend.delete_idea(idea_id)
+
+    def upsert_rows(self, table: str, rows: list):
+        self.flush()
+        self.backend.upsert_rows(table, rows)
+
+    # --- 回放 ---
+    def pending_count(self) -> int:
+        with self.lock:
+            return self.conn.execute(
+                "select count(*) from journal where attempts < ?", (MAX_ATTEMPTS,)).fetchone()[0]
+
+    def failed_entries(self):
+        """超过重试上限被搁置的日志"""
+        with self.lock:
+            return self.conn.execute(
+                "select seq, tbl, row, attempts, last_error from journal where attempts >= ? order by seq",
+                (MAX_ATTEMPTS,)).fetchall()
+
+    def flush(self):
+        """把日志全部回放到后端, 暂时性错误 (见 is_transient) 会抛出"""
+        while self._sync_batch():
+            pass
+
+    def _sync_batch(self) -> int:
+        with self.sync_lock:
+            with self.lock:
+                entries = self.conn.execute(
+                    "select seq, tbl, row from journal where attempts < ? order by seq limit ?",
+                    (MAX_ATTEMPTS, BATCH_SIZE)).fetchall()
+            if not entries:
+                return 0
+            try:
+                self._apply(entries)
+                done = entries
+            except Exception as exc:
+                if is_transient(exc):
+                    raise
+                # 批量失败且不是网络问题: 逐条重试, 找出有问题的那几条
+                done = self._apply_one_by_one(entries)
+            self._finish(done)
+            return len(done)
+
+    def _apply(self, entries):
+        groups = {}
+        for _, table, row in entries:
+            row = json.loads(row)
+            if table == "daily_logs":
+                # 同一天的多次部分更新合并成一行, 后写的字段覆盖先写的
+                groups.setdefault(("daily_logs", row["date"]), [{}])[0].update(row)
+            else:
+                groups.setdefault((table, tuple(row)), []).append(row)
+        for (table, _), rows in sorted(groups.items(), key=lambda item: TABLE_ORDER.index(item[0][0])):
+            if table == "metric_events":
+                self.backend.add_metric_events(rows)
+            else:
+                self.backend.upsert_rows(table, rows)
+
+    def _apply_one_by_one(self, entries):
+        """返回回放成功的日志; 失败的累加 attempts 并记录错误"""
+        done = []
+        for entry in entries:
+            try:
+                self._apply([entry])
+            except Exception as exc:
+                if is_transient(exc):
+                    self._finish(done)
+                    raise
+                with self.lock, self.conn:
+                    self.conn.execute(
+                        "update journal set attempts = attempts + 1, last_error = ? where seq = ?",
+                        (repr(exc), entry[0]))
+            else:
+                done.append(entry)
+        return done
+
+    def _finish(self, entries):
+        """删除已回放的日志, 并通知涉及的表 (子表的写入会更新父表计数, 指标事件会更新 daily_logs)"""
+        if not entries:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany("delete from journal where seq = ?", [(seq,) for seq, _, _ in entries])
+        tables = {table for _, table, _ in entries}
+        tables |= {ACTIVITY_PARENTS[table][0] for table in tables if table in ACTIVITY_PARENTS}
+        if "metric_events" in tables:
+            tables.add("daily_logs")
+        if self.on_sync:
+            self.on_sync(*tables)
+        # 缓存清除之后再计数, 界面看到计数变化时重新读到的已是新数据
+        self.synced += 1
+
+    def _run(self):
+        delay = RETRY_MIN
+        while True:
+            try:
+                self.flush()
+                delay = RETRY_MIN
+                timeout = IDLE_POLL
+            except Exception as exc:
+                if is_transient(exc):
+                    delay = min(delay * 2, RETRY_MAX)
+                    timeout = delay
+                else:
+                    timeout = IDLE_POLL
+            # 有新写入时会被提前唤醒, 退避期间也照常重试
+            self.wake.wait(timeout)
+            self.wake.clear()
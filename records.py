@@ -0,0 +1,114 @@
+# ============================================================
+# 类型化记录 (Typed Records)
+# 每张表一个 slots dataclass; 读操作只查询调用方声明的列, 没取的字段保持 None
+# user_id 为行的所属用户 (多用户, 见 schema.sql 中的 RLS)
+# ============================================================
+from dataclasses import dataclass, fields
+
+# 来自父表的字段: 记录字段 -> (父表, 父表列)
+EMBEDDED = {
+    "project_title": ("research_projects", "title"),
+    "idea_title": ("ideas", "title"),
+}
+
+
+@dataclass(slots=True)
+class DailyLog:
+    date: str
+    user_id: str | None = None
+    newsletter_done: bool | None = None
+    newsletter_time: int | None = None
+    newsletter_note: str | None = None
+    video_done: bool | None = None
+    video_time: int | None = None
+    video_note: str | None = None
+    wechat_done: bool | None = None
+    wechat_time: int | None = None
+    gre_vocab_count: int | None = None
+    gre_verbal_count: int | None = None
+    gre_reading_count: int | None = None
+    lc_easy_count: int | None = None
+    lc_medium_count: int | None = None
+    lc_hard_count: int | None = None
+    lc_notes: str | None = None
+    created_at: str | None = None
+
+
+@dataclass(slots=True)
+class Project:
+    id: str
+    user_id: str | None = None
+    title: str | None = None
+    is_active: bool | None = None
+    created_at: str | None = None
+    log_count: int | None = None
+    last_log_at: str | None = None
+    last_log_date: str | None = None
+    last_preview: str | None = None
+
+
+@dataclass(slots=True)
+class ResearchLog:
+    id: str | None = None
+    user_id: str | None = None
+    project_id: str | None = None
+    date: str | None = None
+    duration_minutes: int | None = None
+    content: str | None = None
+    created_at: str | None = None
+    project_title: str | None = None
+
+
+@dataclass(slots=True)
+class Idea:
+    id: str
+    user_id: str | None = None
+    title: str | None = None
+    status: str | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+    log_count: int | None = None
+    last_log_at: str | None = None
+    last_preview: str | None = None
+
+
+@dataclass(slots=True)
+class IdeaUpdate:
+    id: str | None = None
+    user_id: str | None = None
+    idea_id: str | None = None
+    content: str | None = None
+    created_at: str | None = None
+    idea_title: str | None = None
+
+
+@dataclass(slots=True)
+class MetricEvent:
+    id: str | None = None
+    user_id: str | None = None
+    date: str | None = None
+    ts: str | None = None
+    metric: str | None = None
+    delta: int | None = None
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """全文搜索的一条结果, kind 为 research_log / idea_update, parent 为所属项目或 idea"""
+    kind: str
+    id: str
+    parent_id: str | None = None
+    parent_title: str | None = None
+    date: str | None = None
+    created_at: str | None = None
+    rank: float | None = None
+    snippet: str | None = None
+
+
+def table_columns(record) -> tuple:
+    """记录的全部本表字段 (不含父表字段), 即未声明列时的默认查询列"""
+    return tuple(f.name for f in fields(record) if f.name not in EMBEDDED)
+
+
+def to_records(record, rows: list) -> list:
+    return [record(**row) for row in rows]
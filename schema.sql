@@ -11,7 +11,8 @@
 -- 1. 每日日志表 (Daily Logs) - 存储 Info Diet + GRE
 -- ============================================================
 create table if not exists daily_logs (
-  date date primary key,
+  user_id uuid not null default auth.uid() references auth.users(id) on delete cascade,
+  date date not null,
 
   -- Info Diet
   newsletter_done boolean default false,
@@ -35,7 +36,8 @@ create table if not exists daily_logs (
   lc_hard_count int default 0,
   lc_notes text,
 
-  created_at timestamp with time zone default timezone('utc'::text, now())
+  created_at timestamp with time zone default timezone('utc'::text, now()),
+  primary key (user_id, date)
 );
 
 -- ============================================================
@@ -43,6 +45,7 @@ create table if not exists daily_logs (
 -- ============================================================
 create table if not exists research_projects (
   id uuid default gen_random_uuid() primary key,
+  user_id uuid not null default auth.uid() references auth.users(id) on delete cascade,
   title text not null,
   is_active boolean default true,  -- true=进行中, false=已归档
   created_at timestamp with time zone default timezone('utc'::text, now())
@@ -53,6 +56,7 @@ create table if not exists research_projects (
 -- ============================================================
 create table if not exists research_logs (
   id uuid default gen_random_uuid() primary key,
+  user_id uuid not null default auth.uid() references auth.users(id) on delete cascade,
   project_id uuid references research_projects(id) on delete cascade,
   date date not null,
   duration_minutes int default 0,
@@ -65,6 +69,7 @@ create table if not exists research_logs (
 -- ============================================================
 create table if not exists ideas (
   id uuid default gen_random_uuid() primary key,
+  user_id uuid not null default auth.uid() references auth.users(id) on delete cascade,
   title text not null,
   status text default 'Idea',  -- Idea, In Progress, Done
   created_at timestamp with time zone default timezone('utc'::text, now()),
@@ -76,17 +81,84 @@ create table if not exists ideas (
 -- ============================================================
 create table if not exists idea_updates (
   id uuid default gen_random_uuid() primary key,
+  user_id uuid not null default auth.uid() references auth.users(id) on delete cascade,
   idea_id uuid references ideas(id) on delete cascade,
   content text not null,
   created_at timestamp with time zone default timezone('utc'::text, now())
 );
 
+-- ============================================================
+-- 多用户 (Multi-tenant): 每行属于一个 Supabase Auth 用户, 由 RLS 隔离 (见文末)
+-- 单用户时代的已有数据归到第一个注册的用户: 先在 Authentication → Users 中建好自己的账号再运行
+-- ============================================================
+ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS user_id uuid default auth.uid() references auth.users(id) on delete cascade;
+ALTER TABLE research_projects ADD COLUMN IF NOT EXISTS user_id uuid default auth.uid() references auth.users(id) on delete cascade;
+ALTER TABLE research_logs ADD COLUMN IF NOT EXISTS user_id uuid default auth.uid() references auth.users(id) on delete cascade;
+ALTER TABLE ideas ADD COLUMN IF NOT EXISTS user_id uuid default auth.uid() references auth.users(id) on delete cascade;
+ALTER TABLE idea_updates ADD COLUMN IF NOT EXISTS user_id uuid default auth.uid() references auth.users(id) on delete cascade;
+
+create or replace function assign_legacy_rows(p_table text) returns void as $$
+declare
+  v_owner uuid := (select id from auth.users order by created_at limit 1);
+  v_missing boolean;
+begin
+  execute format('select exists (select 1 from %I where user_id is null)', p_table) into v_missing;
+  if v_missing and v_owner is null then
+    raise exception '%: existing rows are assigned to the first user in auth.users, create your account first', p_table;
+  end if;
+  execute format('update %I set user_id = $1 where user_id is null', p_table) using v_owner;
+  execute format('alter table %I alter column user_id set not null', p_table);
+end;
+$$ language plpgsql;
+
+-- 只供本脚本迁移使用: 不能作为 RPC 调用 (脚本中途出错时函数还在, 先收回执行权限; 用完在 metric_events 之后删除)
+revoke execute on function assign_legacy_rows(text) from public, anon, authenticated;
+
+select assign_legacy_rows(t) from unnest(array['daily_logs', 'research_projects', 'research_logs', 'ideas', 'idea_updates']) as t;
+
+-- daily_logs 的主键由 date 改为 (user_id, date)
+do $$
+begin
+  if not exists (
+    select 1 from pg_index i join pg_attribute a on a.attrelid = i.indrelid and a.attnum = any(i.indkey)
+    where i.indrelid = 'daily_logs'::regclass and i.indisprimary and a.attname = 'user_id'
+  ) then
+    alter table daily_logs drop constraint daily_logs_pkey;
+    alter table daily_logs add primary key (user_id, date);
+  end if;
+end;
+$$;
+
 -- ============================================================
 -- 索引优化
+-- 每个列表查询都带 user_id 条件 (RLS + 显式过滤), 复合索引以 user_id 开头, 后接过滤列和 keyset 排序列
+-- daily_logs 的 (user_id, date) 主键即覆盖按天 / 按区间的读取
 -- ============================================================
+-- 外键索引, 删除项目 / idea 时级联删除用
 create index if not exists idx_research_logs_project on research_logs(project_id);
-create index if not exists idx_research_logs_date on research_logs(date);
 create index if not exists idx_idea_updates_idea on idea_updates(idea_id);
+drop index if exists idx_research_logs_date;
+drop index if exists idx_research_logs_project_created;
+drop index if exists idx_idea_updates_idea_created;
+drop index if exists idx_research_logs_project_keyset;
+drop index if exists idx_idea_updates_idea_keyset;
+-- 活跃 / 归档项目列表, 全部项目列表 (按 (created_at, id) 倒序 keyset)
+create index if not exists idx_research_projects_user_active on research_projects(user_id, is_active, created_at desc, id desc);
+create index if not exists idx_research_projects_user_created on research_projects(user_id, created_at desc, id desc);
+-- History 弹出框: 某项目的日志按 (created_at, id) 倒序
+create index if not exists idx_research_logs_user_project on research_logs(user_id, project_id, created_at desc, id desc);
+-- 某天 / 某天以来的日志 (Summary 的活动热力图)
+create index if not exists idx_research_logs_user_date on research_logs(user_id, date desc, id desc);
+-- 全部 / 未完成 idea 按创建时间, 已完成 idea 按完成时间
+create index if not exists idx_ideas_user_created on ideas(user_id, created_at desc, id desc);
+create index if not exists idx_ideas_user_status on ideas(user_id, status, updated_at desc, id desc);
+-- History 弹出框; 某时刻以来的更新
+create index if not exists idx_idea_updates_user_idea on idea_updates(user_id, idea_id, created_at desc, id desc);
+create index if not exists idx_idea_updates_user_created on idea_updates(user_id, created_at desc, id desc);
+
+-- 最近一条记录改由父表的 last_log_at / last_preview 提供 (见活动计数触发器), 旧视图不再使用
+drop view if exists latest_research_logs;
+drop view if exists latest_idea_updates;
 
 -- ============================================================
 -- 字段迁移 (给已存在的表添加新字段)
@@ -95,3 +167,480 @@ ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS lc_easy_count int default 0;
 ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS lc_medium_count int default 0;
 ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS lc_hard_count int default 0;
 ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS lc_notes text;
+
+-- ============================================================
+-- 活动计数 (反范式字段, 由触发器维护)
+-- 归档列表直接读取, 无需再拉取全部日志来计数
+-- last_preview 取前 101 字: 多出的一个字只用来判断原文是否超过 100 字 (界面显示前 100 字加省略号)
+-- ============================================================
+ALTER TABLE research_projects ADD COLUMN IF NOT EXISTS log_count int not null default 0;
+ALTER TABLE research_projects ADD COLUMN IF NOT EXISTS last_log_at timestamp with time zone;
+ALTER TABLE research_projects ADD COLUMN IF NOT EXISTS last_log_date date;
+ALTER TABLE research_projects ADD COLUMN IF NOT EXISTS last_preview text;
+ALTER TABLE ideas ADD COLUMN IF NOT EXISTS log_count int not null default 0;
+ALTER TABLE ideas ADD COLUMN IF NOT EXISTS last_log_at timestamp with time zone;
+ALTER TABLE ideas ADD COLUMN IF NOT EXISTS last_preview text;
+
+create or replace function sync_project_activity() returns trigger as $$
+begin
+  if tg_op = 'INSERT' then
+    update research_projects set
+      log_count = log_count + 1,
+      last_log_at = greatest(last_log_at, new.created_at),
+      last_log_date = case
+        when last_log_at is null or new.created_at >= last_log_at then new.date
+        else last_log_date
+      end,
+      last_preview = case
+        when last_log_at is null or new.created_at >= last_log_at then left(new.content, 101)
+        else last_preview
+      end
+    where id = new.project_id;
+  else
+    -- UPDATE / DELETE 较少发生, 直接按剩余日志重算
+    update research_projects p set
+      log_count = (select count(*) from research_logs l where l.project_id = p.id),
+      (last_log_at, last_log_date, last_preview) = (
+        select l.created_at, l.date, left(l.content, 101) from research_logs l
+        where l.project_id = p.id order by l.created_at desc limit 1
+      )
+    where p.id in (old.project_id, new.project_id);
+  end if;
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_research_logs_activity on research_logs;
+create trigger trg_research_logs_activity
+after insert or update or delete on research_logs
+for each row execute function sync_project_activity();
+
+create or replace function sync_idea_activity() returns trigger as $$
+begin
+  if tg_op = 'INSERT' then
+    update ideas set
+      log_count = log_count + 1,
+      last_log_at = greatest(last_log_at, new.created_at),
+      last_preview = case
+        when last_log_at is null or new.created_at >= last_log_at then left(new.content, 101)
+        else last_preview
+      end
+    where id = new.idea_id;
+  else
+    update ideas i set
+      log_count = (select count(*) from idea_updates u where u.idea_id = i.id),
+      (last_log_at, last_preview) = (
+        select u.created_at, left(u.content, 101) from idea_updates u
+        where u.idea_id = i.id order by u.created_at desc limit 1
+      )
+    where i.id in (old.idea_id, new.idea_id);
+  end if;
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_idea_updates_activity on idea_updates;
+create trigger trg_idea_updates_activity
+after insert or update or delete on idea_updates
+for each row execute function sync_idea_activity();
+
+-- 回填已有数据
+update research_projects p set
+  log_count = (select count(*) from research_logs l where l.project_id = p.id),
+  (last_log_at, last_log_date, last_preview) = (
+    select l.created_at, l.date, left(l.content, 101) from research_logs l
+    where l.project_id = p.id order by l.created_at desc limit 1
+  );
+update ideas i set
+  log_count = (select count(*) from idea_updates u where u.idea_id = i.id),
+  (last_log_at, last_preview) = (
+    select u.created_at, left(u.content, 101) from idea_updates u
+    where u.idea_id = i.id order by u.created_at desc limit 1
+  );
+
+-- ============================================================
+-- 周 / 月汇总表 (Log Rollups)
+-- daily_logs 每次写入时由触发器增量更新, 长区间图表只需读 O(桶数) 行
+-- ============================================================
+-- 多用户之前建的汇总表没有 user_id: 直接删掉, 下面由 daily_logs 全量重建
+do $$
+begin
+  if to_regclass('log_rollups') is not null and not exists (
+    select 1 from information_schema.columns where table_name = 'log_rollups' and column_name = 'user_id'
+  ) then
+    drop table log_rollups;
+  end if;
+end;
+$$;
+
+create table if not exists log_rollups (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  grain text not null,   -- week, month
+  bucket date not null,  -- 周一 / 月初
+  newsletter_time bigint not null default 0,
+  video_time bigint not null default 0,
+  wechat_time bigint not null default 0,
+  gre_vocab_count bigint not null default 0,
+  gre_verbal_count bigint not null default 0,
+  gre_reading_count bigint not null default 0,
+  lc_easy_count bigint not null default 0,
+  lc_medium_count bigint not null default 0,
+  lc_hard_count bigint not null default 0,
+  primary key (user_id, grain, bucket)
+);
+
+-- 把一行 daily_logs 按 p_sign (+1 / -1) 计入它所在的周和月
+create or replace function rollup_daily_log(d daily_logs, p_sign int) returns void as $$
+declare
+  g text;
+begin
+  foreach g in array array['week', 'month'] loop
+    insert into log_rollups as r (user_id, grain, bucket, newsletter_time, video_time, wechat_time, gre_vocab_count, gre_verbal_count, gre_reading_count, lc_easy_count, lc_medium_count, lc_hard_count)
+    values (
+      d.user_id, g, date_trunc(g, d.date)::date,
+      p_sign * coalesce(d.newsletter_time, 0),
+      p_sign * coalesce(d.video_time, 0),
+      p_sign * coalesce(d.wechat_time, 0),
+      p_sign * coalesce(d.gre_vocab_count, 0),
+      p_sign * coalesce(d.gre_verbal_count, 0),
+      p_sign * coalesce(d.gre_reading_count, 0),
+      p_sign * coalesce(d.lc_easy_count, 0),
+      p_sign * coalesce(d.lc_medium_count, 0),
+      p_sign * coalesce(d.lc_hard_count, 0)
+    )
+    on conflict (user_id, grain, bucket) do update set
+      newsletter_time = r.newsletter_time + excluded.newsletter_time,
+      video_time = r.video_time + excluded.video_time,
+      wechat_time = r.wechat_time + excluded.wechat_time,
+      gre_vocab_count = r.gre_vocab_count + excluded.gre_vocab_count,
+      gre_verbal_count = r.gre_verbal_count + excluded.gre_verbal_count,
+      gre_reading_count = r.gre_reading_count + excluded.gre_reading_count,
+      lc_easy_count = r.lc_easy_count + excluded.lc_easy_count,
+      lc_medium_count = r.lc_medium_count + excluded.lc_medium_count,
+      lc_hard_count = r.lc_hard_count + excluded.lc_hard_count;
+  end loop;
+end;
+$$ language plpgsql;
+
+create or replace function sync_log_rollups() returns trigger as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform rollup_daily_log(old, -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform rollup_daily_log(new, 1);
+  end if;
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_daily_logs_rollups on daily_logs;
+create trigger trg_daily_logs_rollups
+after insert or update or delete on daily_logs
+for each row execute function sync_log_rollups();
+
+-- 由 daily_logs 全量重建 (可重复执行)
+delete from log_rollups;
+insert into log_rollups (user_id, grain, bucket, newsletter_time, video_time, wechat_time, gre_vocab_count, gre_verbal_count, gre_reading_count, lc_easy_count, lc_medium_count, lc_hard_count)
+select d.user_id, g, date_trunc(g, d.date)::date,
+       sum(coalesce(d.newsletter_time, 0)),
+       sum(coalesce(d.video_time, 0)),
+       sum(coalesce(d.wechat_time, 0)),
+       sum(coalesce(d.gre_vocab_count, 0)),
+       sum(coalesce(d.gre_verbal_count, 0)),
+       sum(coalesce(d.gre_reading_count, 0)),
+       sum(coalesce(d.lc_easy_count, 0)),
+       sum(coalesce(d.lc_medium_count, 0)),
+       sum(coalesce(d.lc_hard_count, 0))
+from daily_logs d cross join unnest(array['week', 'month']) as g
+group by 1, 2, 3;
+
+-- ============================================================
+-- Summary 页一次性数据 (RPC: summary_dashboard)
+-- 返回快照、本周每日数据、所选区间的周/月汇总和最近 p_activity_days 天的活动, 一次往返
+-- 活动按 (对象 id, 日期) 聚合, 由前端的 activity.py 展开成稠密矩阵
+-- ============================================================
+drop function if exists summary_dashboard(date);
+drop function if exists summary_dashboard(date, text, date, date);
+create or replace function summary_dashboard(
+  p_today date,
+  p_grain text default 'week',
+  p_start date default null,
+  p_end date default null,
+  p_activity_days int default 14
+)
+returns json
+language sql stable
+as $$
+  select json_build_object(
+    'today', (select row_to_json(d) from daily_logs d where d.date = p_today),
+
+    'today_projects', coalesce((
+      select json_agg(p.title order by l.created_at)
+      from research_logs l join research_projects p on p.id = l.project_id
+      where l.date = p_today
+    ), '[]'::json),
+
+    'today_ideas', coalesce((
+      select json_agg(distinct i.title)
+      from idea_updates u join ideas i on i.id = u.idea_id
+      -- 与 idea_activity 一样按 UTC 划分日期, 不依赖会话时区
+      where u.created_at >= p_today::timestamp at time zone 'utc'
+    ), '[]'::json),
+
+    -- 本周一至今的每日数据
+    'week_days', coalesce((
+      select json_agg(w order by w.date) from (
+        select date, newsletter_time, video_time, wechat_time,
+               gre_vocab_count, gre_verbal_count, gre_reading_count,
+               lc_easy_count, lc_medium_count, lc_hard_count
+        from daily_logs
+        where date >= p_today - (extract(isodow from p_today)::int - 1)
+      ) w
+    ), '[]'::json),
+
+    -- 所选粒度和区间内的汇总行, 直接读 log_rollups
+    'rollups', coalesce((
+      select json_agg(w order by w.date) from (
+        select bucket as date, newsletter_time, video_time, wechat_time,
+               gre_vocab_count, gre_verbal_count, gre_reading_count,
+               lc_easy_count, lc_medium_count, lc_hard_count
+        from log_rollups
+        where grain = p_grain
+          and (p_start is null or bucket >= date_trunc(p_grain, p_start)::date)
+          and (p_end is null or bucket <= p_end)
+      ) w
+    ), '[]'::json),
+
+    'active_projects', coalesce((
+      select json_agg(json_build_object('id', id, 'title', title) order by created_at desc)
+      from research_projects where is_active
+    ), '[]'::json),
+
+    'project_activity', coalesce((
+      select json_agg(a) from (
+        select l.project_id as id, l.date, count(*) as count, coalesce(sum(l.duration_minutes), 0) as minutes
+        from research_logs l join research_projects p on p.id = l.project_id
+        where p.is_active and l.date > p_today - p_activity_days
+        group by l.project_id, l.date
+      ) a
+    ), '[]'::json),
+
+    'active_ideas', coalesce((
+      select json_agg(json_build_object('id', id, 'title', title) order by created_at desc)
+      from ideas where status <> 'Done'
+    ), '[]'::json),
+
+    'idea_activity', coalesce((
+      select json_agg(a) from (
+        select u.idea_id as id, (u.created_at at time zone 'utc')::date as date, count(*) as count
+        from idea_updates u join ideas i on i.id = u.idea_id
+        where i.status <> 'Done' and u.created_at >= (p_today - (p_activity_days - 1))::timestamp at time zone 'utc'
+        group by u.idea_id, 2
+      ) a
+    ), '[]'::json)
+  );
+$$;
+
+-- ============================================================
+-- 全文搜索 (RPC: search_notes)
+-- research_logs / idea_updates 的 content 维护一个 tsvector 生成列, 用 GIN 索引查询
+-- 'simple' 配置不做词干化和停用词, 中英文混写的笔记按原词匹配
+-- ============================================================
+ALTER TABLE research_logs ADD COLUMN IF NOT EXISTS search_vector tsvector generated always as (to_tsvector('simple', coalesce(content, ''))) stored;
+ALTER TABLE idea_updates ADD COLUMN IF NOT EXISTS search_vector tsvector generated always as (to_tsvector('simple', coalesce(content, ''))) stored;
+create index if not exists idx_research_logs_search on research_logs using gin (search_vector);
+create index if not exists idx_idea_updates_search on idea_updates using gin (search_vector);
+
+-- 按相关度倒序, 以 (rank, created_at, id) 做 keyset 分页; 摘要只对当前页计算
+create or replace function search_notes(
+  p_query text,
+  p_kind text default null,          -- research_log / idea_update, null 为两者
+  p_parent_id uuid default null,     -- 限定某个项目或 idea
+  p_start date default null,
+  p_end date default null,
+  p_before_rank real default null,   -- 上一页最后一条的 (rank, created_at, id)
+  p_before_created_at timestamp with time zone default null,
+  p_before_id uuid default null,
+  p_limit int default 20
+)
+returns table (
+  kind text, id uuid, parent_id uuid, parent_title text,
+  date date, created_at timestamp with time zone, rank real, snippet text
+)
+language sql stable
+as $$
+  with q as (
+    select websearch_to_tsquery('simple', p_query) as query
+  ),
+  hits as (
+    select 'research_log'::text as kind, l.id, l.project_id as parent_id, l.date, l.created_at,
+           ts_rank(l.search_vector, q.query) as rank, l.content
+    from research_logs l, q
+    where (p_kind is null or p_kind = 'research_log')
+      and l.search_vector @@ q.query
+      and (p_parent_id is null or l.project_id = p_parent_id)
+      and (p_start is null or l.date >= p_start)
+      and (p_end is null or l.date <= p_end)
+    union all
+    select 'idea_update'::text, u.id, u.idea_id, (u.created_at at time zone 'utc')::date, u.created_at,
+           ts_rank(u.search_vector, q.query), u.content
+    from idea_updates u, q
+    where (p_kind is null or p_kind = 'idea_update')
+      and u.search_vector @@ q.query
+      and (p_parent_id is null or u.idea_id = p_parent_id)
+      and (p_start is null or u.created_at >= p_start::timestamp at time zone 'utc')
+      and (p_end is null or u.created_at < (p_end + 1)::timestamp at time zone 'utc')
+  ),
+  page as (
+    select * from hits h
+    where p_before_id is null
+       or (h.rank, h.created_at, h.id) < (p_before_rank, p_before_created_at, p_before_id)
+    order by h.rank desc, h.created_at desc, h.id desc
+    limit p_limit
+  )
+  select p.kind, p.id, p.parent_id, coalesce(rp.title, i.title), p.date, p.created_at, p.rank,
+         ts_headline('simple', p.content, q.query, 'StartSel=**, StopSel=**, MaxWords=30, MinWords=10')
+  from page p
+  cross join q
+  left join research_projects rp on p.kind = 'research_log' and rp.id = p.parent_id
+  left join ideas i on p.kind = 'idea_update' and i.id = p.parent_id
+  order by p.rank desc, p.created_at desc, p.id desc;
+$$;
+
+-- ============================================================
+-- 指标事件表 (Metric Events)
+-- 每次修改时长 / 计数只追加一行增量; daily_logs 的数值列由触发器按事件累加, 是事件的物化结果
+-- 多个设备同时写入各自追加, 不会互相覆盖; 按 (metric, ts) 可直接查询单个指标的日内变化
+-- ============================================================
+create table if not exists metric_events (
+  id uuid default gen_random_uuid() primary key,  -- 由客户端生成, 重放时按 id 去重
+  user_id uuid not null default auth.uid() references auth.users(id) on delete cascade,
+  date date not null,                              -- 计入哪一天的 daily_logs
+  ts timestamp with time zone default timezone('utc'::text, now()),
+  metric text not null check (metric in (
+    'newsletter_time', 'video_time', 'wechat_time',
+    'gre_vocab_count', 'gre_verbal_count', 'gre_reading_count',
+    'lc_easy_count', 'lc_medium_count', 'lc_hard_count'
+  )),
+  delta int not null
+);
+
+ALTER TABLE metric_events ADD COLUMN IF NOT EXISTS user_id uuid default auth.uid() references auth.users(id) on delete cascade;
+select assign_legacy_rows('metric_events');
+-- 最后一处用到 assign_legacy_rows, 迁移函数不留在库里
+drop function if exists assign_legacy_rows(text);
+
+drop index if exists idx_metric_events_metric_ts;
+create index if not exists idx_metric_events_user_metric_ts on metric_events(user_id, metric, ts);
+
+-- 只处理 INSERT: 以 on conflict (id) do nothing 重放已写入的事件不会重复累加
+create or replace function apply_metric_event() returns trigger as $$
+begin
+  execute format(
+    'insert into daily_logs as d (user_id, date, %1$I) values ($1, $2, $3)
+     on conflict (user_id, date) do update set %1$I = coalesce(d.%1$I, 0) + excluded.%1$I',
+    new.metric
+  ) using new.user_id, new.date, new.delta;
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_metric_events_daily on metric_events;
+
+-- 第一次运行时把已有的 daily_logs 数值记为每天一条基线事件 (此时触发器已删除, 不会重复累加)
+insert into metric_events (user_id, date, ts, metric, delta)
+select d.user_id, d.date, d.date::timestamp at time zone 'utc', m.metric, m.value
+from daily_logs d
+cross join lateral (values
+  ('newsletter_time', d.newsletter_time), ('video_time', d.video_time), ('wechat_time', d.wechat_time),
+  ('gre_vocab_count', d.gre_vocab_count), ('gre_verbal_count', d.gre_verbal_count),
+  ('gre_reading_count', d.gre_reading_count), ('lc_easy_count', d.lc_easy_count),
+  ('lc_medium_count', d.lc_medium_count), ('lc_hard_count', d.lc_hard_count)
+) as m(metric, value)
+where coalesce(m.value, 0) <> 0
+  and not exists (select 1 from metric_events);
+
+create trigger trg_metric_events_daily
+after insert on metric_events
+for each row execute function apply_metric_event();
+
+-- ============================================================
+-- 多设备同时记录 (RPC: increment_metric / patch_daily_log)
+-- 计数在服务端原子地累加并返回合并后的总数; 笔记等字段只改给出的那几个, 不整行覆盖
+-- ============================================================
+create or replace function increment_metric(p_id uuid, p_date date, p_metric text, p_delta int)
+returns int
+language plpgsql
+as $$
+declare
+  v_total int;
+begin
+  -- 同一 p_id 重试时不会重复累加
+  insert into metric_events (id, date, metric, delta) values (p_id, p_date, p_metric, p_delta)
+  on conflict (id) do nothing;
+  execute format('select coalesce(%I, 0) from daily_logs where user_id = auth.uid() and date = $1', p_metric)
+    into v_total using p_date;
+  return v_total;
+end;
+$$;
+
+create or replace function patch_daily_log(p_date date, p_patch jsonb)
+returns void
+language plpgsql
+as $$
+declare
+  k text;
+begin
+  insert into daily_logs (user_id, date) values (auth.uid(), p_date) on conflict (user_id, date) do nothing;
+  for k in select jsonb_object_keys(p_patch) loop
+    -- 数值列只能通过 increment_metric 修改
+    if k not in ('newsletter_done', 'newsletter_note', 'video_done', 'video_note', 'wechat_done', 'lc_notes') then
+      raise exception 'patch_daily_log: % cannot be patched', k;
+    end if;
+    execute format(
+      'update daily_logs set %1$I = (jsonb_populate_record(null::daily_logs, $1)).%1$I where user_id = auth.uid() and date = $2', k
+    ) using p_patch, p_date;
+  end loop;
+end;
+$$;
+
+-- ============================================================
+-- 变更订阅 (Supabase Realtime)
+-- app 订阅这些表的 postgres_changes, 收到变更后只清除依赖该表的缓存, 并刷新打开的页面
+-- 开启 RLS 后订阅者只收到自己有权读的行: 配置了 [supabase] service_key 时一个进程订阅一次, 按行里的 user_id 分发;
+-- 否则每个用户用自己的登录令牌订阅
+-- ============================================================
+do $$
+declare
+  t text;
+begin
+  foreach t in array array['research_projects', 'ideas', 'research_logs', 'idea_updates', 'daily_logs', 'metric_events'] loop
+    if not exists (
+      select 1 from pg_publication_tables
+      where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = t
+    ) then
+      execute format('alter publication supabase_realtime add table %I', t);
+    end if;
+  end loop;
+end;
+$$;
+
+-- ============================================================
+-- 行级安全 (Row Level Security)
+-- 每个用户用 Supabase Auth 登录, 只能读写 user_id 为自己的行; 新行的 user_id 默认为 auth.uid()
+-- auth.uid() 包在子查询里, 每条语句只求值一次; 视图、触发器和 RPC 都以调用者身份执行, 同样受约束
+-- ============================================================
+do $$
+declare
+  t text;
+begin
+  foreach t in array array['daily_logs', 'research_projects', 'research_logs', 'ideas', 'idea_updates', 'metric_events', 'log_rollups'] loop
+    execute format('alter table %I enable row level security', t);
+    execute format('drop policy if exists own_rows on %I', t);
+    execute format(
+      'create policy own_rows on %I for all to authenticated
+       using (user_id = (select auth.uid())) with check (user_id = (select auth.uid()))', t);
+  end loop;
+end;
+$$;
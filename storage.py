@@ -0,0 +1,1014 @@
+# ============================================================
+# 存储后端 (Storage Backends)
+# app.py 中所有查询和写入都经过这里, 可在 Supabase 和本地 SQLite 之间切换
+# ============================================================
+import copy
+import re
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from records import (EMBEDDED, DailyLog, Idea, IdeaUpdate, Project, ResearchLog, SearchHit, table_columns,
+                     to_records)
+
+SCHEMA_PATH = Path(__file__).with_name("schema.sql")
+
+# daily_logs 中参与汇总的数值列
+METRIC_COLUMNS = [
+    "newsletter_time", "video_time", "wechat_time",
+    "gre_vocab_count", "gre_verbal_count", "gre_reading_count",
+    "lc_easy_count", "lc_medium_count", "lc_hard_count",
+]
+
+
+# daily_logs 中可以按字段修改的非数值列 (见 schema.sql 中的 patch_daily_log)
+PATCH_COLUMNS = [
+    "newsletter_done", "newsletter_note", "video_done", "video_note", "wechat_done", "lc_notes",
+]
+
+# 推送表级变更事件的表 (Supabase Realtime publication / SQLite table_versions)
+CHANGE_TABLES = ["research_projects", "ideas", "research_logs", "idea_updates", "daily_logs", "metric_events"]
+
+# SQLite 本地部署的默认用户; 多用户之前的数据也归到这个用户
+LOCAL_USER = "00000000-0000-0000-0000-000000000000"
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def primary_key(table: str) -> tuple:
+    return ("user_id", "date") if table == "daily_logs" else ("id",)
+
+
+class Storage(ABC):
+    """存储接口: 覆盖 app.py 用到的全部查询和写入
+
+    读操作返回 records 中的类型化记录, columns 指定要查询的列 (默认为本表全部列)。
+    新增行的写操作可传入 row_id 作为新行的 id (表单的提交令牌), 同一 row_id 重复写入只插入一行。
+    每个实例只读写 user_id 这一个用户的数据; 批量读写 (iter_rows / upsert_rows) 按行里的 user_id, 没有时归当前用户。
+    """
+
+    user_id = None
+
+    def for_user(self, user_id: str):
+        """同一后端上只读写 user_id 数据的存储对象, 与原对象共用连接"""
+        scoped = copy.copy(self)
+        scoped.user_id = user_id
+        return scoped
+
+    # --- Daily Logs ---
+    @abstractmethod
+    def get_daily_log(self, day: str, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_logs_since(self, start_date: str, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_daily_log(self, data: dict):
+        """按 (user_id, date) 插入或部分更新, 只写 data 中出现的字段; 数值列改用 add_metric_events 累加"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def patch_daily_log(self, day: str, fields: dict):
+        """只修改给出的 PATCH_COLUMNS 字段, 其他字段 (包括其他设备刚写入的) 不受影响"""
+        raise NotImplementedError
+
+    # --- Metric Events ---
+    @abstractmethod
+    def add_metric_events(self, events: list):
+        """追加指标增量 [{id, date, ts, metric, delta}] 并累加到对应日期的 daily_logs; id 已存在的事件忽略"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def increment_metric(self, day: str, metric: str, delta: int, event_id: str = None):
+        """原子地给某天的指标加上 delta, 返回合并了所有设备写入后的总数
+
+        event_id 相同的重试只累加一次; 只记入了本地写日志时返回 None
+        """
+        raise NotImplementedError
+
+    # --- Research Projects ---
+    @abstractmethod
+    def get_active_projects(self, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_all_projects(self, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_archived_projects(self, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_project(self, title: str, row_id: str = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def archive_project(self, project_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_project(self, project_id: str):
+        raise NotImplementedError
+
+    # --- Research Logs ---
+    @abstractmethod
+    def get_project_logs(self, project_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        """项目日志, 按 (created_at, id) 倒序; before 为上一页最后一条的 (created_at, id), 用于 keyset 分页"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_research_logs_since(self, start_date: str, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_research_logs_on(self, day: str, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_research_log(self, project_id: str, day: str, duration: int, content: str, row_id: str = None):
+        raise NotImplementedError
+
+    # --- Ideas ---
+    @abstractmethod
+    def get_all_ideas(self, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_active_ideas(self, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_done_ideas(self, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_idea_updates_since(self, start_date: str, columns: tuple = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_idea_updates(self, idea_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        """idea 更新记录, 分页方式同 get_project_logs"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_idea(self, title: str, row_id: str = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_idea_status(self, idea_id: str, status: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_idea(self, idea_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_idea_update(self, idea_id: str, content: str, row_id: str = None):
+        raise NotImplementedError
+
+    # --- Summary ---
+    @abstractmethod
+    def summary_dashboard(self, day: str, grain: str, start: str, end: str, activity_days: int = 14):
+        """Summary 页的全部数据, 结构见 schema.sql 中的 summary_dashboard"""
+        raise NotImplementedError
+
+    # --- 搜索 ---
+    @abstractmethod
+    def search_notes(self, query: str, kind: str = None, parent_id: str = None, start: str = None,
+                     end: str = None, before: tuple = None, limit: int = 20):
+        """在 research logs 和 idea updates 的 content 中全文搜索, 按相关度倒序返回 SearchHit
+
+        kind 为 research_log / idea_update 时只搜一张表; parent_id 限定项目或 idea; start / end 为日期区间;
+        before 为上一页最后一条的 (rank, created_at, id)
+        """
+        raise NotImplementedError
+
+    # --- 批量读写 ---
+    @abstractmethod
+    def iter_rows(self, table: str, columns: tuple, chunk_size: int = 1000):
+        """按主键顺序分块读出整张表 (keyset 分页), 每次 yield 一块原始行 (dict)
+
+        读到空块才结束, 服务端的 max-rows 上限比 chunk_size 小时也不会漏行。
+        Supabase 上能读到哪些用户的行由所用的 key 决定 (RLS)。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_rows(self, table: str, rows: list):
+        """按主键批量插入或合并 (daily_logs 为 (user_id, date), 其余为 id); 各行字段须相同"""
+        raise NotImplementedError
+
+
+# ============================================================
+# Supabase
+# ============================================================
+# 列表读取按块走 keyset 分页; 块大小须不超过 PostgREST 的 max-rows (Supabase 默认 1000),
+# 这样不足一块即说明已读完, 常见的小结果集仍只需一次请求
+SCAN_CHUNK = 1000
+
+
+class SupabaseStorage(Storage):
+    """client 须以 user_id 这个用户登录 (Supabase Auth), 行级安全据此隔离各用户的数据"""
+
+    def __init__(self, client, user_id: str = None):
+        self.client = client
+        self.user_id = user_id
+
+    def _mine(self, query):
+        """RLS 之外再显式加上 user_id 条件, 查询计划可以直接走 (user_id, ...) 复合索引"""
+        return query.eq("user_id", self.user_id) if self.user_id else query
+
+    def _owned(self, row: dict) -> dict:
+        return {"user_id": self.user_id, **row} if self.user_id else row
+
+    def _insert(self, table: str, row: dict, row_id: str = None):
+        """插入一行新记录; 给出 row_id 时按主键忽略重复, 同一次提交重试多少次都只有一行"""
+        if row_id:
+            self.client.table(table).upsert(self._owned({"id": row_id, **row}), ignore_duplicates=True).execute()
+        else:
+            self.client.table(table).insert(self._owned(row)).execute()
+
+    def _select(self, table: str, record, columns: tuple = None):
+        """只 select 声明的列; 父表字段用 PostgREST 的嵌入资源取, 例如 project_title:research_projects(title)"""
+        columns = columns or table_columns(record)
+        return self._mine(self.client.table(table).select(",".join(
+            f"{c}:{EMBEDDED[c][0]}({EMBEDDED[c][1]})" if c in EMBEDDED else c for c in columns)))
+
+    @staticmethod
+    def _keyset(query, keys: tuple, cursor: tuple = None, desc: bool = True):
+        """按 keys (一个唯一键, 或排序列加 id) 排序, 从 cursor (上一块最后一行的 keys 值) 之后开始"""
+        op = "lt" if desc else "gt"
+        if cursor and len(keys) == 1:
+            query = getattr(query, op)(keys[0], cursor[0])
+        elif cursor:
+            (key, tiebreak), (value, last) = keys, cursor
+            query = query.or_(f'{key}.{op}."{value}",and({key}.eq."{value}",{tiebreak}.{op}.{last})')
+        for key in keys:
+            query = query.order(key, desc=desc)
+        return query
+
+    def _page(self, table: str, record, columns: tuple, fk: str, parent_id: str, before: tuple, limit: int):
+        """某个父行的子记录, 按 (created_at, id) 倒序的 keyset 分页; 不给 limit 时由 _all 分块读完"""
+        where = lambda query: query.eq(fk, parent_id)
+        if not limit:
+            return self._all(table, record, columns, where, cursor=before)
+        query = self._keyset(where(self._select(table, record, columns)), ("created_at", "id"), before)
+        return self._records(record, query.limit(limit).execute())
+
+    def _all(self, table: str, record, columns: tuple = None, where=None, keys: tuple = ("created_at", "id"),
+             desc: bool = True, cursor: tuple = None) -> list:
+        """按 keys 分块读取全部匹配行 (从 cursor 之后开始), 每块直接并入结果列表; 结果不会被服务端的 max-rows 截断
+
+        where 为给查询加过滤条件的函数; 每块都重新构造查询, 因为 postgrest 的查询构造器会原地修改
+        """
+        columns = columns and tuple(dict.fromkeys((*columns, *keys)))
+        rows = []
+        while True:
+            query = self._select(table, record, columns)
+            if where:
+                query = where(query)
+            chunk = self._records(record, self._keyset(query, keys, cursor, desc).limit(SCAN_CHUNK).execute())
+            rows += chunk
+            if len(chunk) < SCAN_CHUNK:
+                return rows
+            cursor = tuple(getattr(chunk[-1], key) for key in keys)
+
+    @staticmethod
+    def _records(record, response):
+        rows = response.data or []
+        for row in rows:
+            for column in EMBEDDED.keys() & row.keys():
+                row[column] = (row[column] or {}).get(EMBEDDED[column][1])
+        return to_records(record, rows)
+
+    # --- Daily Logs ---
+    def get_daily_log(self, day: str, columns: tuple = None):
+        response = self._select("daily_logs", DailyLog, columns).eq("date", day).execute()
+        rows = self._records(DailyLog, response)
+        return rows[0] if rows else None
+
+    def get_logs_since(self, start_date: str, columns: tuple = None):
+        return self._all("daily_logs", DailyLog, columns, lambda query: query.gte("date", start_date), keys=("date",))
+
+    def upsert_daily_log(self, data: dict):
+        self.client.table("daily_logs").upsert(self._owned(data)).execute()
+
+    def patch_daily_log(self, day: str, fields: dict):
+        self.client.rpc("patch_daily_log", {"p_date": day, "p_patch": fields}).execute()
+
+    # --- Metric Events ---
+    def add_metric_events(self, events: list):
+        # 累加由 schema.sql 中的 apply_metric_event 触发器完成
+        self.client.table("metric_events").upsert([self._owned(event) for event in events],
+                                                   ignore_duplicates=True).execute()
+
+    def increment_metric(self, day: str, metric: str, delta: int, event_id: str = None):
+        response = self.client.rpc("increment_metric", {
+            "p_id": event_id or str(uuid.uuid4()),
+            "p_date": day,
+            "p_metric": metric,
+            "p_delta": delta,
+        }).execute()
+        return response.data
+
+    # --- Research Projects ---
+    def get_active_projects(self, columns: tuple = None):
+        return self._all("research_projects", Project, columns, lambda query: query.eq("is_active", True))
+
+    def get_all_projects(self, columns: tuple = None):
+        return self._all("research_projects", Project, columns)
+
+    def get_archived_projects(self, columns: tuple = None):
+        return self._all("research_projects", Project, columns, lambda query: query.eq("is_active", False))
+
+    def create_project(self, title: str, row_id: str = None):
+        self._insert("research_projects", {"title": title}, row_id)
+
+    def archive_project(self, project_id: str):
+        self._mine(self.client.table("research_projects").update({"is_active": False}).eq("id", project_id)).execute()
+
+    def delete_project(self, project_id: str):
+        self._mine(self.client.table("research_projects").delete().eq("id", project_id)).execute()
+
+    # --- Research Logs ---
+    def get_project_logs(self, project_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        return self._page("research_logs", ResearchLog, columns, "project_id", project_id, before, limit)
+
+    def get_research_logs_since(self, start_date: str, columns: tuple = None):
+        return self._all("research_logs", ResearchLog, columns, lambda query: query.gte("date", start_date),
+                         keys=("date", "id"))
+
+    def get_research_logs_on(self, day: str, columns: tuple = None):
+        return self._all("research_logs", ResearchLog, columns, lambda query: query.eq("date", day))
+
+    def add_research_log(self, project_id: str, day: str, duration: int, content: str, row_id: str = None):
+        self._insert("research_logs", {
+            "project_id": project_id,
+            "date": day,
+            "duration_minutes": duration,
+            "content": content
+        }, row_id)
+
+    # --- Ideas ---
+    def get_all_ideas(self, columns: tuple = None):
+        return self._all("ideas", Idea, columns)
+
+    def get_active_ideas(self, columns: tuple = None):
+        return self._all("ideas", Idea, columns, lambda query: query.neq("status", "Done"))
+
+    def get_done_ideas(self, columns: tuple = None):
+        return self._all("ideas", Idea, columns, lambda query: query.eq("status", "Done"), keys=("updated_at", "id"))
+
+    def get_idea_updates_since(self, start_date: str, columns: tuple = None):
+        return self._all("idea_updates", IdeaUpdate, columns, lambda query: query.gte("created_at", start_date))
+
+    def get_idea_updates(self, idea_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        return self._page("idea_updates", IdeaUpdate, columns, "idea_id", idea_id, before, limit)
+
+    def create_idea(self, title: str, row_id: str = None):
+        self._insert("ideas", {"title": title}, row_id)
+
+    def update_idea_status(self, idea_id: str, status: str):
+        query = self.client.table("ideas").update({"status": status, "updated_at": utc_now()}).eq("id", idea_id)
+        self._mine(query).execute()
+
+    def delete_idea(self, idea_id: str):
+        self._mine(self.client.table("ideas").delete().eq("id", idea_id)).execute()
+
+    def add_idea_update(self, idea_id: str, content: str, row_id: str = None):
+        self._insert("idea_updates", {"idea_id": idea_id, "content": content}, row_id)
+
+    # --- Summary ---
+    def summary_dashboard(self, day: str, grain: str, start: str, end: str, activity_days: int = 14):
+        response = self.client.rpc("summary_dashboard", {
+            "p_today": day,
+            "p_grain": grain,
+            "p_start": start,
+            "p_end": end,
+            "p_activity_days": activity_days,
+        }).execute()
+        return response.data or {}
+
+    # --- 搜索 ---
+    def search_notes(self, query: str, kind: str = None, parent_id: str = None, start: str = None,
+                     end: str = None, before: tuple = None, limit: int = 20):
+        rank, created_at, row_id = before or (None, None, None)
+        response = self.client.rpc("search_notes", {
+            "p_query": query,
+            "p_kind": kind,
+            "p_parent_id": parent_id,
+            "p_start": start,
+            "p_end": end,
+            "p_before_rank": rank,
+            "p_before_created_at": created_at,
+            "p_before_id": row_id,
+            "p_limit": limit,
+        }).execute()
+        return to_records(SearchHit, response.data or [])
+
+    # --- 批量读写 ---
+    def iter_rows(self, table: str, columns: tuple, chunk_size: int = 1000):
+        keys = primary_key(table)
+        cursor = None
+        while True:
+            query = self._keyset(self.client.table(table).select(",".join(columns)), keys, cursor, desc=False)
+            rows = query.limit(chunk_size).execute().data or []
+            if not rows:
+                return
+            yield rows
+            cursor = tuple(rows[-1][key] for key in keys)
+
+    def upsert_rows(self, table: str, rows: list):
+        self.client.table(table).upsert(rows).execute()
+
+
+# ============================================================
+# SQLite (本地自托管 / 测试 / 基准)
+# 表结构取自 schema.sql 的 create table 和 ADD COLUMN 语句;
+# 视图、触发器和 RPC 在这里用等价的查询实现
+# ============================================================
+
+# Postgres -> SQLite 的类型和默认值替换
+_SQLITE_REPLACEMENTS = [
+    # auth.users 只存在于 Supabase
+    (r"\s+default auth\.uid\(\)", ""),
+    (r"\s+references auth\.users\(id\) on delete cascade", ""),
+    (r"\buuid default gen_random_uuid\(\)", "text"),
+    (r"\buuid\b", "text"),
+    (r"timestamp with time zone default timezone\('utc'::text, now\(\)\)",
+     "text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"),
+    (r"timestamp with time zone", "text"),
+]
+
+
+def _to_sqlite(ddl: str) -> str:
+    for pattern, replacement in _SQLITE_REPLACEMENTS:
+        ddl = re.sub(pattern, replacement, ddl, flags=re.IGNORECASE)
+    return ddl
+
+
+def sqlite_schema(sql: str):
+    """从 schema.sql 中提取建表语句、补充字段和 B-tree 索引, 转成 SQLite 方言
+
+    返回 (create 语句列表, [(表, 字段, 字段定义)], drop / create index 语句列表)
+    """
+    creates = [
+        _to_sqlite(match.group(0))
+        for match in re.finditer(r"create table if not exists \w+ \(.*?\n\);", sql, re.IGNORECASE | re.DOTALL)
+    ]
+    columns = [
+        (table, column, _to_sqlite(definition.strip()))
+        for table, column, definition in re.findall(
+            r"ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+) ([^;]+);", sql, re.IGNORECASE)
+        if not definition.startswith("tsvector")  # 全文索引由 SQLiteStorage 用 FTS5 另建
+    ]
+    # 不含 using gin 等 Postgres 专有索引
+    indexes = re.findall(r"drop index if exists \w+;|create index if not exists \w+ on \w+\s*\([^;]*\);",
+                         sql, re.IGNORECASE)
+    return creates, columns, indexes
+
+
+# log_rollups 的桶, 与 schema.sql 中的 date_trunc 一致: 周以周一为桶, 月以月初为桶
+ROLLUP_BUCKETS = {
+    "week": "date({row}.date, '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m-01', {row}.date)",
+}
+
+# 子表 -> (父表, 外键), 父表上维护 log_count / last_log_at / last_preview (research_projects 另有 last_log_date)
+ACTIVITY_PARENTS = {
+    "research_logs": ("research_projects", "project_id"),
+    "idea_updates": ("ideas", "idea_id"),
+}
+# 预览显示的字数; last_preview 多存一个字, 用来判断原文是否被截断 (与 schema.sql 中的 left(content, 101) 一致)
+PREVIEW_LENGTH = 100
+
+# 全文搜索: 子表 -> 结果类型
+SEARCH_KINDS = {
+    "research_logs": "research_log",
+    "idea_updates": "idea_update",
+}
+
+
+def _fts_query(text: str) -> str:
+    """把搜索框输入转成 FTS5 查询: 每个词加引号, 全部命中才算匹配"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+
+class SQLiteStorage(Storage):
+    """没有 RLS, 每条查询都显式带上 user_id 条件; 写入时行里没有 user_id 的归当前用户 (对应 default auth.uid())"""
+
+    def __init__(self, path: str = ":memory:", user_id: str = LOCAL_USER):
+        self.user_id = user_id
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("pragma foreign_keys = on")
+        if path != ":memory:":
+            self.conn.execute("pragma journal_mode = wal")
+        # 一个连接在 Streamlit 的多个 session 线程间共享
+        self.lock = threading.Lock()
+        self._create_tables()
+        self._create_rollups()
+        self._create_search_index()
+        self._create_change_log()
+
+    def _create_tables(self):
+        creates, columns, indexes = sqlite_schema(SCHEMA_PATH.read_text(encoding="utf-8"))
+        with self.lock, self.conn:
+            has_events = self.conn.execute("select 1 from sqlite_master where name = 'metric_events'").fetchone()
+            if not self._has_column("log_rollups", "user_id"):
+                # 多用户之前的汇总表, 本地不读它, 直接按新结构重建
+                self.conn.execute("drop table if exists log_rollups")
+            for statement in creates:
+                self.conn.execute(statement)
+            # 预览改存 101 字并加了 last_log_date 的库: 按已有日志回填一次
+            backfill = not self._has_column("research_projects", "last_log_date")
+            for table, column, definition in columns:
+                if not self._has_column(table, column):
+                    self.conn.execute(f"alter table {table} add column {column} {definition}")
+            if backfill:
+                for table, (parent, _) in ACTIVITY_PARENTS.items():
+                    self._sync_activity(table, [row["id"] for row in self.conn.execute(f"select id from {parent}")])
+            # 对应 schema.sql 中的 assign_legacy_rows: 多用户之前的数据归本地默认用户
+            for table in CHANGE_TABLES:
+                self.conn.execute(f"update {table} set user_id = ? where user_id is null", (LOCAL_USER,))
+            self._rebuild_daily_logs(next(c for c in creates if " daily_logs " in c), columns)
+            for statement in indexes:
+                self.conn.execute(statement)
+            if not has_events:
+                # 对应 schema.sql 中的基线回填: 已有的 daily_logs 数值记为每天一条事件
+                self.conn.executemany(
+                    "insert into metric_events (id, user_id, date, ts, metric, delta) values (?, ?, ?, ?, ?, ?)",
+                    [(str(uuid.uuid4()), row["user_id"], row["date"], f"{row['date']}T00:00:00+00:00", metric, row[metric])
+                     for row in self.conn.execute(f"select user_id, date, {', '.join(METRIC_COLUMNS)} from daily_logs")
+                     for metric in METRIC_COLUMNS if row[metric]])
+            # boolean 列在 SQLite 中存为 0/1, 读出时还原成 bool
+            self.bool_columns = {
+                row["name"]
+                for (table,) in self.conn.execute("select name from sqlite_master where type = 'table'")
+                for row in self.conn.execute(f"pragma table_info({table})")
+                if row["type"].lower() == "boolean"
+            }
+
+    def _has_column(self, table: str, column: str) -> bool:
+        return any(row["name"] == column for row in self.conn.execute(f"pragma table_info({table})"))
+
+    def _rebuild_daily_logs(self, create: str, columns: list):
+        """主键由 date 改为 (user_id, date); SQLite 不能修改主键, 建新表复制数据后替换"""
+        key = [row["name"] for row in self.conn.execute("pragma table_info(daily_logs)") if row["pk"]]
+        if key != ["date"]:
+            return
+        self.conn.execute(create.replace(" daily_logs ", " daily_logs_rebuild ", 1))
+        for table, column, definition in columns:
+            if table == "daily_logs" and not self._has_column("daily_logs_rebuild", column):
+                self.conn.execute(f"alter table daily_logs_rebuild add column {column} {definition}")
+        names = ", ".join(row["name"] for row in self.conn.execute("pragma table_info(daily_logs)"))
+        self.conn.execute(f"insert into daily_logs_rebuild ({names}) select {names} from daily_logs")
+        self.conn.execute("drop table daily_logs")
+        self.conn.execute("alter table daily_logs_rebuild rename to daily_logs")
+
+    def _create_rollups(self):
+        """对应 schema.sql 中的 sync_log_rollups 触发器: daily_logs 每次写入时增量更新所在的周和月"""
+        metrics = ", ".join(METRIC_COLUMNS)
+
+        def apply(row: str, sign: int) -> str:
+            values = ", ".join(f"{sign} * coalesce({row}.{c}, 0)" for c in METRIC_COLUMNS)
+            updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in METRIC_COLUMNS)
+            return "".join(
+                f"insert into log_rollups (user_id, grain, bucket, {metrics})"
+                f" values ({row}.user_id, '{grain}', {bucket.format(row=row)}, {values})"
+                f" on conflict (user_id, grain, bucket) do update set {updates};"
+                for grain, bucket in ROLLUP_BUCKETS.items())
+
+        with self.lock, self.conn:
+            if self.conn.execute("select 1 from sqlite_master where name = 'daily_logs_rollups_insert'").fetchone():
+                return
+            # 第一次建触发器 (或 daily_logs 重建后触发器随表删除): 由 daily_logs 全量重建
+            self.conn.execute("delete from log_rollups")
+            for grain, bucket in ROLLUP_BUCKETS.items():
+                sums = ", ".join(f"sum(coalesce({c}, 0))" for c in METRIC_COLUMNS)
+                self.conn.execute(
+                    f"insert into log_rollups (user_id, grain, bucket, {metrics})"
+                    f" select user_id, '{grain}', {bucket.format(row='daily_logs')}, {sums}"
+                    f" from daily_logs group by 1, 3")
+            self.conn.executescript(f"""
+                create trigger if not exists daily_logs_rollups_insert after insert on daily_logs begin
+                    {apply("new", 1)}
+                end;
+                create trigger if not exists daily_logs_rollups_update
+                after update of user_id, date, {metrics} on daily_logs begin
+                    {apply("old", -1)}
+                    {apply("new", 1)}
+                end;
+                create trigger if not exists daily_logs_rollups_delete after delete on daily_logs begin
+                    {apply("old", -1)}
+                end;
+            """)
+
+    def _create_search_index(self):
+        """对应 schema.sql 中的 tsvector 列和 GIN 索引: 每张子表一个 FTS5 外部内容表, 由触发器同步
+
+        FTS5 的 rowid 取自 {table}_search_ids 中的 integer primary key, 与子表的文本 id 一一对应;
+        不用子表的隐式 rowid, 因为 VACUUM 可能给没有 integer primary key 的表重新编号, 索引会对不上
+        """
+        with self.lock, self.conn:
+            for table in SEARCH_KINDS:
+                fts, ids = f"{table}_fts", f"{table}_search_ids"
+                if self.conn.execute("select 1 from sqlite_master where name = ?", (f"{table}_search_insert",)).fetchone():
+                    continue
+                # 第一次建索引, 或旧版按 rowid 建的索引, 或子表重建后触发器随表删除: 整个重建
+                self.conn.executescript(f"""
+                    drop trigger if exists {fts}_insert;
+                    drop trigger if exists {fts}_delete;
+                    drop trigger if exists {fts}_update;
+                    drop table if exists {fts};
+                    drop view if exists {table}_search_src;
+                    drop table if exists {ids};
+                    create table {ids} (docid integer primary key, id text not null unique);
+                    insert into {ids} (id) select id from {table} order by created_at, id;
+                    create view {table}_search_src as
+                        select m.docid, c.content from {ids} m join {table} c on c.id = m.id;
+                    create virtual table {fts} using fts5(
+                        content, content='{table}_search_src', content_rowid='docid',
+                        tokenize='unicode61 remove_diacritics 2');
+                    create trigger {table}_search_insert after insert on {table} begin
+                        insert into {ids} (id) values (new.id);
+                        insert into {fts} (rowid, content)
+                            select docid, new.content from {ids} where id = new.id;
+                    end;
+                    create trigger {table}_search_delete after delete on {table} begin
+                        insert into {fts} ({fts}, rowid, content)
+                            select 'delete', docid, old.content from {ids} where id = old.id;
+                        delete from {ids} where id = old.id;
+                    end;
+                    create trigger {table}_search_update after update of content on {table} begin
+                        insert into {fts} ({fts}, rowid, content)
+                            select 'delete', docid, old.content from {ids} where id = old.id;
+                        insert into {fts} (rowid, content)
+                            select docid, new.content from {ids} where id = new.id;
+                    end;
+                    insert into {fts} ({fts}) values ('rebuild');
+                """)
+
+    def _create_change_log(self):
+        """对应 schema.sql 中的 Realtime publication: 每个用户的每张表在 table_versions 中有一个版本号,
+        由触发器递增, 供 SQLiteFeed 轮询"""
+        with self.lock, self.conn:
+            if self.conn.execute("select 1 from sqlite_master where name = 'table_versions'").fetchone() \
+                    and not self._has_column("table_versions", "user_id"):
+                # 多用户之前按表计数, 连同触发器一起重建
+                self.conn.execute("drop table table_versions")
+                for table in CHANGE_TABLES:
+                    for event in ("insert", "update", "delete"):
+                        self.conn.execute(f"drop trigger if exists {table}_{event}_version")
+            self.conn.execute("""
+                create table if not exists table_versions (
+                    user_id text not null, tbl text not null, version integer not null, primary key (user_id, tbl))
+            """)
+            for table in CHANGE_TABLES:
+                for event, row in (("insert", "new"), ("update", "new"), ("delete", "old")):
+                    self.conn.execute(f"""
+                        create trigger if not exists {table}_{event}_version after {event} on {table} begin
+                            insert into table_versions (user_id, tbl, version) values ({row}.user_id, '{table}', 1)
+                            on conflict (user_id, tbl) do update set version = version + 1;
+                        end
+                    """)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        data = dict(row)
+        for column in self.bool_columns.intersection(data):
+            if data[column] is not None:
+                data[column] = bool(data[column])
+        return data
+
+    def _query(self, sql: str, params=()):
+        with self.lock:
+            return [self._row(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def _execute(self, sql: str, params=()):
+        with self.lock, self.conn:
+            self.conn.execute(sql, params)
+
+    def _select(self, table: str, record, columns: tuple = None, where: str = "", params=(), order: str = ""):
+        """只查询声明的列; 父表字段通过 left join 取。where 为附加条件, 总会加上 user_id 条件"""
+        columns = columns or table_columns(record)
+        fields, joins = [], {}
+        for column in columns:
+            if column in EMBEDDED:
+                parent, parent_column = EMBEDDED[column]
+                joins[parent] = f" left join {parent} on {parent}.id = {table}.{ACTIVITY_PARENTS[table][1]}"
+                fields.append(f"{parent}.{parent_column} as {column}")
+            else:
+                fields.append(f"{table}.{column}")
+        sql = f"select {', '.join(fields)} from {table}{''.join(joins.values())} where {table}.user_id = ?"
+        if where:
+            sql += f" and {where}"
+        return to_records(record, self._query(f"{sql} {order}", (self.user_id, *params)))
+
+    def _page(self, table: str, record, columns: tuple, fk: str, parent_id: str, before: tuple, limit: int):
+        """按 (created_at, id) 倒序的 keyset 分页"""
+        where, params = f"{table}.{fk} = ?", [parent_id]
+        if before:
+            where += f" and ({table}.created_at, {table}.id) < (?, ?)"
+            params += list(before)
+        order = f"order by {table}.created_at desc, {table}.id desc"
+        if limit:
+            order += " limit ?"
+            params.append(limit)
+        return self._select(table, record, columns, where, params, order)
+
+    # --- Daily Logs ---
+    def get_daily_log(self, day: str, columns: tuple = None):
+        rows = self._select("daily_logs", DailyLog, columns, "daily_logs.date = ?", (day,))
+        return rows[0] if rows else None
+
+    def get_logs_since(self, start_date: str, columns: tuple = None):
+        return self._select("daily_logs", DailyLog, columns,
+                            "daily_logs.date >= ?", (start_date,), "order by daily_logs.date desc")
+
+    def upsert_daily_log(self, data: dict):
+        data = {**data, "user_id": self.user_id}
+        columns = list(data)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in ("user_id", "date"))
+        self._execute(
+            f"insert into daily_logs ({', '.join(columns)}) values ({', '.join('?' for _ in columns)}) "
+            f"on conflict (user_id, date) do " + (f"update set {updates}" if updates else "nothing"),
+            [data[c] for c in columns],
+        )
+
+    def patch_daily_log(self, day: str, fields: dict):
+        unknown = set(fields) - set(PATCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"patch_daily_log: {', '.join(sorted(unknown))} cannot be patched")
+        self.upsert_daily_log({"date": day, **fields})
+
+    # --- Metric Events ---
+    def add_metric_events(self, events: list):
+        with self.lock, self.conn:
+            for event in events:
+                self._insert_metric_event(event)
+
+    def increment_metric(self, day: str, metric: str, delta: int, event_id: str = None):
+        event = {"id": event_id or str(uuid.uuid4()), "date": day, "metric": metric, "delta": delta}
+        with self.lock, self.conn:
+            self._insert_metric_event(event)
+            return self.conn.execute(f"select coalesce({metric}, 0) from daily_logs where user_id = ? and date = ?",
+                                     (self.user_id, day)).fetchone()[0]
+
+    def _insert_metric_event(self, event: dict):
+        user_id = event.get("user_id") or self.user_id
+        cursor = self.conn.execute(
+            "insert into metric_events (id, user_id, date, ts, metric, delta) values (?, ?, ?, ?, ?, ?)"
+            " on conflict (id) do nothing",
+            (event["id"], user_id, event["date"], event.get("ts") or utc_now(), event["metric"], event["delta"]))
+        if cursor.rowcount:
+            # 对应 schema.sql 中 apply_metric_event 触发器; metric 已由表上的 check 约束校验
+            metric = event["metric"]
+            self.conn.execute(
+                f"insert into daily_logs (user_id, date, {metric}) values (?, ?, ?)"
+                f" on conflict (user_id, date) do update set {metric} = coalesce({metric}, 0) + excluded.{metric}",
+                (user_id, event["date"], event["delta"]))
+
+    # --- Research Projects ---
+    def get_active_projects(self, columns: tuple = None):
+        return self._select("research_projects", Project, columns,
+                            "research_projects.is_active", order="order by research_projects.created_at desc")
+
+    def get_all_projects(self, columns: tuple = None):
+        return self._select("research_projects", Project, columns, order="order by research_projects.created_at desc")
+
+    def get_archived_projects(self, columns: tuple = None):
+        return self._select("research_projects", Project, columns,
+                            "not research_projects.is_active", order="order by research_projects.created_at desc")
+
+    def create_project(self, title: str, row_id: str = None):
+        self._execute(
+            "insert into research_projects (id, user_id, title, created_at) values (?, ?, ?, ?)"
+            " on conflict (id) do nothing",
+            (row_id or str(uuid.uuid4()), self.user_id, title, utc_now()),
+        )
+
+    def archive_project(self, project_id: str):
+        self._execute("update research_projects set is_active = false where id = ? and user_id = ?",
+                      (project_id, self.user_id))
+
+    def delete_project(self, project_id: str):
+        self._execute("delete from research_projects where id = ? and user_id = ?", (project_id, self.user_id))
+
+    # --- Research Logs ---
+    def get_project_logs(self, project_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        return self._page("research_logs", ResearchLog, columns, "project_id", project_id, before, limit)
+
+    def get_research_logs_since(self, start_date: str, columns: tuple = None):
+        return self._select("research_logs", ResearchLog, columns,
+                            "research_logs.date >= ?", (start_date,), "order by research_logs.date desc")
+
+    def get_research_logs_on(self, day: str, columns: tuple = None):
+        return self._select("research_logs", ResearchLog, columns, "research_logs.date = ?", (day,))
+
+    def add_research_log(self, project_id: str, day: str, duration: int, content: str, row_id: str = None):
+        created_at = utc_now()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "insert into research_logs (id, user_id, project_id, date, duration_minutes, content, created_at)"
+                " values (?, ?, ?, ?, ?, ?, ?) on conflict (id) do nothing",
+                (row_id or str(uuid.uuid4()), self.user_id, project_id, day, duration, content, created_at),
+            )
+            if not cursor.rowcount:
+                return
+            # 对应 schema.sql 中 sync_project_activity 触发器
+            self.conn.execute(
+                "update research_projects set log_count = log_count + 1, last_log_at = ?, last_log_date = ?,"
+                " last_preview = ? where id = ? and user_id = ?",
+                (created_at, day, content[:PREVIEW_LENGTH + 1], project_id, self.user_id))
+
+    # --- Ideas ---
+    def get_all_ideas(self, columns: tuple = None):
+        return self._select("ideas", Idea, columns, order="order by ideas.created_at desc")
+
+    def get_active_ideas(self, columns: tuple = None):
+        return self._select("ideas", Idea, columns, "ideas.status <> 'Done'", order="order by ideas.created_at desc")
+
+    def get_done_ideas(self, columns: tuple = None):
+        return self._select("ideas", Idea, columns, "ideas.status = 'Done'", order="order by ideas.updated_at desc")
+
+    def get_idea_updates_since(self, start_date: str, columns: tuple = None):
+        return self._select("idea_updates", IdeaUpdate, columns, "idea_updates.created_at >= ?", (start_date,))
+
+    def get_idea_updates(self, idea_id: str, columns: tuple = None, before: tuple = None, limit: int = None):
+        return self._page("idea_updates", IdeaUpdate, columns, "idea_id", idea_id, before, limit)
+
+    def create_idea(self, title: str, row_id: str = None):
+        now = utc_now()
+        self._execute(
+            "insert into ideas (id, user_id, title, created_at, updated_at) values (?, ?, ?, ?, ?)"
+            " on conflict (id) do nothing",
+            (row_id or str(uuid.uuid4()), self.user_id, title, now, now),
+        )
+
+    def update_idea_status(self, idea_id: str, status: str):
+        self._execute("update ideas set status = ?, updated_at = ? where id = ? and user_id = ?",
+                      (status, utc_now(), idea_id, self.user_id))
+
+    def delete_idea(self, idea_id: str):
+        self._execute("delete from ideas where id = ? and user_id = ?", (idea_id, self.user_id))
+
+    def add_idea_update(self, idea_id: str, content: str, row_id: str = None):
+        created_at = utc_now()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "insert into idea_updates (id, user_id, idea_id, content, created_at) values (?, ?, ?, ?, ?)"
+                " on conflict (id) do nothing",
+                (row_id or str(uuid.uuid4()), self.user_id, idea_id, content, created_at),
+            )
+            if not cursor.rowcount:
+                return
+            # 对应 schema.sql 中 sync_idea_activity 触发器
+            self.conn.execute(
+                "update ideas set log_count = log_count + 1, last_log_at = ?, last_preview = ?"
+                " where id = ? and user_id = ?", (created_at, content[:PREVIEW_LENGTH + 1], idea_id, self.user_id))
+
+    # --- Summary ---
+    def summary_dashboard(self, day: str, grain: str, start: str, end: str, activity_days: int = 14):
+        today = date.fromisoformat(day)
+        monday = today - timedelta(days=today.weekday())
+        # 区间起点所在的桶: 周以周一为桶, 月以月初为桶
+        start_day = date.fromisoformat(start) if start else None
+        if grain == "week":
+            first_bucket = start_day and start_day - timedelta(days=start_day.weekday())
+        else:
+            first_bucket = start_day and start_day.replace(day=1)
+        first_bucket = first_bucket.isoformat() if first_bucket else None
+        metrics = ", ".join(METRIC_COLUMNS)
+        user = self.user_id
+
+        return {
+            "today": next(iter(self._query("select * from daily_logs where user_id = ? and date = ?", (user, day))), None),
+            "today_projects": [row["title"] for row in self._query(
+                "select p.title from research_logs l join research_projects p on p.id = l.project_id"
+                " where l.user_id = ? and l.date = ? order by l.created_at", (user, day))],
+            "today_ideas": [row["title"] for row in self._query(
+                "select distinct i.title from idea_updates u join ideas i on i.id = u.idea_id"
+                " where u.user_id = ? and u.created_at >= ?", (user, day))],
+            "week_days": self._query(
+                f"select date, {metrics} from daily_logs where user_id = ? and date >= ? order by date",
+                (user, monday.isoformat())),
+            # 直接读触发器维护的 log_rollups, 与区间内的桶数成正比
+            "rollups": self._query(
+                f"select bucket as date, {metrics} from log_rollups where user_id = ? and grain = ?"
+                " and (? is null or bucket >= ?) and (? is null or bucket <= ?) order by bucket",
+                (user, grain, first_bucket, first_bucket, end, end)),
+            "active_projects": self._query(
+                "select id, title from research_projects where user_id = ? and is_active order by created_at desc",
+                (user,)),
+            "project_activity": self._query(
+                "select l.project_id as id, l.date, count(*) as count, coalesce(sum(l.duration_minutes), 0) as minutes"
+                " from research_logs l join research_projects p on p.id = l.project_id"
+                " where l.user_id = ? and p.is_active and l.date > ? group by l.project_id, l.date",
+                (user, (today - timedelta(days=activity_days)).isoformat())),
+            "active_ideas": self._query(
+                "select id, title from ideas where user_id = ? and status <> 'Done' order by created_at desc", (user,)),
+            "idea_activity": self._query(
+                "select u.idea_id as id, substr(u.created_at, 1, 10) as date, count(*) as count"
+                " from idea_updates u join ideas i on i.id = u.idea_id"
+                " where u.user_id = ? and i.status <> 'Done' and u.created_at >= ? group by u.idea_id, 2",
+                (user, (today - timedelta(days=activity_days - 1)).isoformat())),
+        }
+
+    # --- 搜索 ---
+    def search_notes(self, query: str, kind: str = None, parent_id: str = None, start: str = None,
+                     end: str = None, before: tuple = None, limit: int = 20):
+        match = _fts_query(query)
+        if not match:
+            return []
+        branches, params, snippets = [], [], []
+        for table, hit_kind in SEARCH_KINDS.items():
+            if kind and kind != hit_kind:
+                continue
+            parent, fk = ACTIVITY_PARENTS[table]
+            fts = f"{table}_fts"
+            day = "c.date" if table == "research_logs" else "substr(c.created_at, 1, 10)"
+            where, branch_params = [f"{fts} match ?", "c.user_id = ?"], [match, self.user_id]
+            for condition, value in ((f"c.{fk} = ?", parent_id), (f"{day} >= ?", start), (f"{day} <= ?", end)):
+                if value:
+                    where.append(condition)
+                    branch_params.append(value)
+            # bm25 越小越相关, 取负数后与 Postgres 的 ts_rank 一样越大越相关
+            branches.append(
+                f"select '{hit_kind}' as kind, c.id, {fts}.rowid as row, c.{fk} as parent_id, p.title as parent_title,"
+                f" {day} as date, c.created_at, -bm25({fts}) as rank"
+                f" from {fts} join {table}_search_ids m on m.docid = {fts}.rowid join {table} c on c.id = m.id"
+                f" left join {parent} p on p.id = c.{fk}"
+                f" where {' and '.join(where)}")
+            params += branch_params
+            # 摘要只对当前页计算
+            snippets.append(
+                f"when '{hit_kind}' then (select snippet({fts}, 0, '**', '**', '…', 24) from {fts}"
+                f" where {fts} match ? and {fts}.rowid = page.row)")
+        cursor = ""
+        if before:
+            cursor = "where (rank, created_at, id) < (?, ?, ?)"
+            params += list(before)
+        rows = self._query(
+            f"with page as (select * from ({' union all '.join(branches)}) {cursor}"
+            f"  order by rank desc, created_at desc, id desc limit ?)"
+            f" select kind, id, parent_id, parent_title, date, created_at, rank,"
+            f" case kind {' '.join(snippets)} end as snippet"
+            f" from page order by rank desc, created_at desc, id desc",
+            [*params, limit, *[match] * len(snippets)])
+        return to_records(SearchHit, rows)
+
+    # --- 批量读写 ---
+    def iter_rows(self, table: str, columns: tuple, chunk_size: int = 1000):
+        keys = primary_key(table)
+        key = ", ".join(keys)
+        last = None
+        while True:
+            # 行值比较 (user_id, date) > (?, ?) 与 Supabase 的 keyset 条件等价
+            after = f"where ({key}) > ({', '.join('?' for _ in keys)})" if last else ""
+            rows = self._query(f"select {', '.join(columns)} from {table} {after} order by {key} limit ?",
+                               (*(last or ()), chunk_size))
+            if not rows:
+                return
+            yield rows
+            last = tuple(rows[-1][k] for k in keys)
+
+    def upsert_rows(self, table: str, rows: list):
+        if not rows:
+            return
+        keys = primary_key(table)
+        if "user_id" not in rows[0]:
+            rows = [{**row, "user_id": self.user_id} for row in rows]
+        columns = list(rows[0])
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in keys)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"insert into {table} ({', '.join(columns)}) values ({', '.join('?' for _ in columns)}) "
+                f"on conflict ({', '.join(keys)}) do " + (f"update set {updates}" if updates else "nothing"),
+                [[row[c] for c in columns] for row in rows],
+            )
+            if table in ACTIVITY_PARENTS:
+                self._sync_activity(table, {row[ACTIVITY_PARENTS[table][1]] for row in rows})
+
+    def _sync_activity(self, table: str, parent_ids):
+        """重新计算父表的活动计数 (对应 schema.sql 中触发器的 UPDATE / DELETE 分支); 调用方持有锁"""
+        parent, fk = ACTIVITY_PARENTS[table]
+        latest = f"from {table} c where c.{fk} = {parent}.id order by created_at desc limit 1"
+        log_date = f" last_log_date = (select date {latest})," if table == "research_logs" else ""
+        self.conn.executemany(
+            f"update {parent} set"
+            f" log_count = (select count(*) from {table} c where c.{fk} = {parent}.id),"
+            f" last_log_at = (select max(created_at) from {table} c where c.{fk} = {parent}.id),{log_date}"
+            f" last_preview = (select substr(content, 1, {PREVIEW_LENGTH + 1}) {latest})"
+            f" where id = ?",
+            [(parent_id,) for parent_id in parent_ids],
+        )
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 仓库是平铺的模块, 不是安装包: 让测试能直接 import storage / journal 等
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
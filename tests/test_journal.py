@@ -0,0 +1,72 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from journal import JournaledStorage
+from storage import SQLiteStorage
+
+DAY = "2026-03-04"
+TOKEN = "00000000-0000-0000-0000-00000000000a"
+
+
+@pytest.fixture
+def notified():
+    return []
+
+
+@pytest.fixture
+def journaled(tmp_path, notified):
+    return JournaledStorage(SQLiteStorage(), str(tmp_path / "journal.db"),
+                            on_sync=lambda *tables: notified.append(set(tables)))
+
+
+def test_reads_go_to_backend(journaled):
+    journaled.backend.create_project("Alpha")
+    assert [p.title for p in journaled.get_all_projects()] == ["Alpha"]
+    assert journaled.user_id == journaled.backend.user_id
+    assert journaled.for_user(journaled.user_id) is journaled
+    with pytest.raises(ValueError):
+        journaled.for_user("someone-else")
+
+
+def test_same_submit_token_is_recorded_once(journaled):
+    journaled.create_idea("Idea", TOKEN)
+    journaled.create_idea("Idea", TOKEN)  # 同一次提交重试
+    journaled.create_idea("Idea")         # 另一次提交, 内容相同也是新行
+    journaled.flush()
+
+    assert journaled.pending_count() == 0
+    ideas = journaled.get_all_ideas()
+    assert len(ideas) == 2 and TOKEN in {idea.id for idea in ideas}
+
+
+def test_replay_counts_and_notifies(journaled, notified):
+    journaled.backend.create_project("Alpha", TOKEN)
+    journaled.add_research_log(TOKEN, DAY, 10, "note")
+    journaled.flush()
+
+    assert journaled.synced >= 1
+    assert {"research_logs", "research_projects"} <= set().union(*notified)
+    (project,) = journaled.get_all_projects()
+    assert project.log_count == 1
+
+
+def failing(exc):
+    def upsert_rows(table, rows):
+        raise exc
+    return upsert_rows
+
+
+def test_server_outage_is_retried_not_set_aside(journaled, monkeypatch):
+    # 先让后端失败再写入, 后台回放线程也拿不到成功的结果
+    monkeypatch.setattr(journaled.backend, "upsert_rows",
+                        failing(APIError({"message": "JSON could not be generated", "code": 503})))
+    journaled.create_idea("Idea")
+    with pytest.raises(APIError):
+        journaled.flush()
+    assert journaled.pending_count() == 1 and journaled.failed_entries() == []
+
+    # 约束错误不是暂时性的: 记入 attempts, 不再向上抛
+    monkeypatch.setattr(journaled.backend, "upsert_rows",
+                        failing(APIError({"message": "violates foreign key constraint", "code": "23503"})))
+    journaled.flush()
+    assert journaled.conn.execute("select attempts from journal").fetchone()[0] >= 1
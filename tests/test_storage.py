@@ -0,0 +1,249 @@
+import pytest
+
+from bench.fake_supabase import FakeSupabase
+from storage import LOCAL_USER, Storage, SQLiteStorage, SupabaseStorage
+
+OTHER_USER = "11111111-1111-1111-1111-111111111111"
+DAY = "2026-03-04"  # 周三
+
+
+@pytest.fixture(params=["sqlite", "supabase"])
+def make_storage(request):
+    """按用户创建存储对象; 两个后端共用同一个内存 SQLite, supabase 走进程内的 FakeSupabase"""
+    base = SQLiteStorage()
+
+    def make(user_id: str = LOCAL_USER) -> Storage:
+        local = base.for_user(user_id)
+        if request.param == "sqlite":
+            return local
+        return SupabaseStorage(FakeSupabase(local), user_id)
+
+    return make
+
+
+@pytest.fixture
+def storage(make_storage):
+    return make_storage()
+
+
+def only(rows):
+    assert len(rows) == 1
+    return rows[0]
+
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        Storage()
+
+
+# --- Daily Logs ---
+def test_daily_log_upsert_and_patch(storage):
+    assert storage.get_daily_log(DAY) is None
+    storage.upsert_daily_log({"date": DAY, "newsletter_note": "a", "lc_notes": "b"})
+    storage.patch_daily_log(DAY, {"newsletter_note": "c", "video_done": True})
+
+    log = storage.get_daily_log(DAY, ("date", "newsletter_note", "video_done", "lc_notes"))
+    assert (log.newsletter_note, log.video_done, log.lc_notes) == ("c", True, "b")
+    assert log.video_note is None  # 没查询的列保持 None
+    assert [row.date for row in storage.get_logs_since("2026-03-01")] == [DAY]
+    assert storage.get_logs_since("2026-03-05") == []
+
+
+def test_patch_rejects_metric_columns(storage):
+    with pytest.raises(ValueError):
+        storage.patch_daily_log(DAY, {"gre_vocab_count": 1})
+
+
+def test_increment_metric_dedupes_event_ids(storage):
+    assert storage.increment_metric(DAY, "gre_vocab_count", 3, "e1") == 3
+    assert storage.increment_metric(DAY, "gre_vocab_count", 3, "e1") == 3  # 重试不重复累加
+    assert storage.increment_metric(DAY, "gre_vocab_count", -1) == 2
+
+    storage.add_metric_events([
+        {"id": "e2", "date": DAY, "ts": "2026-03-04T10:00:00+00:00", "metric": "lc_easy_count", "delta": 2},
+        {"id": "e1", "date": DAY, "ts": "2026-03-04T10:00:00+00:00", "metric": "gre_vocab_count", "delta": 5},
+    ])
+    log = storage.get_daily_log(DAY)
+    assert (log.gre_vocab_count, log.lc_easy_count) == (2, 2)
+
+
+# --- Research Projects / Logs ---
+def test_projects_and_activity_counts(storage):
+    storage.create_project("Alpha")
+    storage.create_project("Beta")
+    alpha = next(p for p in storage.get_active_projects() if p.title == "Alpha")
+    assert alpha.log_count == 0 and alpha.last_log_at is None
+
+    storage.add_research_log(alpha.id, DAY, 30, "first")
+    storage.add_research_log(alpha.id, DAY, 15, "second " + "x" * 200)
+    alpha = next(p for p in storage.get_active_projects() if p.id == alpha.id)
+    assert alpha.log_count == 2 and alpha.last_log_date == DAY
+    assert alpha.last_preview == ("second " + "x" * 200)[:101]  # 多存一个字, 界面据此加省略号
+
+    logs = storage.get_research_logs_on(DAY, ("id", "duration_minutes", "project_title"))
+    assert sorted(log.duration_minutes for log in logs) == [15, 30]
+    assert {log.project_title for log in logs} == {"Alpha"}
+    assert len(storage.get_research_logs_since("2026-03-01")) == 2
+
+    storage.archive_project(alpha.id)
+    assert [p.title for p in storage.get_active_projects()] == ["Beta"]
+    assert [p.title for p in storage.get_archived_projects()] == ["Alpha"]
+    assert len(storage.get_all_projects()) == 2
+
+    storage.delete_project(alpha.id)
+    assert [p.title for p in storage.get_all_projects()] == ["Beta"]
+    assert storage.get_research_logs_on(DAY) == []
+
+
+def test_project_logs_paging(storage):
+    storage.create_project("Alpha")
+    project = only(storage.get_all_projects())
+    for i in range(5):
+        storage.add_research_log(project.id, DAY, i, f"log {i}")
+
+    seen, before = [], None
+    while True:
+        page = storage.get_project_logs(project.id, ("id", "content", "created_at"), before, 2)
+        if not page:
+            break
+        assert len(page) <= 2
+        seen += page
+        before = (page[-1].created_at, page[-1].id)
+
+    assert len({log.id for log in seen}) == 5
+    assert [(log.created_at, log.id) for log in seen] == sorted(((log.created_at, log.id) for log in seen),
+                                                                reverse=True)
+
+
+def test_row_id_makes_inserts_idempotent(storage):
+    storage.create_project("Alpha", "00000000-0000-0000-0000-00000000000a")
+    storage.create_project("Alpha", "00000000-0000-0000-0000-00000000000a")  # 同一次提交重试
+    storage.create_project("Alpha")  # 另一次提交, 内容相同也是新行
+    assert len(storage.get_all_projects()) == 2
+
+    project_id = "00000000-0000-0000-0000-00000000000a"
+    for _ in range(2):
+        storage.add_research_log(project_id, DAY, 5, "same note", "00000000-0000-0000-0000-00000000000b")
+    storage.add_research_log(project_id, DAY, 5, "same note")
+    assert len(storage.get_research_logs_on(DAY)) == 2
+    assert next(p for p in storage.get_all_projects() if p.id == project_id).log_count == 2
+
+
+def test_list_reads_span_chunks(storage, monkeypatch):
+    # Supabase 按 SCAN_CHUNK 分块读; 正好整块和最后不满一块都要读全
+    monkeypatch.setattr("storage.SCAN_CHUNK", 2)
+    for i in range(4):
+        storage.create_project(f"P{i}")
+    assert len(storage.get_active_projects()) == 4
+    storage.create_project("P4")
+    assert sorted(p.title for p in storage.get_all_projects()) == [f"P{i}" for i in range(5)]
+
+    # 不给 limit 的子记录读取同样分块读全, 从 before 之后开始
+    storage.create_idea("Idea")
+    idea = only(storage.get_all_ideas())
+    for i in range(5):
+        storage.add_idea_update(idea.id, f"u{i}")
+    updates = storage.get_idea_updates(idea.id, ("id", "content", "created_at"))
+    assert len(updates) == 5
+    rest = storage.get_idea_updates(idea.id, ("id", "created_at"), (updates[1].created_at, updates[1].id))
+    assert [u.id for u in rest] == [u.id for u in updates[2:]]
+
+
+# --- Ideas ---
+def test_ideas_and_updates(storage):
+    storage.create_idea("Idea")
+    idea = only(storage.get_active_ideas())
+    assert idea.status == "Idea"
+
+    storage.add_idea_update(idea.id, "an update")
+    idea = only(storage.get_all_ideas())
+    assert idea.log_count == 1 and idea.last_preview == "an update"
+    update = only(storage.get_idea_updates(idea.id, ("id", "content", "created_at")))
+    assert update.content == "an update"
+    assert only(storage.get_idea_updates_since("2000-01-01", ("id", "idea_title"))).idea_title == "Idea"
+
+    storage.update_idea_status(idea.id, "Done")
+    assert storage.get_active_ideas() == []
+    assert only(storage.get_done_ideas()).id == idea.id
+
+    storage.delete_idea(idea.id)
+    assert storage.get_all_ideas() == []
+    assert storage.get_idea_updates_since("2000-01-01") == []
+
+
+# --- Summary ---
+def test_summary_dashboard_rollups(storage):
+    storage.create_project("Alpha")
+    project = only(storage.get_all_projects())
+    storage.add_research_log(project.id, DAY, 20, "work")
+    storage.increment_metric("2026-03-02", "newsletter_time", 10)
+    storage.increment_metric(DAY, "newsletter_time", 5)
+    storage.increment_metric("2026-02-20", "newsletter_time", 7)
+
+    dashboard = storage.summary_dashboard(DAY, "week", "2026-02-16", DAY)
+    assert dashboard["today"]["newsletter_time"] == 5
+    assert dashboard["today_projects"] == ["Alpha"]
+    assert [row["date"] for row in dashboard["week_days"]] == ["2026-03-02", DAY]
+    assert {row["date"]: row["newsletter_time"] for row in dashboard["rollups"]} == {
+        "2026-02-16": 7, "2026-03-02": 15}
+    assert only(dashboard["project_activity"])["minutes"] == 20
+
+    months = storage.summary_dashboard(DAY, "month", "2026-01-01", DAY)["rollups"]
+    assert {row["date"]: row["newsletter_time"] for row in months} == {"2026-02-01": 7, "2026-03-01": 15}
+
+
+# --- 搜索 ---
+def test_search_notes(storage):
+    storage.create_project("Alpha")
+    storage.create_idea("Idea")
+    project, idea = only(storage.get_all_projects()), only(storage.get_all_ideas())
+    storage.add_research_log(project.id, DAY, 10, "reading about attention heads")
+    storage.add_research_log(project.id, DAY, 10, "unrelated")
+    storage.add_idea_update(idea.id, "attention as a memory")
+
+    hits = storage.search_notes("attention")
+    assert {(hit.kind, hit.parent_title) for hit in hits} == {("research_log", "Alpha"), ("idea_update", "Idea")}
+    assert [hit.kind for hit in storage.search_notes("attention", kind="idea_update")] == ["idea_update"]
+    assert storage.search_notes("attention", parent_id=project.id)[0].parent_id == project.id
+    assert storage.search_notes("nothing-matches") == []
+
+
+def test_search_index_survives_rowid_renumbering(tmp_path):
+    # 子表没有 integer primary key, VACUUM 可以给它重新编号 rowid; 这里直接改 rowid 模拟
+    storage = SQLiteStorage(str(tmp_path / "life_os.db"))
+    storage.create_project("Alpha", "p1")
+    for i in range(30):
+        storage.add_research_log("p1", DAY, 1, f"needle {i}" if i % 5 == 0 else f"filler {i}")
+    storage._execute("update research_logs set rowid = rowid + 1000")
+    storage.conn.execute("vacuum")
+
+    hits = storage.search_notes("needle", limit=50)
+    assert sorted(hit.snippet for hit in hits) == sorted(f"**needle** {i}" for i in range(0, 30, 5))
+
+
+# --- 批量读写 ---
+def test_iter_rows_round_trip(storage):
+    rows = [{"date": f"2026-03-0{i}", "lc_notes": f"n{i}"} for i in range(1, 6)]
+    storage.upsert_rows("daily_logs", [{"user_id": LOCAL_USER, **row} for row in rows])
+
+    chunks = list(storage.iter_rows("daily_logs", ("user_id", "date", "lc_notes"), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row["lc_notes"] for chunk in chunks for row in chunk] == [row["lc_notes"] for row in rows]
+
+
+# --- 多用户 ---
+def test_users_are_isolated(make_storage):
+    mine, theirs = make_storage(), make_storage(OTHER_USER)
+    mine.create_project("Mine")
+    theirs.create_project("Theirs")
+    mine.increment_metric(DAY, "lc_easy_count", 1)
+    theirs.increment_metric(DAY, "lc_easy_count", 4)
+
+    assert [p.title for p in mine.get_all_projects()] == ["Mine"]
+    assert [p.title for p in theirs.get_all_projects()] == ["Theirs"]
+    assert mine.get_daily_log(DAY).lc_easy_count == 1
+    assert theirs.summary_dashboard(DAY, "week", None, None)["today"]["lc_easy_count"] == 4
+
+    project = only(theirs.get_all_projects())
+    mine.delete_project(project.id)
+    assert [p.title for p in theirs.get_all_projects()] == ["Theirs"]
@@ -0,0 +1,47 @@
+from writebuffer import DailyLogBuffer
+
+DAY = "2026-03-04"
+FIELDS = ["lc_easy_count", "lc_notes"]
+INPUTS = {"lc_easy_count": "lc_easy"}
+
+
+class FakeDB:
+    """只实现写缓冲用到的两个写操作; totals 是数据库中合并了所有设备写入的计数"""
+
+    def __init__(self):
+        self.totals = {}
+        self.patches = []
+
+    def increment_metric(self, day, metric, delta, event_id=None):
+        self.totals[metric] = self.totals.get(metric, 0) + delta
+        return self.totals[metric]
+
+    def patch_daily_log(self, day, fields):
+        self.patches.append(fields)
+
+
+def test_two_flushes_before_apply_offsets_count_remote_delta_once():
+    db = FakeDB()
+    buffer = DailyLogBuffer(db, DAY, None, FIELDS)
+    state = {"lc_easy_count": 0}
+
+    db.increment_metric(DAY, "lc_easy_count", 10)  # 另一台设备
+    state["lc_easy_count"] = 3
+    buffer.stage(state)
+    buffer.flush()
+    # 还没渲染 (apply_offsets 没调用) 就又改了一次
+    state["lc_easy_count"] = 5
+    buffer.stage(state)
+    buffer.flush()
+
+    buffer.apply_offsets(state, ["lc_easy_count"], INPUTS)
+    assert state["lc_easy_count"] == db.totals["lc_easy_count"] == 15
+    assert state["lc_easy"] == "15"
+
+    # 并入之后不再有待并入的增量, 下一次修改按显示值继续累加
+    buffer.apply_offsets(state, ["lc_easy_count"], INPUTS)
+    state["lc_easy_count"] = 16
+    buffer.stage(state)
+    buffer.flush()
+    buffer.apply_offsets(state, ["lc_easy_count"], INPUTS)
+    assert state["lc_easy_count"] == db.totals["lc_easy_count"] == 16
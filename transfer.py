@@ -0,0 +1,235 @@
+# ============================================================
+# 数据导出 / 导入 (Export / Import)
+#   python transfer.py export backup/ [--format jsonl|csv|parquet] [--tables ideas idea_updates]
+#   python transfer.py import backup/
+# 导出按主键 keyset 分块流式写文件, 导入按块批量 upsert, 保留原有的 UUID 和外键, 内存占用与表大小无关
+# 存储后端与 app.py 相同 (.streamlit/secrets.toml), 也可用 --sqlite 指定本地库
+# 每行带 user_id, 一次导出 / 导入所有用户; Supabase 需要 [supabase] service_key 才能越过 RLS 读写所有用户的行
+# 多用户之前的导出没有 user_id, 导入时用 --user 指定归属 (SQLite 默认 LOCAL_USER)
+# ============================================================
+import argparse
+import csv
+import json
+import sys
+import time
+import tomllib
+import types
+from dataclasses import fields
+from pathlib import Path
+
+from records import DailyLog, Idea, IdeaUpdate, MetricEvent, Project, ResearchLog, table_columns
+from storage import LOCAL_USER, METRIC_COLUMNS, SQLiteStorage, SupabaseStorage
+
+# 先父表再子表, 导入时外键始终有效
+TABLES = {
+    "research_projects": Project,
+    "ideas": Idea,
+    "research_logs": ResearchLog,
+    "idea_updates": IdeaUpdate,
+    "daily_logs": DailyLog,
+    "metric_events": MetricEvent,
+}
+# 由触发器维护的派生字段, 不导出; 导入子表 / 指标事件时会重新计算
+DERIVED_COLUMNS = {"log_count", "last_log_at", "last_log_date", "last_preview", *METRIC_COLUMNS}
+FORMATS = ["jsonl", "csv", "parquet"]
+CHUNK_SIZE = 1000  # 不超过 PostgREST 默认的 max-rows
+
+
+def export_columns(table: str) -> tuple:
+    return tuple(c for c in table_columns(TABLES[table]) if c not in DERIVED_COLUMNS)
+
+
+def column_types(table: str) -> dict:
+    """字段 -> 基础类型 (str / int / bool / float), 取自 records 中的类型注解"""
+    kinds = {}
+    for field in fields(TABLES[table]):
+        kind = field.type
+        if isinstance(kind, types.UnionType):
+            kind = next(arg for arg in kind.__args__ if arg is not type(None))
+        kinds[field.name] = kind
+    return kinds
+
+
+def open_storage(args):
+    if args.sqlite:
+        return SQLiteStorage(args.sqlite, args.user or LOCAL_USER)
+    secrets = tomllib.loads(Path(args.secrets).read_text(encoding="utf-8"))
+    config = secrets.get("storage", {})
+    if config.get("backend") == "sqlite":
+        return SQLiteStorage(config.get("path", "life_os.db"), args.user or LOCAL_USER)
+    from supabase import create_client
+    supabase = secrets["supabase"]
+    return SupabaseStorage(create_client(supabase["url"], supabase.get("service_key", supabase["key"])), args.user)
+
+
+# ------------------------------------------------------------
+# 文件格式: 每种格式一对 writer / reader, 逐块写入、逐块读出
+# ------------------------------------------------------------
+class JsonlWriter:
+    def __init__(self, path: Path, table: str):
+        self.file = path.open("w", encoding="utf-8")
+
+    def write(self, rows: list):
+        self.file.writelines(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+def read_jsonl(path: Path, table: str, chunk_size: int):
+    with path.open(encoding="utf-8") as file:
+        chunk = []
+        for line in file:
+            if line.strip():
+                chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class CsvWriter:
+    def __init__(self, path: Path, table: str):
+        self.file = path.open("w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=export_columns(table))
+        self.writer.writeheader()
+
+    def write(self, rows: list):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def _parse_csv_value(value: str, kind):
+    # CSV 不区分空串和 NULL, 空值一律按 NULL 导入
+    if value == "":
+        return None
+    if kind is bool:
+        return value in ("True", "true", "1")
+    if kind in (int, float):
+        return kind(value)
+    return value
+
+
+def read_csv(path: Path, table: str, chunk_size: int):
+    kinds = column_types(table)
+    with path.open(encoding="utf-8", newline="") as file:
+        chunk = []
+        for row in csv.DictReader(file):
+            chunk.append({column: _parse_csv_value(value, kinds.get(column, str)) for column, value in row.items()})
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        sys.exit("Parquet needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+class ParquetWriter:
+    def __init__(self, path: Path, table: str):
+        pa = _arrow()
+        arrow_types = {str: pa.string(), int: pa.int64(), bool: pa.bool_(), float: pa.float64()}
+        kinds = column_types(table)
+        # schema 由记录类型决定, 不依赖第一块数据里是否有 NULL
+        self.schema = pa.schema([(column, arrow_types[kinds[column]]) for column in export_columns(table)])
+        self.pa = pa
+        self.writer = pa.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows: list):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def read_parquet(path: Path, table: str, chunk_size: int):
+    pa = _arrow()
+    for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+READERS = {"jsonl": read_jsonl, "csv": read_csv, "parquet": read_parquet}
+
+
+# ------------------------------------------------------------
+# 导出 / 导入
+# ------------------------------------------------------------
+def export_table(db, table: str, directory: Path, fmt: str, chunk_size: int = CHUNK_SIZE) -> int:
+    path = directory / f"{table}.{fmt}"
+    writer = WRITERS[fmt](path, table)
+    count = 0
+    try:
+        for rows in db.iter_rows(table, export_columns(table), chunk_size):
+            writer.write(rows)
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
+
+
+def import_table(db, table: str, path: Path, chunk_size: int = CHUNK_SIZE) -> int:
+    fmt = path.suffix.lstrip(".")
+    columns = export_columns(table)
+    count = 0
+    for rows in READERS[fmt](path, table, chunk_size):
+        # 只写本表已知的列; upsert_rows 要求各行字段相同
+        rows = [{column: row.get(column) for column in columns if column in row} for row in rows]
+        if db.user_id:
+            rows = [{**row, "user_id": row.get("user_id") or db.user_id} for row in rows]
+        if table == "metric_events":
+            db.add_metric_events(rows)
+        else:
+            db.upsert_rows(table, rows)
+        count += len(rows)
+    return count
+
+
+def find_export(directory: Path, table: str):
+    matches = [directory / f"{table}.{fmt}" for fmt in FORMATS if (directory / f"{table}.{fmt}").exists()]
+    if len(matches) > 1:
+        sys.exit(f"{table}: more than one export found in {directory}: {', '.join(m.name for m in matches)}")
+    return matches[0] if matches else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import Life OS tables")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--format", choices=FORMATS, default="jsonl", help="export format (import detects it)")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--sqlite", help="use a local SQLite database instead of the configured backend")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("--user", help="owner of imported rows that have no user_id")
+    args = parser.parse_args()
+
+    db = open_storage(args)
+    tables = [table for table in TABLES if table in args.tables]
+    if args.command == "export":
+        args.directory.mkdir(parents=True, exist_ok=True)
+    for table in tables:
+        started = time.perf_counter()
+        if args.command == "export":
+            count = export_table(db, table, args.directory, args.format, args.chunk_size)
+        else:
+            path = find_export(args.directory, table)
+            if path is None:
+                print(f"{table:<18} skipped (no file)")
+                continue
+            count = import_table(db, table, path, args.chunk_size)
+        print(f"{table:<18} {count:>8} rows  {time.perf_counter() - started:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
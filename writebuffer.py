@@ -0,0 +1,140 @@
+# ============================================================
+# daily_logs 写缓冲 (Write Buffer)
+# 连续的修改在一个短窗口内合并, 由后台定时器一次写入
+# ============================================================
+import logging
+import threading
+
+from storage import METRIC_COLUMNS
+
+FLUSH_DELAY = 1.5      # 秒, 窗口内的连续修改合并成一次写入
+FLUSH_DELAY_MAX = 60.0  # 秒, 写入失败后重试间隔的上限
+
+logger = logging.getLogger("life_os.buffer")
+
+
+class DailyLogBuffer:
+    """daily_logs 写缓冲：只记录改动过的字段，窗口结束后在后台合并写入
+
+    数值字段以相对上次保存值的增量调用 increment_metric 原子累加，其余字段用 patch_daily_log 按字段修改，
+    另一台设备同时写入的内容不会被覆盖。数据库中的总数与 saved 之差就是其他设备的增量，
+    记在 offsets 中 (来自 RPC 返回值或变更订阅后的 reconcile)，下次渲染时由 apply_offsets 并入显示值。
+    写入失败时改动留在缓冲中, 按退避间隔重试, 最近一次错误记在 error 中供界面提示
+    """
+
+    def __init__(self, db, day: str, saved, fields, on_saved=None):
+        self.db = db
+        self.day = day
+        self.on_saved = on_saved  # 有字段写入成功后调用, 用于清缓存
+        self.saved = {field: getattr(saved, field, None) for field in fields}  # 数据库中的已知值
+        self.dirty = {}
+        self.inflight = {}  # 正在写入的值; 写入期间的修改与它比较, 改回原值也不会丢
+        self.offsets = {}   # 字段 -> 尚未并入显示值的其他设备增量
+        self.flushing = 0    # 正在进行的写入数
+        self.generation = 0  # 每次写入开始和结束时递增, reconcile 据此丢弃写入期间读到的值
+        self.error = None    # 最近一次写入失败的异常, 写入成功后清空
+        self.delay = FLUSH_DELAY
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # 定时器和换日时的 flush 依次执行
+        self.timer = None
+
+    def stage(self, data: dict):
+        with self.lock:
+            for field, value in data.items():
+                if value != self.inflight.get(field, self.saved.get(field)):
+                    self.dirty[field] = value
+                else:
+                    self.dirty.pop(field, None)
+            if self.dirty and self.timer is None:
+                self._schedule(FLUSH_DELAY)
+
+    def _schedule(self, delay: float):
+        self.timer = threading.Timer(delay, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        """写入缓冲中的改动; 在定时器线程中运行, 出错时不抛出, 改为记录错误并稍后重试"""
+        with self.flush_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                fields, self.dirty = self.dirty, {}
+                if not fields:
+                    return
+                deltas = {field: fields[field] - (self.saved.get(field) or 0) for field in METRIC_COLUMNS if field in fields}
+                self.inflight = dict(fields)
+                self.flushing += 1
+                self.generation += 1
+            others = {field: value for field, value in fields.items() if field not in METRIC_COLUMNS}
+            done = []
+            try:
+                if others:
+                    self.db.patch_daily_log(self.day, others)
+                    done += others
+                for field, delta in deltas.items():
+                    total = self.db.increment_metric(self.day, field, delta) if delta else None
+                    done.append(field)
+                    with self.lock:
+                        # 按增量更新, 而不是直接设为 fields[field]: 期间 apply_offsets 的平移要保留
+                        self.saved[field] = (self.saved.get(field) or 0) + delta
+                        if total is not None:
+                            self._set_offset(field, total)
+            except Exception as e:
+                logger.warning("daily log flush failed, retrying in %.1fs", self.delay, exc_info=True)
+                with self.lock:
+                    # 没写成的字段放回缓冲 (期间更新过的字段以新值为准), 退避后重试
+                    self.dirty = {**{f: self.inflight[f] for f in fields if f not in done}, **self.dirty}
+                    self.error = e
+                    if self.timer is not None:
+                        self.timer.cancel()
+                    self._schedule(self.delay)
+                    self.delay = min(self.delay * 2, FLUSH_DELAY_MAX)
+            else:
+                with self.lock:
+                    self.error = None
+                    self.delay = FLUSH_DELAY
+            finally:
+                with self.lock:
+                    self.saved.update({field: others[field] for field in done if field in others})
+                    self.inflight = {}
+                    self.flushing -= 1
+                    self.generation += 1
+                if done and self.on_saved is not None:
+                    self.on_saved()
+
+    def _set_offset(self, field: str, total: int):
+        offset = total - (self.saved.get(field) or 0)
+        if offset:
+            self.offsets[field] = offset
+        else:
+            self.offsets.pop(field, None)
+
+    def reconcile(self, read):
+        """其他设备改了 daily_logs 时, 用 read() 读到的最新一行校正计数; 本 session 正在写入时跳过"""
+        with self.lock:
+            generation = self.generation
+        log = read()
+        with self.lock:
+            if self.flushing or self.generation != generation:
+                return
+            for field in METRIC_COLUMNS:
+                self._set_offset(field, getattr(log, field, None) or 0)
+
+    def apply_offsets(self, state, fields, inputs):
+        """把其他设备的增量并入 session 中的计数 (连同已保存、写入中和未写入的值一起平移, 待写的增量不变)
+
+        inputs 为计数字段 -> 显示该计数的输入框 key; 各模块只处理自己的字段, 在创建输入框之前调用
+        """
+        with self.lock:
+            offsets = {field: self.offsets.pop(field) for field in fields if field in self.offsets}
+            for field, offset in offsets.items():
+                self.saved[field] = (self.saved.get(field) or 0) + offset
+                for pending in (self.inflight, self.dirty):
+                    if field in pending:
+                        pending[field] += offset
+        for field, offset in offsets.items():
+            state[field] = state.get(field, 0) + offset
+            if field in inputs:
+                state[inputs[field]] = str(state[field])